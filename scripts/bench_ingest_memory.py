@@ -0,0 +1,52 @@
+"""
+比較批次（fetch_ticks_save + ticks_to_3tick_kbar）與串流（stream_ticks_to_kbar）的峰值記憶體。
+以 FakeTicksAPI(lazy=True) 提供逐筆，不需登入 Shioaji。
+用法（於專案根目錄）：
+    python -m scripts.bench_ingest_memory --sizes 50000 200000 --chunk-size 50000
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import src.shioaji_fetch_and_convert as fc
+from src.synthetic import FakeTicksAPI
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    dt = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6, dt
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000])
+    ap.add_argument("--chunk-size", type=int, default=50_000)
+    ap.add_argument("--format", default="csv")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n in args.sizes:
+            api = FakeTicksAPI(ticks_per_day=n, lazy=True)
+
+            def batch():
+                df = fc.fetch_ticks_save(api, "TMF", "2025-11-26", tmp / "b_raw", fmt=args.format)
+                fc.ticks_to_3tick_kbar(df, tmp / "b_kbar", fmt=args.format)
+
+            def stream():
+                fc.stream_ticks_to_kbar(api, "TMF", "2025-11-26", tmp / "s_raw", tmp / "s_kbar",
+                                        chunk_size=args.chunk_size, fmt=args.format)
+
+            bm, bt = measure(batch)
+            sm, st = measure(stream)
+            print(f"{n:>9} ticks：batch peak {bm:8.1f} MB ({bt:5.2f}s)  stream peak {sm:8.1f} MB ({st:5.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+延遲量測的額外成本：在同一執行緒依序呼叫管線各階段 handler（排除執行緒排程的雜訊），
+比較未啟用 / 啟用 latency 時每筆 tick 的處理時間，並列出啟用時的各階段直方圖。
+用法（於專案根目錄）：
+    python -m scripts.bench_latency --ticks 300000
+"""
+import argparse
+import time
+
+from src.latency import LatencyHistogram
+from src.pipeline import QuotePipeline
+from src.quote_manager import QuoteManager
+from src.strategy import ThreeTickStrategy
+from src.synthetic import ticks_frame
+
+def drive(ticks, latency):
+    pipe = QuotePipeline(QuoteManager(ticks_per_kbar=3), ThreeTickStrategy(), on_signal=lambda sig: None,
+                         maxsize=1_000_000, record_maxsize=10_000_000, latency=latency)
+    aggregate, signal, order = (s.handler for s in pipe.stages[:3])
+    bars, signals = pipe.bars, pipe.signals
+    t0 = time.perf_counter()
+    for tick in ticks:
+        pipe.on_tick(tick)
+        aggregate(pipe.ticks.get())
+        while len(bars):
+            signal(bars.get())
+        while len(signals):
+            order(signals.get())
+    return time.perf_counter() - t0, pipe
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=300_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    df = ticks_frame(args.ticks, seed=5)
+    df["time"] = df["time"].dt.to_pydatetime()
+    ticks = df[["time", "price", "volume"]].to_dict("records")
+    off = min(drive(ticks, None)[0] for _ in range(args.repeat))
+    runs = [drive(ticks, True) for _ in range(args.repeat)]
+    on, pipe = min(runs, key=lambda r: r[0])
+    h = LatencyHistogram()
+    t0 = time.perf_counter()
+    for i in range(1_000_000):
+        h.record(i)
+    rec = (time.perf_counter() - t0) * 1e3
+    n = len(ticks)
+    print(f"latency 未啟用：{off / n * 1e9:8.0f} ns/tick")
+    print(f"latency 啟用  ：{on / n * 1e9:8.0f} ns/tick（+{(on - off) / n * 1e9:.0f} ns）")
+    print(f"LatencyHistogram.record：{rec:.0f} ns/次")
+    print(pipe.latency.format())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+QuoteManager.on_tick 吞吐量 benchmark：舊版 deque 緩衝 vs BarAggregator（tick / time / volume bar）。
+用法（於專案根目錄）：
+    python -m scripts.bench_quote_manager --ticks 1000000
+"""
+import argparse
+import time
+from collections import deque
+
+from src.quote_manager import QuoteManager
+from src.synthetic import ticks_frame
+
+class LegacyQuoteManager:
+    """改版前的實作（每根 bar 複製 deque、逐筆 popleft、建三個暫存 list），僅供對照。"""
+    def __init__(self, ticks_per_kbar=3):
+        self.ticks_per_kbar = ticks_per_kbar
+        self.buffer = deque()
+
+    def on_tick(self, tick):
+        self.buffer.append(tick)
+        if len(self.buffer) >= self.ticks_per_kbar:
+            ticks = list(self.buffer)[:self.ticks_per_kbar]
+            for _ in range(self.ticks_per_kbar):
+                self.buffer.popleft()
+            prices = [t["price"] for t in ticks]
+            vols = [t.get("volume", 0) for t in ticks]
+            return {"time": [t["time"] for t in ticks][-1], "open": prices[0], "high": max(prices),
+                    "low": min(prices), "close": prices[-1], "volume": sum(vols)}
+        return None
+
+def run(qm, ticks):
+    bars = 0
+    t0 = time.perf_counter()
+    for tick in ticks:
+        if qm.on_tick(tick) is not None:
+            bars += 1
+    return time.perf_counter() - t0, bars
+
+def check(ticks, n=3):
+    """tick bar 輸出須與舊版逐根相同。"""
+    old, new = LegacyQuoteManager(n), QuoteManager(ticks_per_kbar=n)
+    for tick in ticks:
+        a, b = old.on_tick(tick), new.on_tick(tick)
+        if (a is None) != (b is None) or (a and any(a[k] != b[k] for k in a)):
+            raise SystemExit(f"輸出不一致：legacy={a} new={b}")
+    print(f"check OK：{len(ticks)} 筆 tick 的 {n}-tick bar 與舊版相同")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=1_000_000)
+    ap.add_argument("--ticks-per-kbar", type=int, default=3)
+    args = ap.parse_args()
+    df = ticks_frame(args.ticks, seed=3)
+    df["time"] = df["time"].dt.to_pydatetime()
+    ticks = df[["time", "price", "volume"]].to_dict("records")
+    check(ticks[:200_000], args.ticks_per_kbar)
+    cases = [
+        ("legacy deque", LegacyQuoteManager(args.ticks_per_kbar)),
+        ("tick bar", QuoteManager(ticks_per_kbar=args.ticks_per_kbar)),
+        ("time bar 60s", QuoteManager(bar_type="time", bar_size=60)),
+        ("volume bar 100", QuoteManager(bar_type="volume", bar_size=100)),
+    ]
+    for name, qm in cases:
+        dt, bars = run(qm, ticks)
+        print(f"{name:>15}: {len(ticks) / dt:12,.0f} ticks/s  ({bars} bars, {dt:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+各子命令的啟動時間：以子行程執行 python -m src <子命令> --help（取 --repeat 次的中位數），
+並以 -X importtime 列出載入了哪些重量級模組。
+用法（於專案根目錄）：
+    python -m scripts.bench_startup --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from src.__main__ import COMMANDS
+
+HEAVY = ("pandas", "numpy", "pyarrow", "shioaji")
+
+def wall_ms(cmd, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+def heavy_modules(cmd):
+    out = subprocess.run([sys.executable, "-X", "importtime"] + cmd[1:], capture_output=True, text=True).stderr
+    loaded = set()
+    for line in out.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name in HEAVY:
+                loaded.add(name)
+    return [m for m in HEAVY if m in loaded]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    base = wall_ms([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'python -c pass':<22}{base:8.0f} ms")
+    for name in ["", *COMMANDS]:
+        cmd = [sys.executable, "-m", "src"] + ([name, "--help"] if name else [])
+        label = f"src {name or '(usage)'}"
+        print(f"{label:<22}{wall_ms(cmd, args.repeat):8.0f} ms  {', '.join(heavy_modules(cmd)) or '-'}")
+
+if __name__ == "__main__":
+    main()
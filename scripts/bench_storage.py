@@ -0,0 +1,41 @@
+"""
+比較 csv / parquet / feather 的檔案大小與讀取時間（一個月的合成逐筆資料）。
+用法（於專案根目錄）：
+    python -m scripts.bench_storage --days 21 --ticks-per-day 200000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.storage import HAS_PYARROW, read_frame, write_frame
+from src.synthetic import ticks_frame
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=21)
+    ap.add_argument("--ticks-per-day", type=int, default=200_000)
+    ap.add_argument("--compression", default="zstd")
+    args = ap.parse_args()
+    fmts = ["csv"] + (["parquet", "feather"] if HAS_PYARROW else [])
+    days = [ticks_frame(args.ticks_per_day, seed=d,
+                        start_time=pd.Timestamp("2025-11-03 08:45") + pd.Timedelta(days=d))
+            for d in range(args.days)]
+    print(f"{args.days} 天 × {args.ticks_per_day} 筆，compression={args.compression}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in fmts:
+            paths = []
+            t0 = time.perf_counter()
+            for d, df in enumerate(days):
+                paths.append(write_frame(df, Path(tmp) / f"day{d}", fmt=fmt, compression=args.compression))
+            wt = time.perf_counter() - t0
+            size = sum(p.stat().st_size for p in paths)
+            t0 = time.perf_counter()
+            rows = sum(len(read_frame(p)) for p in paths)
+            rt = time.perf_counter() - t0
+            print(f"{fmt:>8}: size {size / 1e6:8.1f} MB  write {wt:6.2f}s  load {rt:6.2f}s  rows {rows}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+ThreeTickStrategy.on_kbar 每根延遲 benchmark。
+用法（於專案根目錄）：
+    python -m scripts.bench_strategy --bars 1000000 --check 5000
+每 --window 根輸出一次平均延遲，延遲應不隨 session 長度上升。
+--check N 會以 pandas（utils.atr）重算前 N 根並逐根比對訊號。
+"""
+import argparse
+import time
+
+from src.strategy import ThreeTickStrategy
+from src.synthetic import iter_kbars
+
+def pandas_signals(kbars, fee_ticks):
+    """參考實作：整段重算 ATR 與方向，回傳每根的 (side, stop_ticks) 或 None。"""
+    import pandas as pd
+    from src.utils import atr
+    df = pd.DataFrame(kbars)
+    df["atr"] = atr(df["high"], df["low"], df["close"], period=14)
+    diff = df["close"].diff()
+    up = (diff > 0).rolling(3).sum() == 3
+    down = (diff < 0).rolling(3).sum() == 3
+    out = []
+    for i in range(len(df)):
+        if i < 14:
+            out.append(None)
+        elif up.iloc[i]:
+            out.append(("buy", max(1.2 * df["atr"].iloc[i], fee_ticks)))
+        elif down.iloc[i]:
+            out.append(("sell", max(1.2 * df["atr"].iloc[i], fee_ticks)))
+        else:
+            out.append(None)
+    return out
+
+def check(n, fee_ticks=4):
+    kbars = list(iter_kbars(n, seed=1))
+    s = ThreeTickStrategy(fee_ticks=fee_ticks)
+    ref = pandas_signals(kbars, fee_ticks)
+    for i, (k, r) in enumerate(zip(kbars, ref)):
+        sig = s.on_kbar(k)
+        got = (sig["side"], sig["stop_ticks"]) if sig else None
+        if (got is None) != (r is None) or (got and (got[0] != r[0] or abs(got[1] - r[1]) > 1e-9)):
+            raise SystemExit(f"訊號不一致 bar={i}: incremental={got} pandas={r}")
+    print(f"check OK：{n} 根訊號與 pandas 版本一致（{sum(r is not None for r in ref)} 個訊號）")
+
+def bench(n, window):
+    s = ThreeTickStrategy()
+    clock = time.perf_counter_ns
+    total = 0
+    acc = 0
+    for i, k in enumerate(iter_kbars(n), 1):
+        t0 = clock()
+        s.on_kbar(k)
+        acc += clock() - t0
+        if i % window == 0:
+            print(f"bars {i - window + 1:>9}-{i:<9} avg {acc / window / 1000:.3f} us/bar")
+            total += acc
+            acc = 0
+    total += acc
+    print(f"total {n} bars, avg {total / n / 1000:.3f} us/bar")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bars", type=int, default=1_000_000)
+    ap.add_argument("--window", type=int, default=100_000)
+    ap.add_argument("--check", type=int, default=0)
+    args = ap.parse_args()
+    if args.check:
+        check(args.check)
+    bench(args.bars, args.window)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+可重現的 benchmark 套件：以合成 TMF 逐筆（固定 seed、分段產生）量測各階段的吞吐量、延遲與峰值記憶體，
+結果寫成 JSON，並可與先前存下的 baseline 比較。全程離線，不需登入 Shioaji。
+
+階段：
+- ingest         ticks_to_3tick_kbar（整批聚合 + 寫檔），每段一次呼叫
+- quote_manager  QuoteManager.on_tick（逐筆）
+- strategy       ThreeTickStrategy.on_kbar（逐根）
+- backtest       Backtester.run(mode="vectorized")
+- backtest_event Backtester.run(mode="event")（逐根 iterrows，只跑 --event-max 以下的大小）
+
+每個 (階段, 大小) 在獨立子行程執行，峰值記憶體為該子行程的 ru_maxrss（無 resource 模組的平台記為 null；rss_delta_mb 扣除階段開始前的 RSS）；
+latency 為每 1024 筆（或每段）的平均單筆時間分佈。資料產生時間不計入，正式量測前先以少量資料暖機一次。
+
+用法（於專案根目錄）：
+    python -m scripts.bench_suite --sizes 10k 100k 1m --out bench/baseline.json
+    python -m scripts.bench_suite --sizes 10k 100k 1m --compare bench/baseline.json --threshold 10
+    python -m scripts.bench_suite --full --repeat 1            # 10k ~ 50m（50m 約需數 GB 記憶體）
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+STAGES = ("ingest", "quote_manager", "strategy", "backtest", "backtest_event")
+DEFAULT_SIZES = ("10k", "100k", "1m")
+FULL_SIZES = ("10k", "100k", "1m", "10m", "50m")
+CHUNK = 1_000_000
+BATCH = 1024
+SEED = 7
+WARMUP = 3_000
+CONFIG = {"fee_ticks": 4, "slippage_ticks": 0.5,
+          "backtest": {"initial_capital": 1_000_000, "risk_per_trade_pct": 0.5}}
+
+def parse_size(text) -> int:
+    text = str(text).strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+def _rss_mb():
+    """目前 RSS（Linux 讀 /proc，其他平台退回 ru_maxrss；皆無法取得時為 None）。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return _peak_rss_mb()
+
+def _peak_rss_mb():
+    """峰值 RSS（ru_maxrss）；無 resource 模組的平台（Windows）回傳 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def tick_chunks(n, chunk=CHUNK, seed=SEED):
+    """依序產生 n 筆逐筆（每段 chunk 筆，時間接續），同一 (n, chunk, seed) 結果相同。"""
+    from src.synthetic import START_TIME, ticks_frame
+    start, i = START_TIME, 0
+    while n > 0:
+        df = ticks_frame(min(chunk, n), seed=seed + i, start_time=start)
+        start = df["time"].iloc[-1]
+        n -= len(df)
+        i += 1
+        yield df
+
+def kbar_frame(n):
+    """n 筆逐筆聚合的 3-tick Kbar（DataFrame，time 為 Timestamp）。"""
+    import pandas as pd
+    from src.tick_aggregator import TickAggregator
+    agg = TickAggregator(3)
+    frames = [agg.push(df) for df in tick_chunks(n)]
+    bars = pd.concat(frames, ignore_index=True)
+    bars["time"] = pd.to_datetime(bars["time"], format="ISO8601")
+    return bars
+
+class _Timer:
+    """累計階段時間，並把每批的平均單筆時間記入 LatencyHistogram。"""
+    def __init__(self):
+        from src.latency import LatencyHistogram
+        self.hist = LatencyHistogram()
+        self.seconds = 0.0
+
+    def add(self, ns, items=1):
+        self.seconds += ns / 1e9
+        self.hist.record(ns // max(items, 1))
+
+def _per_item(timer, items, fn):
+    """items 以 BATCH 筆一批呼叫 fn，記錄每批時間。"""
+    now = time.perf_counter_ns
+    for k in range(0, len(items), BATCH):
+        batch = items[k:k + BATCH]
+        t0 = now()
+        for x in batch:
+            fn(x)
+        timer.add(now() - t0, len(batch))
+
+def run_stage(stage, n) -> dict:
+    """在目前行程執行一個階段，回傳結果 dict。"""
+    import gc
+    from src.backtest import Backtester
+    from src.quote_manager import QuoteManager
+    from src.strategy import ThreeTickStrategy
+    timer = _Timer()
+    items = n
+    now = time.perf_counter_ns
+    if stage == "ingest":
+        import src.shioaji_fetch_and_convert as fc
+        from src.tick_aggregator import TickAggregator
+        agg = TickAggregator(3)
+        rss0 = _rss_mb()
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            for i, df in enumerate(tick_chunks(n)):
+                t0 = now()
+                fc.ticks_to_3tick_kbar(df, Path(tmp) / f"kbar_{i}", aggregator=agg)
+                timer.add(now() - t0, len(df))
+    elif stage == "quote_manager":
+        qm = QuoteManager(ticks_per_kbar=3)
+        rss0 = _rss_mb()
+        for df in tick_chunks(n):
+            df["time"] = df["time"].dt.to_pydatetime()
+            ticks = df[["time", "price", "volume"]].to_dict("records")
+            del df
+            _per_item(timer, ticks, qm.on_tick)
+    elif stage == "strategy":
+        bars = kbar_frame(n)
+        items = len(bars)
+        rss0 = _rss_mb()
+        strategy = ThreeTickStrategy()
+        for k in range(0, len(bars), CHUNK):
+            _per_item(timer, bars.iloc[k:k + CHUNK].to_dict("records"), strategy.on_kbar)
+    elif stage in ("backtest", "backtest_event"):
+        bars = kbar_frame(n)
+        items = len(bars)
+        gc.collect()
+        rss0 = _rss_mb()
+        bt = Backtester(CONFIG, bars)
+        t0 = now()
+        trades = bt.run(mode="vectorized" if stage == "backtest" else "event")
+        timer.add(now() - t0, len(bars))
+        del trades
+    else:
+        raise ValueError(f"unknown stage: {stage}")
+    peak = _peak_rss_mb()
+    h = timer.hist
+    return {
+        "stage": stage, "ticks": n, "items": items,
+        "seconds": round(timer.seconds, 4),
+        "items_per_s": round(items / timer.seconds, 1) if timer.seconds else None,
+        "ticks_per_s": round(n / timer.seconds, 1) if timer.seconds else None,
+        "latency_us": {"p50_us": round(h.percentile(50) / 1e3, 3), "p99_us": round(h.percentile(99) / 1e3, 3),
+                       "max_us": round(h.max / 1e3, 3)},
+        "peak_rss_mb": None if peak is None else round(peak, 1),
+        "rss_delta_mb": None if peak is None or rss0 is None else round(max(peak - rss0, 0.0), 1),
+    }
+
+def _mb(value, width=0) -> str:
+    return f"{value:>{width}.0f}" if value is not None else f"{'-':>{width}}"
+
+def run_isolated(stage, n, repeat=1) -> dict:
+    """每次在新子行程執行（記憶體量測互不影響），取最快的一次。"""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-m", "scripts.bench_suite", "--worker", stage, str(n)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"{stage} {n} 失敗：\n{out.stderr[-2000:]}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+def environment() -> dict:
+    import numpy as np
+    import pandas as pd
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    return {"created": datetime.now().isoformat(timespec="seconds"), "git": rev,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "seed": SEED, "chunk": CHUNK}
+
+def _key(r):
+    return r["stage"], r["ticks"]
+
+def compare(results, baseline, threshold) -> list:
+    """回傳吞吐量下降超過 threshold% 的 (stage, ticks, 變化%) 清單，並印出比較表。"""
+    base = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n與 baseline 比較（{baseline['meta'].get('git', '?')} @ {baseline['meta'].get('created', '?')}）")
+    print(f"{'stage':<16}{'ticks':>12}{'base/s':>14}{'now/s':>14}{'change':>9}{'peak MB':>16}")
+    for r in results:
+        b = base.get(_key(r))
+        if b is None or not b["items_per_s"] or not r["items_per_s"]:
+            continue
+        change = (r["items_per_s"] / b["items_per_s"] - 1) * 100
+        flag = ""
+        if change < -threshold:
+            flag = "  <-- 退步"
+            regressions.append((r["stage"], r["ticks"], round(change, 1)))
+        mem = f"{_mb(b.get('peak_rss_mb'))}->{_mb(r['peak_rss_mb'])}"
+        print(f"{r['stage']:<16}{r['ticks']:>12,}{b['items_per_s']:>14,.0f}{r['items_per_s']:>14,.0f}"
+              f"{change:>+8.1f}%{mem:>16}{flag}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ingest / QuoteManager / strategy / backtest benchmark 套件")
+    ap.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES), help="逐筆筆數，如 10k 1m 50m")
+    ap.add_argument("--full", action="store_true", help=f"使用 {' '.join(FULL_SIZES)}")
+    ap.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    ap.add_argument("--event-max", default="100k", help="backtest_event 只跑此大小以下（逐根 iterrows 很慢）")
+    ap.add_argument("--repeat", type=int, default=3, help="每項重跑次數，取最快")
+    ap.add_argument("--out", help="結果 JSON 路徑（預設 bench/results_<時間>.json）")
+    ap.add_argument("--compare", help="baseline JSON；吞吐量下降超過 --threshold%% 時結束碼為 1")
+    ap.add_argument("--threshold", type=float, default=10.0)
+    ap.add_argument("--worker", nargs=2, metavar=("STAGE", "TICKS"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        stage, n = args.worker[0], int(args.worker[1])
+        # 先以少量資料跑一次（不計），避免首次呼叫的載入 / 配置成本落在小資料的結果
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_stage(stage, min(n, WARMUP))
+        print(json.dumps(run_stage(stage, n)))
+        return 0
+
+    sizes = [parse_size(s) for s in (FULL_SIZES if args.full else args.sizes)]
+    event_max = parse_size(args.event_max)
+    results = []
+    print(f"{'stage':<16}{'ticks':>12}{'items/s':>14}{'ticks/s':>14}{'p50 us':>9}{'p99 us':>9}"
+          f"{'max us':>10}{'peak MB':>9}{'+MB':>8}")
+    for stage in args.stages:
+        for n in sizes:
+            if stage == "backtest_event" and n > event_max:
+                continue
+            r = run_isolated(stage, n, args.repeat)
+            results.append(r)
+            lat = r["latency_us"]
+            print(f"{stage:<16}{n:>12,}{r['items_per_s']:>14,.0f}{r['ticks_per_s']:>14,.0f}"
+                  f"{lat['p50_us']:>9.2f}{lat['p99_us']:>9.2f}{lat['max_us']:>10.1f}"
+                  f"{_mb(r['peak_rss_mb'], 9)}{_mb(r['rss_delta_mb'], 8)}", flush=True)
+
+    out = Path(args.out or f"bench/results_{datetime.now():%Y%m%d_%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"meta": environment(), "results": results}, indent=1), encoding="utf-8")
+    print(f"\n結果已寫入 {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 項吞吐量下降超過 {args.threshold}%：{regressions}")
+            return 1
+        print("\n沒有超過門檻的退步。")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
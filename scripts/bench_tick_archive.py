@@ -0,0 +1,90 @@
+"""
+比較逐筆的讀取方式：csv / parquet 分區（PartitionedStore.read）與 memmap tick archive（TickArchive.columns），
+並以多個行程同時開啟同一個 archive，檢查各行程的 PSS（共用的 page 平均分攤）。
+archive 產生的 3-tick Kbar（全部交易日）與 ReplayBacktester 交易（單日）須與 csv 分區完全相同。
+用法（於專案根目錄）：
+    python -m scripts.bench_tick_archive --days 10 --ticks-per-day 200000 --workers 4
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.replay import ReplayBacktester
+from src.storage import HAS_PYARROW, PartitionedStore
+from src.synthetic import ticks_frame
+from src.tick_aggregator import TickAggregator
+from src.tick_archive import TickArchive
+
+def _smaps():
+    """(RSS, PSS) MB；非 Linux 回傳 (None, None)。"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            vals = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split(":")[0] in ("Rss", "Pss")}
+        return vals["Rss"] / 1024, vals["Pss"] / 1024
+    except OSError:
+        return None, None
+
+def _worker(root):
+    t0 = time.perf_counter()
+    cols = TickArchive(root).columns("TMF")
+    bars = TickAggregator(3).push(cols)
+    float(cols["price"].sum())           # 觸及所有 page
+    return time.perf_counter() - t0, len(bars), *_smaps()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=10)
+    ap.add_argument("--ticks-per-day", type=int, default=200_000)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fmts = ["csv"] + (["parquet"] if HAS_PYARROW else [])
+        start = pd.Timestamp("2025-11-03 08:45")
+        for i in range(args.days):
+            day = start + pd.Timedelta(days=i)
+            df = ticks_frame(args.ticks_per_day, seed=i, start_time=day)
+            for fmt in fmts:
+                PartitionedStore(tmp / fmt).write("TMF", day.strftime("%Y-%m-%d"), df, fmt=fmt)
+        t0 = time.perf_counter()
+        arc = TickArchive(tmp / "archive")
+        arc.build(tmp / fmts[-1], quality=None)   # 與 csv / parquet 分區比較同一份原始資料
+        print(f"build archive（由 {fmts[-1]}）：{time.perf_counter() - t0:.2f}s")
+        n = args.days * args.ticks_per_day
+        print(f"{n:,} 筆逐筆，讀取 + 3-tick 聚合：")
+        ref = None
+        for fmt in fmts:
+            t0 = time.perf_counter()
+            df = PartitionedStore(tmp / fmt).read("TMF")
+            t1 = time.perf_counter()
+            bars = TickAggregator(3).push(df)
+            ref = bars if ref is None else ref
+            print(f"{fmt:>10}: 讀取 {t1 - t0:7.3f}s  聚合 {time.perf_counter() - t1:6.3f}s")
+        t0 = time.perf_counter()
+        cols = TickArchive(tmp / "archive").columns("TMF")
+        t1 = time.perf_counter()
+        bars = TickAggregator(3).push(cols)
+        print(f"{'archive':>10}: 讀取 {t1 - t0:7.3f}s  聚合 {time.perf_counter() - t1:6.3f}s（memmap view，不複製）")
+        pd.testing.assert_frame_equal(bars, ref, check_dtype=False)
+        mid = arc.days("TMF")[len(arc.days("TMF")) // 2]
+        t0 = time.perf_counter()
+        one = arc.columns("TMF", mid, mid)
+        print(f"單日 seek（{mid}）：{(time.perf_counter() - t0) * 1e3:.3f} ms，{len(one['price']):,} 筆")
+        trades = ReplayBacktester({}).run(one)
+        expected = ReplayBacktester({}).run(PartitionedStore(tmp / "csv").read("TMF", mid, mid))
+        pd.testing.assert_frame_equal(trades, expected, check_dtype=False)
+        print(f"Kbar {len(bars):,} 根、單日重播 {len(trades)} 筆交易與 csv 相同")
+        with ProcessPoolExecutor(args.workers) as ex:
+            results = list(ex.map(_worker, [tmp / "archive"] * args.workers))
+        size = n * 40 / 2**20
+        print(f"{args.workers} 個行程同時讀取 archive（檔案 {size:.0f} MB）：")
+        for i, (dt, bars, rss, pss) in enumerate(results):
+            mem = f"RSS {rss:7.1f} MB  PSS {pss:7.1f} MB" if rss is not None else ""
+            print(f"  worker {i}: {dt:.3f}s  {bars:,} 根  {mem}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+快照 warm start 驗證與計時。
+以合成逐筆模擬：跑到第 --snapshot-at 筆時經 QuotePipeline 寫快照，之後的 tick 由 BufferedRecorder 記錄；
+重新建立策略、還原快照並補算其餘 tick，比對訊號與不中斷執行的結果，並比較冷啟動（讀整段 Kbar 算指標）的時間。
+用法（於專案根目錄）：
+    python -m scripts.bench_warm_start --ticks 300000 --snapshot-at 250000 --history-bars 2000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from src.kline import KlineInitializer
+from src.pipeline import QuotePipeline
+from src.quote_manager import QuoteManager
+from src.recorder import BufferedRecorder
+from src.snapshot import catch_up, load_snapshot, recorded_ticks, restore_snapshot
+from src.storage import read_frame, write_frame
+from src.strategy import ThreeTickStrategy
+from src.synthetic import kbars_frame, ticks_frame
+
+def signals_of(ticks):
+    qm, s, out = QuoteManager(ticks_per_kbar=3), ThreeTickStrategy(), []
+    for tick in ticks:
+        k = qm.on_tick(tick)
+        if k is not None:
+            sig = s.on_kbar(k)
+            if sig:
+                out.append((k["time"], sig["side"], sig["stop_ticks"]))
+    return out, s
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=300_000)
+    ap.add_argument("--snapshot-at", type=int, default=250_000)
+    ap.add_argument("--history-bars", type=int, default=2_000_000)
+    args = ap.parse_args()
+    df = ticks_frame(args.ticks, seed=8, start_time="2025-11-26 08:45:00")
+    ticks = df[["time", "price", "volume"]].to_dict("records")
+    ref, ref_strategy = signals_of(ticks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        snap_path = tmp / "session.pkl"
+        # 第一段：管線執行到 snapshot_at，stop() 寫出最後快照；之後的 tick 只被記錄（模擬停機期間）
+        first = []
+        pipe = QuotePipeline(QuoteManager(ticks_per_kbar=3), ThreeTickStrategy(), overflow="block",
+                             on_signal=first.append, snapshot_path=snap_path, snapshot_interval=0).start()
+        for tick in ticks[:args.snapshot_at]:
+            pipe.on_tick(tick)
+        pipe.stop()
+        rec = BufferedRecorder(tmp / "records")
+        for tick in ticks:
+            rec.record(tick)
+        rec.close()
+
+        # warm start：還原快照 + 補算快照之後的 tick
+        t0 = time.perf_counter()
+        strategy, qm = ThreeTickStrategy(), QuoteManager(ticks_per_kbar=3)
+        snapshot = load_snapshot(snap_path)
+        restore_snapshot(snapshot, strategy, qm)
+        t_restore = time.perf_counter() - t0
+        later = []
+        n, _, _ = catch_up(snapshot, recorded_ticks(tmp / "records", snapshot), strategy, qm,
+                           on_signal=later.append)
+        t_warm = time.perf_counter() - t0
+        ok = (strategy.bars_seen == ref_strategy.bars_seen and strategy.atr.value == ref_strategy.atr.value
+              and len(first) + len(later) == len(ref))
+        print(f"快照 {snap_path.stat().st_size} bytes；還原 {t_restore * 1000:.2f} ms，"
+              f"補算 {n} 筆 tick 共 {t_warm * 1000:.0f} ms；與不中斷執行一致：{ok}")
+        if not ok:
+            raise SystemExit(1)
+
+        # 冷啟動：讀整段歷史 Kbar、計算指標，且策略仍需 warmup 根 Kbar 才會出訊號
+        hist = write_frame(kbars_frame(args.history_bars, seed=1), tmp / "history")
+        t0 = time.perf_counter()
+        k = KlineInitializer()
+        k.kbars = read_frame(hist)
+        k.compute_indicators()
+        k.get_indicators()
+        t_cold = time.perf_counter() - t0
+        print(f"冷啟動：{args.history_bars} 根歷史 Kbar 載入 + 指標 {t_cold * 1000:.0f} ms，"
+              f"之後仍需 {ThreeTickStrategy().warmup} 根即時 Kbar 暖機")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+比對 Backtester 的 event 與 vectorized 兩種模式，並量測 vectorized 速度。
+含出場模擬（src/exits.py）。
+用法（於專案根目錄）：
+    python -m scripts.check_backtest_modes --bars 20000 --bench 20000000
+"""
+import argparse
+import time
+
+from src.backtest import Backtester
+from src.synthetic import kbars_frame
+
+CONFIG = {"fee_ticks": 4, "slippage_ticks": 0.5,
+          "backtest": {"initial_capital": 1_000_000, "risk_per_trade_pct": 0.5}}
+
+def compare(n):
+    df = kbars_frame(n, seed=2)
+    bt = Backtester(CONFIG, df)
+    ev = bt.run(mode="event")
+    vec = Backtester(CONFIG, df).run(mode="vectorized")
+    if len(ev) != len(vec):
+        raise SystemExit(f"交易筆數不同：event={len(ev)} vectorized={len(vec)}")
+    for i, (a, b) in enumerate(zip(ev, vec)):
+        if any(a[k] != b[k] for k in ("side", "size", "time", "exit_time", "exit_reason", "holding_bars")) or \
+                any(abs(a[k] - b[k]) > 1e-9 for k in ("entry", "stop", "target", "exit_price", "pnl")):
+            raise SystemExit(f"第 {i} 筆交易不同：event={a} vectorized={b}")
+    print(f"check OK：{n} 根 Kbar，兩種模式皆 {len(ev)} 筆交易且完全一致")
+
+def bench(n):
+    df = kbars_frame(n, seed=3)
+    t0 = time.perf_counter()
+    trades = Backtester(CONFIG, df).run_vectorized()
+    dt = time.perf_counter() - t0
+    print(f"vectorized：{n} 根 Kbar，{len(trades)} 筆交易，{dt:.2f}s（{n / dt / 1e6:.1f}M bars/s）")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bars", type=int, default=20_000)
+    ap.add_argument("--bench", type=int, default=0)
+    args = ap.parse_args()
+    compare(args.bars)
+    if args.bench:
+        bench(args.bench)
+
+if __name__ == "__main__":
+    main()
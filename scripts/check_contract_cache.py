@@ -0,0 +1,64 @@
+"""
+離線檢查合約快取的選約邏輯（不需 shioaji）：以假的 api 合約表比對快取選約與直接掃描合約表的結果，
+並量測快取命中 / 過期兩種情況的選約時間。
+用法（於專案根目錄）：
+    python -m scripts.check_contract_cache --groups 300
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.contracts import ContractCache, select_contract, trading_day
+
+class FakeFutures(SimpleNamespace):
+    def __getitem__(self, code):
+        for group in vars(self).values():
+            for c in group:
+                if c.code == code:
+                    return c
+        raise KeyError(code)
+
+def fake_api(groups):
+    """TMF 合約（含 R1/R2 與已到期合約）及 groups 個其他商品，各 8 個月份。"""
+    def month(sym, i, suffix=None):
+        return SimpleNamespace(code=f"{sym}{suffix or 'ABCDEFGH'[i]}6", symbol=f"{sym}2026{i + 1:02d}",
+                               category=sym, delivery_month=f"2026{i + 1:02d}",
+                               delivery_date=f"2026/{i + 1:02d}/15", exchange="TAIFEX", name=sym, unit=1)
+    futs = {"TMF": [month("TMF", i) for i in range(8)] + [month("TMF", 0, "R1"), month("TMF", 0, "R2")]}
+    for g in range(groups):
+        futs[f"X{g:03d}"] = [month(f"X{g:03d}", i) for i in range(8)]
+    api = SimpleNamespace(Contracts=SimpleNamespace(Futures=FakeFutures(**futs)), downloads=0)
+    api.fetch_contracts = lambda contract_download=True: setattr(api, "downloads", api.downloads + 1)
+    return api
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--groups", type=int, default=300)
+    args = ap.parse_args()
+    now = datetime(2026, 3, 20, 9, 0)      # 一至三月合約已到期（每月 15 日交割），近月應為四月
+    api = fake_api(args.groups)
+    assert trading_day(datetime(2026, 3, 20, 16, 0)) == "2026-03-23"   # 週五夜盤 -> 週一
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "contracts.json"
+        t0 = time.perf_counter()
+        cache = ContractCache(path, now=now)
+        stale = not cache.is_fresh("TMF")
+        c = select_contract(api, "TMF", cache)
+        miss = time.perf_counter() - t0
+        assert stale and c.code == "TMFD6", c.code
+        t0 = time.perf_counter()
+        cache = ContractCache(path, now=now)
+        assert cache.is_fresh("TMF")
+        c = select_contract(api, "TMF", cache)
+        hit = time.perf_counter() - t0
+        assert c.code == "TMFD6" and api.downloads == 0
+        # 跨交易日後快取過期
+        assert not ContractCache(path, now=datetime(2026, 3, 20, 15, 5)).is_fresh("TMF")
+        print(f"check OK：近月 {c.code}（排除 R1/R2 與已到期合約）")
+        print(f"快取過期（掃描合約表並寫檔）：{miss * 1000:.2f} ms；快取命中：{hit * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
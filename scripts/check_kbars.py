@@ -1,25 +1,37 @@
-﻿from src.kline import KlineInitializer
+﻿import argparse
 import json
 from pathlib import Path
 
-# 讀 config
-cfg_path = Path("config/config.json")
-if not cfg_path.exists():
-    print("找不到 config/config.json，請確認檔案存在。")
-    raise SystemExit(1)
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="檢查 data/kbars_3tick 是否有可讀的 Kbar")
+    ap.add_argument("--config", default="config/config.json")
+    args = ap.parse_args(argv)
 
-cfg = json.load(open(cfg_path, "r", encoding="utf-8"))
+    # 讀 config
+    cfg_path = Path(args.config)
+    if not cfg_path.exists():
+        print(f"找不到 {cfg_path}，請確認檔案存在。")
+        return 1
 
-# 建一個簡單的 KlineInitializer（不需要 api）
-k = KlineInitializer(api=None, contract=None,
-                     start=cfg.get("backtest", {}).get("start"),
-                     end=cfg.get("backtest", {}).get("end"))
+    cfg = json.load(open(cfg_path, "r", encoding="utf-8"))
 
-df = k.fetch_kline()
+    # pandas 由 kline 載入；放在讀完設定之後，缺設定時不必等待
+    from src.kline import KlineInitializer
 
-print("kbars empty:", df.empty)
-print("columns:", list(df.columns))
-if not df.empty:
-    print(df.head(5).to_string(index=False))
-else:
-    print("kbars 為空，請確認 data/kbars_3tick 內是否有可讀的 CSV。")
+    # 建一個簡單的 KlineInitializer（不需要 api）
+    k = KlineInitializer(api=None, contract=None,
+                         start=cfg.get("backtest", {}).get("start"),
+                         end=cfg.get("backtest", {}).get("end"))
+
+    df = k.fetch_kline()
+
+    print("kbars empty:", df.empty)
+    print("columns:", list(df.columns))
+    if not df.empty:
+        print(df.head(5).to_string(index=False))
+    else:
+        print("kbars 為空，請確認 data/kbars_3tick 內是否有可讀的資料檔（parquet/feather/csv）。")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
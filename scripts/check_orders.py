@@ -0,0 +1,57 @@
+"""
+檢查委託管理與本機模擬交易所：
+1. latency_ticks=1 時，OrderManager + SimulatedExchange 的交易須與 ReplayBacktester(latency_ticks=1) 相同
+   （兩者皆為單一部位、市價進場、停損市價 / 目標限價出場、結束時市價平倉）
+2. 每組括號單結束後不得殘留 working 委託（OCO 撤單），TickEngine 部位須歸零
+3. 吞吐量與 signal_to_submit / fill_to_oco / submit_to_fill 延遲
+用法（於專案根目錄）：
+    python -m scripts.check_orders --ticks 200000
+"""
+import argparse
+
+from src.latency import LatencyRecorder
+from src.orders import run_simulation
+from src.replay import ReplayBacktester
+from src.synthetic import ticks_frame
+
+FIELDS = ("side", "time", "entry", "stop", "target", "size", "exit_time", "exit_price", "exit_reason", "pnl")
+
+def check(n):
+    ticks = ticks_frame(n, seed=5)
+    ref = ReplayBacktester({}, latency_ticks=1).run(ticks).to_dict("records")
+    manager, exchange, _ = run_simulation(ticks, latency_ticks=1)
+    got = manager.trades
+    if len(got) != len(ref):
+        raise SystemExit(f"交易筆數不同：orders={len(got)} replay={len(ref)}")
+    for j, (a, b) in enumerate(zip(got, ref)):
+        for k in FIELDS:
+            x, y = a[k], b[k]
+            same = abs(x - y) < 1e-6 if isinstance(x, float) else x == y
+            if not same:
+                raise SystemExit(f"第 {j} 筆 {k} 不同：orders={x} replay={y}")
+    left = manager.working()
+    if left:
+        raise SystemExit(f"仍有 {len(left)} 筆 working 委託：{[o.as_dict() for o in left[:3]]}")
+    if manager.engine.state.position != 0:
+        raise SystemExit(f"部位未歸零：{manager.engine.state.position}")
+    cancelled = sum(o.status == "cancelled" for o in manager.orders.values())
+    print(f"check OK：{n:,} 筆 tick，{len(got)} 筆交易與 ReplayBacktester 相同，OCO 撤單 {cancelled} 筆")
+
+def bench(n):
+    ticks = ticks_frame(n, seed=6)
+    lat = LatencyRecorder(("signal_to_submit", "fill_to_oco", "submit_to_fill"))
+    manager, exchange, dt = run_simulation(ticks, latency_ticks=1, latency=lat)
+    print(f"bench：{n:,} 筆 tick，{dt:.2f}s（{n / dt:,.0f} ticks/s），委託 {len(manager.orders)} 筆")
+    print(lat.format())
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=200_000)
+    ap.add_argument("--bench", type=int, default=1_000_000)
+    args = ap.parse_args(argv)
+    check(args.ticks)
+    bench(args.bench)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
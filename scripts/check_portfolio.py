@@ -0,0 +1,70 @@
+"""
+檢查投資組合回測：
+1. 單一 leg、不複利、不設保證金 / 槓桿上限時，交易須與 vectorized_trades 依序過濾重疊部位後的結果相同
+2. 三個 leg 串流合併的吞吐量與峰值記憶體（tracemalloc），記憶體不應隨根數成長
+用法（於專案根目錄）：
+    python -m scripts.check_portfolio --bars 50000 --bench 100000 400000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.backtest import vectorized_trades
+from src.portfolio import Leg, Portfolio, frame_bars
+from src.strategy import ThreeTickStrategy
+from src.synthetic import iter_kbars, kbars_frame
+
+def check(n):
+    df = kbars_frame(n, seed=4)
+    ref = vectorized_trades(df, ThreeTickStrategy(), 1_000_000, 0.5)
+    # 同一時間只持有一個部位：進場根 >= 上一筆出場根 才接受
+    idx = np.flatnonzero(df["time"].isin(ref["time"]).to_numpy())
+    taken, last_exit = [], -1
+    for j, (i, hold) in enumerate(zip(idx, ref["holding_bars"])):
+        if i >= last_exit:
+            taken.append(j)
+            last_exit = i + hold
+    ref = ref.iloc[taken].reset_index(drop=True)
+    pf = Portfolio([Leg("TMF", frame_bars(df), margin=0)], capital=1_000_000, risk_pct=0.5,
+                   compound=False, max_margin_pct=1.0)
+    got = pf.run()
+    if len(got) != len(ref):
+        raise SystemExit(f"交易筆數不同：portfolio={len(got)} reference={len(ref)}")
+    for j, (a, b) in enumerate(zip(got, ref.to_dict("records"))):
+        if a["side"] != b["side"] or a["size"] != b["size"] or a["exit_reason"] != b["exit_reason"] \
+                or a["holding_bars"] != b["holding_bars"] or abs(a["pnl"] - b["pnl"]) > 1e-6:
+            raise SystemExit(f"第 {j} 筆不同：portfolio={a} reference={b}")
+    print(f"check OK：{n} 根 Kbar，{len(got)} 筆交易與 vectorized_trades（不重疊）相同")
+
+def _run(n):
+    legs = [Leg(name, iter_kbars(n, seed=i)) for i, name in enumerate(("TMF", "MXF", "TXF"))]
+    pf = Portfolio(legs, max_leverage=5.0)
+    pf.run()
+    return pf
+
+def bench(n):
+    t0 = time.perf_counter()
+    pf = _run(n)
+    dt = time.perf_counter() - t0
+    # 記憶體另跑一次（tracemalloc 會大幅拖慢速度，不與計時混用）
+    tracemalloc.start()
+    _run(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    s = pf.summary()
+    print(f"3 legs x {n:,} 根（含合成資料產生）：{dt:.2f}s（{3 * n / dt:,.0f} bars/s），峰值 {peak / 2**20:.1f} MB，"
+          f"交易 {s['trades']}，權益 {s['final_equity']:,.0f}，MDD {s['max_drawdown']:,.0f}，略過 {s['rejected']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bars", type=int, default=50_000)
+    ap.add_argument("--bench", type=int, nargs="*", default=[100_000, 400_000])
+    args = ap.parse_args()
+    check(args.bars)
+    for n in args.bench:
+        bench(n)
+
+if __name__ == "__main__":
+    main()
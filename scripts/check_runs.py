@@ -0,0 +1,119 @@
+"""
+檢查回測結果登錄：
+1. run_metrics 的 Sharpe / 最大回撤 / 勝率 / 期望值 / 持倉分佈與逐筆 pandas 計算的結果相同
+2. record 後交易、權益曲線、設定可原樣讀回；reindex 重建的索引與逐次更新的索引相同；
+   參數型態不一致（strategy.rr 為 2.0 與 "x"）時仍可登錄；寫入失敗時不留下 run 目錄
+3. 登錄 N 個 run 後，只讀索引的查詢耗時（不讀任何交易檔）
+用法（於專案根目錄）：
+    python -m scripts.check_runs --runs 2000
+"""
+import argparse
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import Backtester
+from src.runs import RunRegistry, duration_distribution, run_metrics
+from src.synthetic import kbars_frame
+
+CAPITAL = 1_000_000
+
+def reference(trades: pd.DataFrame) -> dict:
+    """不經向量化捷徑的參考計算。"""
+    pnl = trades["pnl"].astype(float)
+    exit_day = pd.to_datetime(trades["exit_time"]).dt.normalize()
+    days = pd.bdate_range(pd.to_datetime(trades["time"]).min().normalize(), exit_day.max())
+    daily = pnl.groupby(exit_day).sum().reindex(days.union(exit_day.unique()), fill_value=0.0) / CAPITAL
+    equity = CAPITAL + pnl.cumsum()
+    equity = pd.concat([pd.Series([float(CAPITAL)]), equity], ignore_index=True)
+    dd = equity.cummax() - equity
+    return {"sharpe": daily.mean() / daily.std() * math.sqrt(252), "max_drawdown": dd.max(),
+            "max_drawdown_pct": (dd / equity.cummax()).max() * 100, "win_rate": (pnl > 0).mean(),
+            "expectancy": pnl.mean(), "hold_bars_p50": trades["holding_bars"].median()}
+
+def check(root):
+    bars = kbars_frame(30_000, seed=12)
+    bars["time"] = bars["time"] + pd.to_timedelta(np.arange(len(bars)) // 2000, unit="D")   # 跨多個交易日
+    cfg = {"fee_ticks": 1, "slippage_ticks": 0.5, "strategy": {"rr": 2.2, "atr_period": 10},
+           "backtest": {"initial_capital": CAPITAL}}
+    trades = pd.DataFrame(Backtester(cfg, bars).run(mode="vectorized"))
+    got = run_metrics(trades, CAPITAL)
+    for k, v in reference(trades).items():
+        if abs(got[k] - v) > 1e-9 * max(1.0, abs(v)):
+            raise SystemExit(f"{k}：run_metrics={got[k]} reference={v}")
+    dist = duration_distribution(trades)
+    if dist["trades"].sum() != len(trades):
+        raise SystemExit("持倉分佈筆數不等於交易筆數")
+
+    reg = RunRegistry(root)
+    rid = reg.record(trades, cfg, name="check", tags=["check"])
+    back = reg.trades(rid)
+    pd.testing.assert_frame_equal(back[["entry", "exit_price", "pnl", "holding_bars"]],
+                                  trades[["entry", "exit_price", "pnl", "holding_bars"]], check_dtype=False)
+    eq = reg.equity(rid)
+    if len(eq) != len(trades) + 1 or abs(eq["equity"].iloc[-1] - (CAPITAL + trades["pnl"].sum())) > 1e-6:
+        raise SystemExit("權益曲線與交易不符")
+    if reg.config(rid)["config"] != cfg or reg.query(f"run_id == '{rid}'")["p_rr"].iloc[0] != 2.2:
+        raise SystemExit("設定 / 參數欄未正確登錄")
+    reg.record(trades.head(5), {**cfg, "strategy": {**cfg["strategy"], "rr": "x"}}, name="mixed")
+    reg.compact()
+    if sorted(RunRegistry(root).index()["p_rr"].astype(str)) != ["2.2", "x"]:
+        raise SystemExit("參數型態不一致時索引未正確合併")
+    dirs = set(Path(root).iterdir())
+    reg.pending_path.mkdir()          # 讓索引寫入失敗
+    try:
+        reg.record(trades, cfg, name="broken")
+        raise SystemExit("索引寫入失敗時 record 未丟出例外")
+    except OSError:
+        pass
+    reg.pending_path.rmdir()
+    if set(Path(root).iterdir()) != dirs:
+        raise SystemExit("record 失敗後留下 run 目錄")
+    reg.remove(reg.query("name == 'mixed'")["run_id"])
+    print(f"check OK：{len(trades)} 筆交易，sharpe {got['sharpe']:.3f}，"
+          f"max_drawdown {got['max_drawdown']:,.0f}（{got['max_drawdown_pct']:.2f}%）")
+
+def bench(root, n):
+    reg = RunRegistry(root)
+    bars = kbars_frame(5_000, seed=13)
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    for i in range(n):
+        cfg = {"fee_ticks": 1, "slippage_ticks": 0.5,
+               "strategy": {"rr": float(rng.choice([1.5, 1.8, 2.2])), "atr_period": int(rng.choice([10, 14, 20]))},
+               "backtest": {"initial_capital": CAPITAL}}
+        trades = Backtester(cfg, bars.iloc[rng.integers(0, 2_000):]).run(mode="vectorized")
+        reg.record(trades, cfg, name=f"bench-{i}")
+    t_rec = time.perf_counter() - t0
+    before = reg.index()
+    t0 = time.perf_counter()
+    if reg.reindex() != len(before):
+        raise SystemExit("reindex 筆數不符")
+    t_reindex = time.perf_counter() - t0
+    pd.testing.assert_frame_equal(reg.index().sort_values("run_id").reset_index(drop=True),
+                                  before.sort_values("run_id").reset_index(drop=True), check_dtype=False)
+    fresh = RunRegistry(root)
+    t0 = time.perf_counter()
+    top = fresh.query("p_rr == 2.2 and trades > 0", sort="sharpe", limit=10)
+    t_query = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fresh.trades_many(top["run_id"], columns=["time", "pnl"])
+    t_load = time.perf_counter() - t0
+    print(f"bench：{len(before):,} 個 run，record 平均 {t_rec / n * 1000:.1f} ms，reindex {t_reindex:.2f}s，"
+          f"索引查詢 {t_query * 1000:.1f} ms，讀取前 10 名交易 {t_load * 1000:.1f} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=2000)
+    args = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        check(tmp)
+        bench(tmp, args.runs)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
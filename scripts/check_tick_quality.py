@@ -0,0 +1,108 @@
+"""
+檢查逐筆品質階段：
+1. 在合成逐筆中植入已知的缺陷（無效列、時間倒退、重複列、異常價、盤中斷訊、盤後成交），
+   clean_ticks 的報告須逐項命中，清理後須與植入前的資料相同
+2. StreamCleaner 以各種批次大小分批清理（依時間遞增的資料），結果與報告都與整批 clean_ticks 相同
+3. _tick_row 保留 0 值（volume=0、bid=0 不可被當成缺值）
+4. 吞吐量：clean_ticks 與 TickAggregator.push 同樣筆數的耗時比較
+用法（於專案根目錄）：
+    python -m scripts.check_tick_quality --ticks 80000 --bench 5000000
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from src.shioaji_fetch_and_convert import _tick_row
+from src.synthetic import ticks_frame
+from src.tick_aggregator import TickAggregator
+from src.tick_quality import StreamCleaner, clean_ticks
+
+def check(n):
+    base = ticks_frame(n, seed=8)
+    # 合成資料本身可能有同時間、同價量的列；先去掉，植入的缺陷數才是確定的
+    base = base.drop_duplicates(["time", "price", "volume"]).reset_index(drop=True)
+    rng = np.random.default_rng(1)
+    df = base.copy()
+    # 斷訊：第 n/2 筆之後整體延後 10 分鐘（仍在日盤內）
+    half = len(df) // 2
+    df.loc[half:, "time"] += pd.Timedelta(minutes=10)
+    base.loc[half:, "time"] += pd.Timedelta(minutes=10)
+    # 異常價：單筆偏離 5%
+    spikes = rng.choice(np.arange(10, len(df) - 10), size=7, replace=False)
+    df.loc[spikes, "price"] *= 1.05
+    # 重複列
+    dups = df.iloc[rng.choice(len(df), size=11, replace=False)]
+    # 無效列
+    bad = df.iloc[:3].copy()
+    bad["price"] = [np.nan, 0.0, -1.0]
+    # 盤後成交（14:30，會被排到最後）
+    late = df.iloc[[-1]].copy()
+    late["time"] = late["time"].dt.normalize() + pd.Timedelta(hours=14, minutes=30)
+    dirty = pd.concat([df, dups, bad, late], ignore_index=True)
+    # 時間倒退：把一段資料搬到最後
+    moved = dirty.iloc[100:120]
+    dirty = pd.concat([dirty.drop(dirty.index[100:120]), moved], ignore_index=True)
+
+    clean, report = clean_ticks(dirty)
+    expect = {"invalid": 3, "duplicates": 11, "spikes": 7, "off_session": 1}
+    for k, v in expect.items():
+        if report[k] != v:
+            raise SystemExit(f"{k}：報告 {report[k]}，應為 {v}（{report}）")
+    if report["out_of_order"] < 1 or report["gaps"] < 1:
+        raise SystemExit(f"未偵測到時間倒退或斷訊：{report}")
+    if not any(g["seconds"] >= 600 for g in report["gap_list"]):
+        raise SystemExit(f"gap_list 缺少植入的 10 分鐘斷訊：{report['gap_list']}")
+    want = pd.concat([base.drop(index=spikes), late], ignore_index=True)
+    got = clean[want.columns].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+    print(f"check OK：{len(dirty):,} 筆，{ {k: report[k] for k in ('invalid', 'out_of_order', 'duplicates', 'spikes', 'gaps', 'off_session')} }")
+
+    # 串流路徑只接受時間遞增的逐筆（倒退時改走批次），取排序後的資料比較
+    ordered = dirty.sort_values("time", kind="stable").reset_index(drop=True)
+    for kw in ({}, {"spike_window": 3}, {"spike_pct": 0}, {"dedup": False}):
+        # 每批 1 筆只取前 3000 筆（逐筆 push 很慢），其餘用整份資料
+        for size, data in ((1, ordered.head(3000)), (97, ordered), (20_000, ordered)):
+            want, want_report = clean_ticks(data, **kw)
+            cleaner = StreamCleaner(**kw)
+            parts = [cleaner.push(data.iloc[i:i + size]) for i in range(0, len(data), size)]
+            tail, got_report = cleaner.finish()
+            got = pd.concat([p for p in parts + [tail] if len(p)], ignore_index=True)
+            pd.testing.assert_frame_equal(got, want, check_dtype=False)
+            if got_report != want_report:
+                raise SystemExit(f"StreamCleaner 報告不同（{kw}, 每批 {size}）："
+                                 f"{ {k: (got_report[k], want_report[k]) for k in want_report if got_report[k] != want_report[k]} }")
+    print("check OK：StreamCleaner 分批結果與整批相同")
+
+    t = pd.Timestamp("2025-11-26 08:45")
+    for raw in ({"time": t, "price": 23000.0, "volume": 0, "bid": 0.0, "ask": 0.0},
+                SimpleNamespace(time=t, price=23000.0, volume=0, bid=0.0, ask=0.0)):
+        row = _tick_row(raw)
+        if row["volume"] != 0 or row["bid"] != 0.0 or row["ask"] != 0.0:
+            raise SystemExit(f"_tick_row 遺失 0 值：{row}")
+    print("check OK：_tick_row 保留 0 值")
+
+def bench(n):
+    df = ticks_frame(n, seed=9)
+    t0 = time.perf_counter()
+    clean_ticks(df)
+    t_clean = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    TickAggregator(3).push(df)
+    t_agg = time.perf_counter() - t0
+    print(f"bench：{n:,} 筆，clean_ticks {t_clean:.2f}s（{n / t_clean / 1e6:.1f}M/s），"
+          f"TickAggregator {t_agg:.2f}s（{n / t_agg / 1e6:.1f}M/s）")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=80_000, help="合成逐筆平均 150ms 一筆，80k 筆約 3.3 小時，落在日盤內")
+    ap.add_argument("--bench", type=int, default=5_000_000)
+    args = ap.parse_args(argv)
+    check(args.ticks)
+    bench(args.bench)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+# src/__main__.py
+"""
+統一命令列入口；子命令只在執行時才匯入對應模組（離線工具不載入 shioaji，live 路徑不載入 pandas）。
+    python -m src fetch    --contracts TMF202512 --start 2025-11-01 --end 2025-11-30
+    python -m src convert  --contracts TMF202512 --start 2025-11-01 --end 2025-11-30
+    python -m src backtest --kbars data/kbars_3tick/TMF202512/2025-11-26.parquet --mode vectorized
+    python -m src check
+    python -m src live
+各子命令的參數請用 python -m src <子命令> --help 查看。
+"""
+import importlib
+import sys
+
+# 子命令 -> (模組, 函式, 固定附加參數, 說明)
+COMMANDS = {
+    "fetch": ("src.shioaji_fetch_and_convert", "main", [], "抓取逐筆並轉 N-tick Kbar（分區、平行）"),
+    "convert": ("src.shioaji_fetch_and_convert", "main", ["--convert-only"], "只轉檔已抓取的逐筆分區，不登入"),
+    "backtest": ("src.run_backtest", "main", [], "以 Kbar 檔或分區資料集回測"),
+    "check": ("src.check_kbars", "main", [], "檢查 data/kbars_3tick 是否有可讀的 Kbar"),
+    "live": ("src.app", "main", [], "登入並啟動即時報價管線"),
+    "replay": ("src.replay", "main", [], "逐筆重播回測與向量化回測差異報告"),
+    "optimize": ("src.optimizer", "main", [], "參數掃描 / walk-forward"),
+    "portfolio": ("src.portfolio", "main", [], "多合約共用資金的投資組合回測"),
+    "storage": ("src.storage", "main", [], "資料格式轉換與 manifest 重建"),
+    "archive": ("src.tick_archive", "main", [], "建立 / 查看 memmap 逐筆 archive"),
+    "orders": ("src.orders", "main", [], "以本機模擬交易所重播逐筆（OCO 括號單延遲 / 吞吐量）"),
+    "quality": ("src.tick_quality", "main", [], "逐筆資料品質報告（去重 / 時間倒退 / 斷訊 / 異常價）"),
+    "runs": ("src.runs", "main", [], "回測結果登錄：依指標 / 參數查詢、單一 run 明細"),
+}
+
+def usage() -> str:
+    lines = ["用法：python -m src <子命令> [參數...]", "", "子命令："]
+    lines += [f"  {name:<10}{help_}" for name, (_, _, _, help_) in COMMANDS.items()]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"未知的子命令：{name}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module, func, extra, _ = COMMANDS[name]
+    sys.argv = [f"python -m src {name}"] + rest
+    result = getattr(importlib.import_module(module), func)(extra + rest)
+    return result or 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,33 +1,70 @@
+import argparse
 import logging
+import time
 from src.config_loader import load_config
 from src.shioaji_client import ShioajiClient
 from src.quote_manager import QuoteManager
-from src.strategy import ThreeTickStrategy
+from src.pipeline import QuotePipeline
+from src.startup import init_strategy
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def main_live():
+def main_live(latency=False, latency_port=None, paper=False):
+    """
+    精簡的即時入口：不建立 TickEngine / 記錄器，也不支援快照與 warm start
+    （warm start 需重播記錄器寫下的 tick；要用快照請以 python -m src.startup 啟動）。
+    """
     cfg = load_config()
     client = ShioajiClient(cfg)
     client.login()
     client.activate_ca_if_needed()
     contract = client.select_tmf_contract()
 
-    strategy = ThreeTickStrategy(fee_ticks=cfg["fee_ticks"], slippage=cfg.get("slippage_ticks",0.5))
-    qm = QuoteManager(on_kbar_callback=strategy.on_kbar, ticks_per_kbar=3)
+    strategy = init_strategy(cfg)
+    qm = QuoteManager(ticks_per_kbar=3)
 
-    # 範例：註冊 tick handler（實際依 shioaji callback 形式調整）
-    def tick_handler(exchange, tick):
-        # tick 需轉成 dict: {'time':..., 'price':..., 'volume':...}
-        t = {"time": tick.ts, "price": tick.close, "volume": getattr(tick, "volume", 0)}
-        kbar = qm.on_tick(t)
-        if kbar:
-            sig = strategy.on_kbar(kbar)
-            if sig:
-                logger.info("Signal: %s", sig)
-                # 在此下單（OCO）或模擬下單
-    # 真實環境需呼叫 api.quote.subscribe 或相對應方法並綁定 tick_handler
+    # callback 只放入佇列；聚合、訊號、下單在管線的消費執行緒處理，不阻塞 Shioaji callback 執行緒
+    # paper：訊號交給 OrderManager 下括號單（OCO），由本機 SimulatedExchange 以逐筆撮合
+    orders = None
+    if paper:
+        from src.orders import OrderManager, SimulatedExchange
+        orders = OrderManager(rr=strategy.rr, fee_ticks=strategy.fee_ticks,
+                              capital=cfg.get("backtest", {}).get("initial_capital", 1_000_000),
+                              risk_pct=cfg.get("backtest", {}).get("risk_per_trade_pct", 0.5))
+        SimulatedExchange(latency_ticks=cfg.get("orders", {}).get("latency_ticks", 1),
+                          slippage=strategy.slippage).attach(orders)
+    pipe_cfg = cfg.get("pipeline", {})
+    pipeline = QuotePipeline(qm, strategy,
+                             quote_sinks=[orders.gateway.on_tick] if orders else (),
+                             on_signal=orders.on_signal if orders else None,
+                             maxsize=pipe_cfg.get("maxsize", 10_000),
+                             overflow=pipe_cfg.get("overflow", "drop_oldest"),
+                             latency=True if latency else None).start()
+    if latency_port:
+        from src.latency import serve
+        serve(pipeline.latency, latency_port)
+        logger.info("延遲統計：http://127.0.0.1:%d/", latency_port)
+    client.api.quote.set_on_tick_fop_v1_callback(pipeline.on_shioaji_tick)
+    client.subscribe_ticks(contract)
+    return pipeline
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="登入 Shioaji、訂閱 TMF 逐筆並啟動即時管線（Ctrl+C 結束）")
+    ap.add_argument("--metrics-interval", type=float, default=60.0, help="輸出管線指標的間隔秒數")
+    ap.add_argument("--latency", action="store_true", help="量測 tick -> 訊號 -> 下單各階段延遲")
+    ap.add_argument("--latency-port", type=int, help="以本機 HTTP endpoint 提供延遲統計（隱含 --latency）")
+    ap.add_argument("--paper", action="store_true", help="以本機模擬交易所下括號單（OCO），不送券商")
+    args = ap.parse_args(argv)
+    pipeline = main_live(args.latency or bool(args.latency_port), args.latency_port, args.paper)
+    try:
+        while True:
+            time.sleep(args.metrics_interval)
+            logger.info("pipeline metrics: %s", pipeline.metrics(reset_latency=True))
+    except KeyboardInterrupt:
+        pipeline.stop()
+        logger.info("pipeline metrics: %s", pipeline.metrics())
+    return 0
 
 if __name__ == "__main__":
-    main_live()
+    raise SystemExit(main())
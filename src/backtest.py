@@ -1,20 +1,48 @@
+import numpy as np
 import pandas as pd
 from src.strategy import ThreeTickStrategy
-from src.utils import calc_position_size
+from src.utils import calc_position_size, calc_position_sizes
+from src.exits import simulate_exits
+from src.storage import read_frame
+
+# 交易明細欄位（CSV 輸出順序）
+TRADE_FIELDS = ["side", "time", "entry", "stop", "target", "size",
+                "exit_time", "exit_price", "exit_reason", "holding_bars", "pnl"]
 
 class Backtester:
+    """
+    mode:
+    - "event"：逐根呼叫 strategy.on_kbar（與實盤相同路徑）
+    - "vectorized"：整欄計算 ATR / 方向 / 停損 / 目標 / 口數，產出相同的交易清單
+    可由 config["backtest"]["mode"] 指定預設值。
+    兩種模式皆以 src/exits.py 模擬出場（停損/目標），
+    同根同時觸及時依 config["backtest"]["both_hit"]（預設 "stop"）判定。
+    """
     def __init__(self, config, kbar_csv_path):
         self.config = config
-        self.kbars = pd.read_csv(kbar_csv_path, parse_dates=["time"])
+        if isinstance(kbar_csv_path, pd.DataFrame):
+            self.kbars = kbar_csv_path
+        else:
+            self.kbars = read_frame(kbar_csv_path)
+        # config["strategy"] 可覆寫 atr_period / stop_atr_mult / rr / warmup
         self.strategy = ThreeTickStrategy(fee_ticks=config["fee_ticks"],
-                                          slippage=config.get("slippage_ticks",0.5))
+                                          slippage=config.get("slippage_ticks",0.5),
+                                          **config.get("strategy", {}))
         self.capital = config["backtest"]["initial_capital"]
         self.risk_pct = config["backtest"].get("risk_per_trade_pct", 0.5)
+        self.mode = config["backtest"].get("mode", "event")
+        self.both_hit = config["backtest"].get("both_hit", "stop")
         self.tick_value = 10
 
-    def run(self):
+    def run(self, mode=None):
+        mode = mode or self.mode
+        if mode == "vectorized":
+            return self.run_vectorized().to_dict("records")
+        if mode != "event":
+            raise ValueError(f"unknown backtest mode: {mode}")
         trades = []
-        for _, row in self.kbars.iterrows():
+        bars = []
+        for i, (_, row) in enumerate(self.kbars.iterrows()):
             kbar = row.to_dict()
             signal = self.strategy.on_kbar(kbar)
             if signal:
@@ -23,13 +51,65 @@ class Backtester:
                 if size <= 0:
                     continue
                 entry = signal["price"] + (self.strategy.slippage if signal["side"]=="buy" else -self.strategy.slippage)
-                target = entry + (1.8 * stop if signal["side"]=="buy" else -1.8 * stop)
-                # 簡化：假設達到 target 或 stop 以 kbar.close 判斷
+                rr = self.strategy.rr
+                target = entry + (rr * stop if signal["side"]=="buy" else -rr * stop)
+                bars.append(i)
                 trades.append({
                     "side": signal["side"],
+                    "time": kbar["time"],
                     "entry": entry,
                     "stop": entry - stop if signal["side"]=="buy" else entry + stop,
                     "target": target,
                     "size": size
                 })
+        if trades:
+            ex = self._exits(bars, [1 if t["side"] == "buy" else -1 for t in trades],
+                             [t["entry"] for t in trades], [t["stop"] for t in trades],
+                             [t["target"] for t in trades], [t["size"] for t in trades])
+            ex["exit_time"] = ex["exit_time"].tolist()
+            for j, t in enumerate(trades):
+                t.update({k: v[j] for k, v in ex.items()})
         return trades
+
+    def _exits(self, bars, side, entry, stop, target, size):
+        return simulate_exits(self.kbars, bars, side, entry, stop, target, size,
+                              fee_ticks=self.strategy.fee_ticks, slippage=self.strategy.slippage,
+                              tick_value=self.tick_value, both_hit=self.both_hit)
+
+    def run_vectorized(self) -> pd.DataFrame:
+        """整欄版本的 run()，回傳交易 DataFrame（欄位與 run() 的 dict 相同）。"""
+        return vectorized_trades(self.kbars, self.strategy, self.capital, self.risk_pct,
+                                 tick_value=self.tick_value, both_hit=self.both_hit)
+
+def vectorized_trades(bars, strategy, capital, risk_pct, tick_value=10, both_hit="stop",
+                      dataset=None) -> pd.DataFrame:
+    """
+    向量化回測核心。bars 為 DataFrame 或 {欄位: numpy array}（time/open/high/low/close），
+    可直接傳入 memmap 切片，不需先組成 DataFrame。
+    dataset：傳給 strategy.batch_signals 的快取鍵（同一份 bars 重複回測時使用）。
+    """
+    close = np.asarray(bars["close"], dtype=float)
+    side, stop_ticks = strategy.batch_signals(bars["high"], bars["low"], close, dataset=dataset)
+    idx = side.nonzero()[0]
+    side = side[idx]
+    stop = stop_ticks[idx]
+    size = calc_position_sizes(capital, risk_pct, stop, tick_value=tick_value)
+    keep = size > 0
+    idx, side, stop, size = idx[keep], side[keep], stop[keep], size[keep]
+    entry = close[idx] + side * strategy.slippage
+    stop_price = entry - side * stop
+    target = entry + side * strategy.rr * stop
+    trades = pd.DataFrame({
+        "side": pd.Series(side).map({1: "buy", -1: "sell"}).to_numpy(dtype=object),
+        "time": np.asarray(bars["time"])[idx],
+        "entry": entry,
+        "stop": stop_price,
+        "target": target,
+        "size": size,
+    })
+    ex = simulate_exits(bars, idx, side, entry, stop_price, target, size,
+                        fee_ticks=strategy.fee_ticks, slippage=strategy.slippage,
+                        tick_value=tick_value, both_hit=both_hit)
+    for k, v in ex.items():
+        trades[k] = v
+    return trades
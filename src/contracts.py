@@ -0,0 +1,215 @@
+# src/contracts.py
+"""
+期貨合約資料的本地快取（依交易日）。
+只保存選約需要的欄位（code / symbol / category / delivery_date 等），並依商品建立
+依交割日排序的索引；同一交易日內重新啟動時直接由快取選近月，登入時不必下載完整合約表。
+快取過期（跨交易日）或找不到商品時，才由 SDK 下載合約並更新快取。
+檔案格式（JSON）：
+    {"version": 1, "trading_day": "2025-11-26", "saved_at": ...,
+     "symbols": {"TMF": [{"code": "TMFL5", "symbol": "TMF202512", "delivery_date": "2025-12-17", ...}, ...]}}
+"""
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = Path("data/contracts.json")
+EXCLUDE_SUFFIXES = ("R1", "R2")
+FIELDS = ("code", "symbol", "name", "category", "delivery_month", "delivery_date", "exchange", "unit")
+
+def trading_day(now=None) -> str:
+    """夜盤（15:00 起）歸屬下一個交易日，週末歸屬下週一（與 BufferedRecorder.trading_days 一致）。"""
+    now = now or datetime.now()
+    day = now.date() + timedelta(days=1 if now.hour >= 15 else 0)
+    if day.weekday() >= 5:
+        day += timedelta(days=7 - day.weekday())
+    return day.isoformat()
+
+def _iso_date(value) -> str:
+    """SDK 的 delivery_date 可能是 "2025/12/17"、date 或 datetime；統一為 YYYY-MM-DD，無法解析時回傳空字串。"""
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    text = str(value or "").strip().replace("/", "-")
+    try:
+        return datetime.fromisoformat(text[:10]).strftime("%Y-%m-%d")
+    except ValueError:
+        return ""
+
+def contract_record(contract) -> dict:
+    """SDK 合約物件 -> 快取用的純資料 dict。"""
+    rec = {}
+    for field in FIELDS:
+        value = getattr(contract, field, None)
+        if value is None and field == "code":
+            value = getattr(contract, "contract_code", "")
+        if field == "delivery_date":
+            value = _iso_date(value)
+        elif value is not None and not isinstance(value, (int, float, str)):
+            value = getattr(value, "value", None) or str(value)
+        rec[field] = "" if value is None else value
+    return rec
+
+def collect_contracts(api, symbol):
+    """
+    由已下載合約的 api 取出商品 symbol 的所有合約物件：
+    先找 api.Contracts.Futures.<symbol>，找不到時遍歷 Futures 底下所有群組再以 code / symbol 過濾。
+    """
+    contracts = []
+    try:
+        contracts = list(getattr(api.Contracts.Futures, symbol))
+    except Exception:
+        # fallback: 遍歷所有 Futures 合約
+        try:
+            all_futs = getattr(api.Contracts, "Futures", None) or getattr(api.Contracts, "futures", None)
+            if all_futs:
+                try:
+                    for attr in dir(all_futs):
+                        val = getattr(all_futs, attr)
+                        if isinstance(val, (list, tuple)):
+                            contracts.extend(val)
+                except Exception:
+                    try:
+                        contracts.extend(all_futs)
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+    out = []
+    for c in contracts:
+        code = getattr(c, "code", "") or str(getattr(c, "contract_code", ""))
+        sym = getattr(c, "symbol", "") or ""
+        if symbol in code or symbol in sym:
+            out.append(c)
+    return out
+
+class ContractCache:
+    """
+    用法：
+        cache = ContractCache("data/contracts.json")
+        if cache.is_fresh("TMF"):
+            rec = cache.front_month("TMF")           # 不需連線
+        else:
+            cache.update("TMF", collect_contracts(api, "TMF")).save()
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, now=None):
+        # path=None：只在記憶體中使用（不讀寫檔案）
+        self.path = None if path is None else Path(path)
+        self.today = trading_day(now)
+        self.trading_day = None
+        self.symbols = {}
+        self._index = {}
+        self.load()
+
+    def load(self):
+        """讀取快取檔；檔案不存在、損壞或版本不符時視為空快取。"""
+        self.trading_day, self.symbols = None, {}
+        if self.path is None:
+            self._build_index()
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            self.trading_day = data.get("trading_day")
+            self.symbols = data.get("symbols", {})
+        self._build_index()
+        return self
+
+    def save(self):
+        """先寫暫存檔再 os.replace，避免半寫入的快取。"""
+        if self.path is None:
+            return None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        data = {"version": CACHE_VERSION, "trading_day": self.trading_day,
+                "saved_at": time.time(), "symbols": self.symbols}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        return self.path
+
+    def _build_index(self):
+        # symbol -> 可交易合約（排除 R1/R2 與已過交割日者），依交割日排序；第一筆即近月
+        self._index = {}
+        for symbol, records in self.symbols.items():
+            live = [r for r in records
+                    if not str(r.get("code", "")).endswith(EXCLUDE_SUFFIXES)
+                    and (not r.get("delivery_date") or r["delivery_date"] >= self.today)]
+            live.sort(key=lambda r: r.get("delivery_date") or "9999-12-31")
+            self._index[symbol] = live
+
+    def is_fresh(self, symbol=None) -> bool:
+        """快取屬於目前交易日（且含 symbol）時為 True。"""
+        if self.trading_day != self.today:
+            return False
+        return symbol is None or bool(self._index.get(symbol))
+
+    def update(self, symbol, contracts):
+        """以 SDK 合約物件（或 contract_record dict）更新 symbol；跨交易日時先清掉其他商品的舊資料。"""
+        if self.trading_day != self.today:
+            self.symbols = {}
+            self.trading_day = self.today
+        self.symbols[symbol] = [c if isinstance(c, dict) else contract_record(c) for c in contracts]
+        self._build_index()
+        return self
+
+    def contracts(self, symbol):
+        """symbol 的可交易合約記錄（依交割日排序，已排除 R1/R2）。"""
+        return list(self._index.get(symbol, ()))
+
+    def front_month(self, symbol):
+        """最近到期的合約記錄；沒有資料時回傳 None。"""
+        live = self._index.get(symbol)
+        return live[0] if live else None
+
+def select_contract(api, symbol, cache=None):
+    """
+    選近月合約（排除 R1/R2），回傳 SDK 合約物件或 None。
+    cache 為當日且含 symbol 時只查快取索引；否則由 api 的合約表選取並更新、儲存快取。
+    登入時若未下載合約（fetch_contract=False）而快取又不可用，會先呼叫 api.fetch_contracts 補下載。
+    """
+    cache = cache if cache is not None else ContractCache(None)
+    if cache.is_fresh(symbol):
+        contract = sdk_contract(api, cache.front_month(symbol))
+        if contract is not None:
+            return contract
+    contracts = collect_contracts(api, symbol)
+    if not contracts and hasattr(api, "fetch_contracts"):
+        api.fetch_contracts(contract_download=True)
+        contracts = collect_contracts(api, symbol)
+    if not contracts:
+        return None
+    cache.update(symbol, contracts).save()
+    record = cache.front_month(symbol)
+    if record is None:
+        return None
+    return next(c for c in contracts if contract_record(c)["code"] == record["code"])
+
+def sdk_contract(api, record):
+    """
+    依快取記錄取得可供訂閱的 SDK 合約物件：
+    已下載合約時直接以 code 查表；否則以記錄欄位建立 shioaji Future（不需下載合約表）。
+    兩者都失敗時回傳 None，由呼叫端改為下載合約。
+    """
+    code = record["code"]
+    try:
+        contract = api.Contracts.Futures[code]
+        if contract is not None:
+            return contract
+    except Exception:
+        pass
+    try:
+        from shioaji.constant import Exchange, SecurityType
+        from shioaji.contracts import Future
+        return Future(
+            code=code, symbol=record.get("symbol", ""), name=record.get("name", ""),
+            category=record.get("category", ""), delivery_month=record.get("delivery_month", ""),
+            delivery_date=record.get("delivery_date", "").replace("-", "/"),
+            exchange=Exchange(record.get("exchange") or "TAIFEX"), security_type=SecurityType.Future,
+        )
+    except Exception:
+        return None
@@ -21,5 +21,8 @@ class TickEngine:
                 pass
 
     def on_order_filled(self, order: dict):
+        # order: {'side': 'buy'/'sell', 'size': 口數, ...}；依成交更新部位
+        size = order.get('size') or 0
+        self.state.position += size if order.get('side') == 'buy' else -size
         if self.trade_logger:
             self.trade_logger.log_trade(order)
@@ -0,0 +1,101 @@
+# src/exits.py
+"""
+出場模擬：自每筆進場的下一根 Kbar 起往後找第一根 high/low 觸及停損或目標的 Kbar。
+以預先取出的 high/low/open numpy 陣列分段向前搜尋（視窗 64 根起、每次加倍），
+每筆交易成本約與持有根數成正比，整體接近線性。
+"""
+import numpy as np
+import pandas as pd
+
+# 同一根 Kbar 同時觸及停損與目標時的判定規則
+BOTH_HIT_RULES = ("stop", "target", "open")
+
+def find_exits(open_, high, low, entry_idx, side, stop, target, both_hit="stop", window=64):
+    """
+    回傳 (exit_idx, exit_level, reason)：
+    - exit_idx：出場 Kbar 索引；未觸及者為最後一根
+    - exit_level：成交價位（未含滑價）；跳空越過價位時以該根 open 成交
+    - reason："stop" / "target" / "eod"
+    both_hit："stop" 保守以停損計、"target" 以目標計、"open" 取距 open 較近者
+    """
+    if both_hit not in BOTH_HIT_RULES:
+        raise ValueError(f"both_hit must be one of {BOTH_HIT_RULES}")
+    open_ = np.asarray(open_, dtype=float)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(high)
+    m = len(entry_idx)
+    exit_idx = np.full(m, n - 1, dtype=np.int64)
+    exit_level = np.full(m, np.nan)
+    reason = np.full(m, "eod", dtype=object)
+    for j in range(m):
+        s = side[j]
+        st = stop[j]
+        tg = target[j]
+        i = int(entry_idx[j]) + 1
+        w = window
+        while i < n:
+            end = min(i + w, n)
+            h = high[i:end]
+            lo = low[i:end]
+            if s > 0:
+                hit_stop = lo <= st
+                hit_target = h >= tg
+            else:
+                hit_stop = h >= st
+                hit_target = lo <= tg
+            hit = hit_stop | hit_target
+            if hit.any():
+                k = int(hit.argmax())
+                bar = i + k
+                o = open_[bar]
+                if hit_stop[k] and hit_target[k]:
+                    if both_hit == "open":
+                        use_stop = abs(o - st) <= abs(tg - o)
+                    else:
+                        use_stop = both_hit == "stop"
+                else:
+                    use_stop = bool(hit_stop[k])
+                if use_stop:
+                    # 跳空越過停損：以 open 成交（較差價位）
+                    level = o if (o < st if s > 0 else o > st) else st
+                    reason[j] = "stop"
+                else:
+                    # 跳空越過目標：限價單以 open 成交（較佳價位）
+                    level = o if (o > tg if s > 0 else o < tg) else tg
+                    reason[j] = "target"
+                exit_idx[j] = bar
+                exit_level[j] = level
+                break
+            i = end
+            w *= 2
+    return exit_idx, exit_level, reason
+
+def simulate_exits(kbars, entry_idx, side, entry, stop, target, size,
+                   fee_ticks=4, slippage=0.5, tick_value=10, both_hit="stop"):
+    """
+    kbars：含 time/open/high/low/close 的 DataFrame 或 {欄位: array}
+    side：+1 買 / -1 賣；entry 已含進場滑價
+    停損與收盤（eod）出場為市價，扣 slippage；目標為限價，不扣滑價。
+    pnl = ((exit - entry) * side - fee_ticks) * tick_value * size
+    回傳 dict of arrays：exit_time / exit_price / exit_reason / holding_bars / pnl
+    """
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)
+    side = np.asarray(side, dtype=float)
+    entry = np.asarray(entry, dtype=float)
+    exit_idx, level, reason = find_exits(kbars["open"], kbars["high"], kbars["low"], entry_idx, side,
+                                         np.asarray(stop, dtype=float), np.asarray(target, dtype=float),
+                                         both_hit=both_hit)
+    eod = reason == "eod"
+    close = np.asarray(kbars["close"], dtype=float)
+    level[eod] = close[exit_idx[eod]]
+    market = reason != "target"
+    exit_price = level - side * slippage * market
+    pnl = ((exit_price - entry) * side - fee_ticks) * tick_value * np.asarray(size)
+    return {
+        "exit_time": pd.Series(np.asarray(kbars["time"])[exit_idx]),
+        "exit_price": exit_price,
+        "exit_reason": reason,
+        "holding_bars": exit_idx - entry_idx,
+        "pnl": pnl,
+    }
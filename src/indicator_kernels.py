@@ -0,0 +1,174 @@
+# src/indicator_kernels.py
+"""
+整欄 numpy 指標 kernels 與 IndicatorCache（經由 src.indicators 匯出，使用時才載入）。
+"""
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 每個 kernel 計算第 start 列（含）之後的結果；start > 0 時 prev 為先前結果、state 為先前狀態，
+# 只讀取計算新列所需的最後幾列輸入。回傳 (新列結果, state)。
+
+def _window_sums(seg, offset, window, start):
+    """
+    seg 為第 offset 列起的輸入，offset = max(start - window + 1, 0)。
+    回傳第 start 列起、每列往前 window 列（不足時取到第 0 列）的總和與列數。
+    """
+    n = offset + len(seg)
+    if n <= start:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    lo = start - window + 1
+    if lo < 0:
+        seg = np.concatenate([np.zeros(-lo), seg])
+    sums = np.lib.stride_tricks.sliding_window_view(seg, window).sum(axis=1)
+    counts = np.minimum(np.arange(start, n) + 1, window)
+    return sums, counts
+
+def _true_range(high, low, close, start):
+    """第 start 列起的 TR；第 0 列為 high - low，其餘以前一列 close 為前收。"""
+    h = high[start:]
+    lo = low[start:]
+    tr = h - lo
+    if start > 0:
+        pc = close[start - 1:-1]
+        return np.fmax(tr, np.fmax(np.abs(h - pc), np.abs(lo - pc)))
+    if len(tr) > 1:
+        pc = close[:-1]
+        tr[1:] = np.fmax(tr[1:], np.fmax(np.abs(h[1:] - pc), np.abs(lo[1:] - pc)))
+    return tr
+
+def _atr_kernel(cols, start, prev, state, period=14):
+    offset = max(start - period + 1, 0)
+    tr = _true_range(cols["high"], cols["low"], cols["close"], offset)
+    sums, counts = _window_sums(tr, offset, period, start)
+    return sums / counts, None
+
+def _ema_kernel(cols, start, prev, state, span=20, column="close"):
+    x = cols[column][start:]
+    if start > 0:
+        x = np.concatenate([prev[start - 1:start], x])
+    y = pd.Series(x).ewm(span=span, adjust=False).mean().to_numpy()
+    return (y[1:] if start > 0 else y), None
+
+def _vwap_kernel(cols, start, prev, state, column="close"):
+    p = cols[column][start:]
+    v = cols["volume"][start:]
+    pv0, v0 = state if state is not None else (0.0, 0.0)
+    cum_pv = np.cumsum(np.concatenate([[pv0], p * v]))[1:]
+    cum_v = np.cumsum(np.concatenate([[v0], v]))[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(cum_v > 0, cum_pv / cum_v, np.nan)
+    if len(out):
+        state = (cum_pv[-1], cum_v[-1])
+    return out, state
+
+def _realized_vol_kernel(cols, start, prev, state, window=20, column="close"):
+    c = cols[column]
+    offset = max(start - window + 1, 0)
+    r = np.zeros(len(c) - offset)
+    first = max(offset, 1)
+    if len(c) > first:
+        r[first - offset:] = np.diff(np.log(c[first - 1:]))
+    sums, _ = _window_sums(r * r, offset, window, start)
+    return np.sqrt(sums), None
+
+KERNELS = {
+    "atr": (lambda p: ("high", "low", "close"), _atr_kernel),
+    "ema": (lambda p: (p.get("column", "close"),), _ema_kernel),
+    "vwap": (lambda p: (p.get("column", "close"), "volume"), _vwap_kernel),
+    "realized_vol": (lambda p: (p.get("column", "close"),), _realized_vol_kernel),
+}
+
+def _columns(data, names):
+    return {c: np.asarray(data[c], dtype=float) for c in names}
+
+def compute(name, data, **params):
+    """不經快取直接計算整欄指標。data 為 DataFrame 或 {欄位: array}。"""
+    columns, kernel = KERNELS[name]
+    values, _ = kernel(_columns(data, columns(params)), 0, None, None, **params)
+    return values
+
+def atr(high, low, close, period=14):
+    """ATR：第一根 TR = high - low，rolling(period, min_periods=1).mean()（同 RollingATR）。"""
+    return compute("atr", {"high": high, "low": low, "close": close}, period=period)
+
+def ema(x, span=20):
+    """EMA（adjust=False）：y0 = x0，y = y_prev + alpha * (x - y_prev)，alpha = 2 / (span + 1)。"""
+    return compute("ema", {"close": x}, span=span)
+
+def vwap(price, volume):
+    """自第一列起的累積 VWAP；累積成交量為 0 時為 NaN。"""
+    return compute("vwap", {"close": price, "volume": volume})
+
+def realized_vol(close, window=20):
+    """已實現波動：最近 window 個 log 報酬平方和開根號（第一根報酬視為 0）。"""
+    return compute("realized_vol", {"close": close}, window=window)
+
+class IndicatorCache:
+    """
+    依 (dataset, 指標, 參數) 保存整欄結果，dataset 為呼叫端給的識別鍵（如合約代碼）。
+    每筆快取記下輸入各欄的 CRC32（整欄，一次走訪，成本與取出欄位相當），再次以相同鍵查詢時：
+    - 列數相同且 CRC 相同：直接回傳快取
+    - 列數增加且前段（原有列數）的 CRC 相同（附加新 Kbar）：只計算新增列，結果寫入預留空間
+    - 其他情況（資料被替換或中段被修改）：整欄重算
+    回傳的 array 為唯讀 view；最多保留 max_entries 筆（最久未使用者先移除）。
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.extends = 0
+        self.misses = 0
+
+    @staticmethod
+    def _crc(cols, lo, hi, prev=None):
+        """各欄第 lo～hi 列的 CRC32；prev 為各欄前段的 CRC 時接續計算。"""
+        return tuple(zlib.crc32(np.ascontiguousarray(a[lo:hi]), 0 if prev is None else p)
+                     for a, p in zip(cols.values(), prev or [None] * len(cols)))
+
+    def get(self, dataset, name, data, **params):
+        columns, kernel = KERNELS[name]
+        cols = _columns(data, columns(params))
+        n = len(next(iter(cols.values())))
+        key = (dataset, name, tuple(sorted(params.items())))
+        e = self._entries.get(key)
+        prefix = self._crc(cols, 0, e["n"]) if e is not None and 0 < e["n"] <= n else None
+        if prefix is not None and prefix == e["crc"]:
+            self._entries.move_to_end(key)
+            if e["n"] == n:
+                self.hits += 1
+                return e["view"]
+            buf = e["buf"]
+            new, state = kernel(cols, e["n"], buf[:e["n"]], e["state"], **params)
+            if len(buf) < n:
+                grown = np.empty(max(n, 2 * len(buf)))
+                grown[:e["n"]] = buf[:e["n"]]
+                buf = grown
+            buf[e["n"]:n] = new
+            self.extends += 1
+            crc = self._crc(cols, e["n"], n, prefix)
+        else:
+            values, state = kernel(cols, 0, None, None, **params)
+            buf = values
+            crc = self._crc(cols, 0, n)
+            self.misses += 1
+        view = buf[:n]
+        view.flags.writeable = False
+        self._entries[key] = {"n": n, "crc": crc, "buf": buf, "view": view, "state": state}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return view
+
+    def clear(self, dataset=None):
+        """清除全部，或只清除指定 dataset 的快取。"""
+        if dataset is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == dataset]:
+                del self._entries[key]
+
+# 行程內共用的預設快取
+CACHE = IndicatorCache()
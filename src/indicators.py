@@ -0,0 +1,86 @@
+# src/indicators.py
+"""
+指標函式庫。
+- 逐根（incremental）指標：RollingATR / DirectionStreak，每根 Kbar 的更新成本為 O(1)，記憶體固定（實盤用）
+- 整欄 numpy kernels：atr / ema / vwap / realized_vol，結果與逐根版本一致（回測、初始化用）
+- IndicatorCache：依 (資料集, 指標, 參數) 保存結果；資料集附加新 Kbar 時只計算新增的列
+    values = CACHE.get("TMF202512", "atr", kbars, period=14)
+整欄 kernels 與快取實作在 src/indicator_kernels.py，第一次存取時才載入（實盤路徑不需 numpy / pandas）。
+"""
+
+
+class RollingATR:
+    """
+    ATR(period)：True Range 環形緩衝 + 滑動總和。
+    與 utils.atr 相同定義：第一根 TR = high - low，
+    之後 TR = max(high-low, |high-prev_close|, |low-prev_close|)，
+    rolling(period, min_periods=1).mean()。
+    """
+    __slots__ = ("period", "_ring", "_pos", "_count", "_sum", "_prev_close", "value")
+
+    def __init__(self, period=14):
+        if period <= 0:
+            raise ValueError("period must be positive")
+        self.period = period
+        self._ring = [0.0] * period
+        self._pos = 0
+        self._count = 0
+        self._sum = 0.0
+        self._prev_close = None
+        self.value = None
+
+    def update(self, high, low, close):
+        high = float(high)
+        low = float(low)
+        tr = high - low
+        pc = self._prev_close
+        if pc is not None:
+            tr = max(tr, abs(high - pc), abs(low - pc))
+        self._prev_close = float(close)
+
+        if self._count < self.period:
+            self._count += 1
+        else:
+            self._sum -= self._ring[self._pos]
+        self._ring[self._pos] = tr
+        self._sum += tr
+        self._pos += 1
+        if self._pos == self.period:
+            self._pos = 0
+            # 每繞一圈重算一次總和，避免浮點累積誤差（攤提後仍為 O(1)）
+            self._sum = sum(self._ring)
+        self.value = self._sum / self._count
+        return self.value
+
+
+class DirectionStreak:
+    """
+    連續同向 Kbar 計數：close 高於前一根為 +1，低於為 -1，持平歸零。
+    streak > 0 表示連續上升根數，streak < 0 表示連續下跌根數。
+    """
+    __slots__ = ("_prev_close", "streak")
+
+    def __init__(self):
+        self._prev_close = None
+        self.streak = 0
+
+    def update(self, close):
+        close = float(close)
+        pc = self._prev_close
+        self._prev_close = close
+        if pc is None or close == pc:
+            self.streak = 0
+        elif close > pc:
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+        else:
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+        return self.streak
+
+
+_KERNEL_NAMES = ("atr", "ema", "vwap", "realized_vol", "compute", "KERNELS", "IndicatorCache", "CACHE")
+
+def __getattr__(name):
+    if name in _KERNEL_NAMES:
+        from src import indicator_kernels
+        return getattr(indicator_kernels, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,6 +3,36 @@ from typing import Optional, Dict, Any
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
+from src.indicators import CACHE
+from src.storage import PartitionedStore, list_frames, read_frame
+
+def _field(contract, name) -> str:
+    value = contract.get(name) if isinstance(contract, dict) else getattr(contract, name, None)
+    value = getattr(value, "value", value)      # SDK 的列舉欄位
+    return "" if value is None else str(value)
+
+def partition_keys(contract) -> list:
+    """
+    合約 -> 分區資料集（data/kbars_3tick 等）可能使用的鍵，依優先順序。
+    分區以 <商品><交割月> 命名（例 TMF202512），SDK 合約的 code 則是 TMFL5 這類代碼，不能直接當鍵。
+    contract 可為 SDK 合約物件、dict（code / symbol / category / delivery_month）或代碼字串。
+    """
+    if contract is None:
+        return []
+    if isinstance(contract, str):
+        contract = {"code": contract}
+    code = _field(contract, "code") or _field(contract, "contract_code")
+    month = _field(contract, "delivery_month")
+    product = _field(contract, "category") or code[:3]
+    keys = [_field(contract, "symbol")]
+    if month:
+        keys += [f"{product}{month}", f"{code[:3]}{month}"]
+    keys.append(code)
+    out = []
+    for k in keys:
+        if k and k not in out:
+            out.append(k)
+    return out
 
 class KlineInitializer:
     def __init__(self, api=None, contract=None, start: Optional[str]=None, end: Optional[str]=None):
@@ -12,13 +42,21 @@ class KlineInitializer:
         self.end = end
         self.kbars = pd.DataFrame()
         self.indicators: Dict[str, Any] = {}
+        # 指標快取的資料集鍵：每個 initializer 一份
+        self._dataset = ('kline', id(self))
 
-    def fetch_kline(self):
-        # 優先嘗試用 api 抓取，否則從 data/kbars_3tick 讀檔
+    def fetch_kline(self, start: Optional[str]=None, end: Optional[str]=None):
+        """
+        start / end 未指定時沿用建構時的值（交易日，含兩端）。
+        優先嘗試用 api 抓取，否則從 data/kbars_3tick 分區資料集讀取重疊的交易日；
+        若尚無分區 manifest，退回讀取目錄下第一個可讀的檔案。
+        """
+        start = start if start is not None else self.start
+        end = end if end is not None else self.end
         if self.api is not None and self.contract is not None:
             try:
                 if hasattr(self.api, 'kbars'):
-                    df = self.api.kbars(self.contract, start=self.start, end=self.end)
+                    df = self.api.kbars(self.contract, start=start, end=end)
                     if not isinstance(df, pd.DataFrame):
                         df = pd.DataFrame(df)
                     self.kbars = df
@@ -26,9 +64,24 @@ class KlineInitializer:
             except Exception:
                 pass
         data_dir = Path('data/kbars_3tick')
-        for p in data_dir.glob('*.csv'):
+        store = PartitionedStore(data_dir)
+        manifest = store.manifest()
+        if manifest:
+            # SDK 合約的 code（例 TMFD6）不是分區鍵（例 TMF202604），依 symbol / 交割月對應；
+            # 對應不到時不讀：讀全部合約會把不同月份的價格混在同一條序列
+            if self.contract is None:
+                code = next(iter(manifest)) if len(manifest) == 1 else None
+            else:
+                code = next((k for k in partition_keys(self.contract) if k in manifest), None)
+            if code is None:
+                print(f"⚠️ {data_dir} 找不到合約 {getattr(self.contract, 'code', self.contract)} 的分區，不載入歷史 Kbar")
+                self.kbars = pd.DataFrame()
+                return self.kbars
+            self.kbars = store.read(code, start, end)
+            return self.kbars
+        for p in list_frames(data_dir):
             try:
-                df = pd.read_csv(p, parse_dates=['time'])
+                df = read_frame(p)
                 self.kbars = df
                 return self.kbars
             except Exception:
@@ -37,27 +90,31 @@ class KlineInitializer:
         return self.kbars
 
     def compute_indicators(self, atr_period: int = 14):
+        """
+        ATR 由 indicators.CACHE 計算並快取（以此 initializer 為資料集鍵）；
+        append_kbars 附加新 Kbar 後再次呼叫只計算新增的列。atr 欄直接寫入 self.kbars，不複製整個表。
+        """
         if self.kbars.empty:
             self.indicators = {}
             return self.indicators
-        df = self.kbars.copy()
         for col in ['high','low','close']:
-            if col not in df.columns:
+            if col not in self.kbars.columns:
                 raise ValueError(f'missing column {col}')
-        high = df['high'].astype(float)
-        low = df['low'].astype(float)
-        close = df['close'].astype(float)
-        prev_close = close.shift(1)
-        tr1 = high - low
-        tr2 = (high - prev_close).abs()
-        tr3 = (low - prev_close).abs()
-        tr = pd.concat([tr1,tr2,tr3], axis=1).max(axis=1)
-        atr = tr.rolling(window=atr_period, min_periods=1).mean()
-        df['atr'] = atr
-        self.kbars = df
+        values = CACHE.get(self._dataset, 'atr', self.kbars, period=atr_period)
+        atr = pd.Series(values, index=self.kbars.index, name='atr', copy=False)
+        self.kbars['atr'] = atr
         self.indicators = {'atr_period': atr_period, 'atr': atr}
         return self.indicators
 
+    def append_kbars(self, new_kbars: pd.DataFrame, atr_period: Optional[int] = None):
+        """附加新 Kbar（例如盤中新完成的 bar）並增量更新指標。"""
+        if new_kbars is None or len(new_kbars) == 0:
+            return self.indicators
+        new_kbars = new_kbars if isinstance(new_kbars, pd.DataFrame) else pd.DataFrame(new_kbars)
+        self.kbars = pd.concat([self.kbars, new_kbars], ignore_index=True)
+        period = atr_period or self.indicators.get('atr_period', 14)
+        return self.compute_indicators(atr_period=period)
+
     def get_indicators(self):
         if not self.indicators and not self.kbars.empty:
             self.compute_indicators()
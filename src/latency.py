@@ -0,0 +1,158 @@
+# src/latency.py
+"""
+tick -> 訊號 -> 下單路徑的延遲量測。
+- LatencyHistogram：HDR 式對數-線性分桶的串流直方圖（純 Python、__slots__），
+  以奈秒整數記錄，每個 2 的冪次再分 64 格（相對誤差約 1.6%），記憶體固定、不保留樣本。
+- LatencyRecorder：各階段一個直方圖；snapshot() 回傳 p50 / p99 / max（微秒）。
+- serve()：在背景執行緒開本機 HTTP endpoint，GET / 回傳 JSON。
+QuotePipeline(latency=LatencyRecorder()) 時才啟用計時；未啟用時熱路徑與原本完全相同。
+"""
+import json
+import math
+import threading
+import time
+
+SUB_BITS = 6
+SUB_COUNT = 1 << SUB_BITS          # 每個 2 的冪次的分格數
+MAX_BITS = 40                      # 2^40 ns ≈ 18 分鐘，超過者併入最後一格
+
+def _index(v: int) -> int:
+    if v < SUB_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BITS - 1
+    return (shift + 1) * SUB_COUNT + (v >> shift) - SUB_COUNT
+
+def _value(i: int) -> int:
+    """分桶 i 的上界（含），percentile 回報此值。"""
+    if i < SUB_COUNT:
+        return i
+    shift, sub = divmod(i - SUB_COUNT, SUB_COUNT)
+    return ((sub + SUB_COUNT + 1) << shift) - 1
+
+_BUCKETS = _index((1 << MAX_BITS) - 1) + 1
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        # 熱路徑：_index 展開在此，避免多一層函式呼叫
+        if ns < SUB_COUNT:
+            i = ns if ns > 0 else 0
+        else:
+            shift = ns.bit_length() - SUB_BITS - 1
+            i = (shift << SUB_BITS) + (ns >> shift)
+            if i >= _BUCKETS:
+                i = _BUCKETS - 1
+        self.counts[i] += 1
+        if ns > self.max:
+            self.max = ns
+        self.count += 1
+        self.total += ns
+
+    def percentile(self, q: float) -> int:
+        """q 為 0~100；回傳奈秒（分桶上界，不超過實際最大值）。沒有樣本時回傳 0。"""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(_value(i), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.count:
+            self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+            self.max = max(self.max, other.max)
+            self.count += other.count
+            self.total += other.total
+        return self
+
+    def summary(self) -> dict:
+        """微秒：count / mean / p50 / p99 / max。"""
+        us = 1e-3
+        return {"count": self.count,
+                "mean_us": round(self.total / self.count * us, 1) if self.count else 0.0,
+                "p50_us": round(self.percentile(50) * us, 1),
+                "p99_us": round(self.percentile(99) * us, 1),
+                "max_us": round(self.max * us, 1)}
+
+class LatencyRecorder:
+    """
+    各階段的延遲直方圖。record(stage, start_ns) 記錄 start_ns 到現在（perf_counter_ns）的時間；
+    熱路徑可先以 histogram(stage) 取得直方圖再直接 record(ns)。
+    每個階段只由單一管線執行緒寫入；snapshot(reset=True) 原地歸零（已取得的直方圖參照仍有效），
+    適合定期輸出區間統計。
+    """
+    def __init__(self, stages=()):
+        self._lock = threading.Lock()
+        self.histograms = {name: LatencyHistogram() for name in stages}
+
+    def histogram(self, stage) -> LatencyHistogram:
+        h = self.histograms.get(stage)
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault(stage, LatencyHistogram())
+        return h
+
+    def record(self, stage, start_ns, end_ns=None):
+        self.histogram(stage).record((time.perf_counter_ns() if end_ns is None else end_ns) - start_ns)
+
+    def snapshot(self, reset=False) -> dict:
+        with self._lock:
+            out = {}
+            for name, h in self.histograms.items():
+                out[name] = h.summary()
+                if reset:
+                    h.reset()
+        return out
+
+    def format(self, reset=False) -> str:
+        lines = [f"{'stage':<16}{'count':>9}{'p50 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for name, s in self.snapshot(reset).items():
+            lines.append(f"{name:<16}{s['count']:>9}{s['p50_us']:>10.1f}{s['p99_us']:>10.1f}{s['max_us']:>10.1f}")
+        return "\n".join(lines)
+
+    def dump_every(self, interval, log=print, reset=True):
+        """背景執行緒每 interval 秒輸出一次（預設輸出後歸零，即區間統計）。回傳可 set() 停止的 Event。"""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                log(self.format(reset))
+
+        threading.Thread(target=loop, name="latency-dump", daemon=True).start()
+        return stop
+
+def serve(recorder: LatencyRecorder, port=8765, host="127.0.0.1"):
+    """
+    本機 HTTP endpoint：GET / 回傳各階段統計 JSON，GET /reset 回傳後歸零。
+    回傳 ThreadingHTTPServer（shutdown() 停止）。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(recorder.snapshot(reset=self.path.rstrip("/") == "/reset")).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="latency-http", daemon=True).start()
+    return server
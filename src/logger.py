@@ -9,7 +9,9 @@ class TradeLogger:
         print('TRADE:', trade)
         if self.tick_recorder:
             try:
-                self.tick_recorder.record(trade)
+                # BufferedRecorder 將成交另存 trades 檔，不與 tick 混在一起
+                record = getattr(self.tick_recorder, 'record_trade', self.tick_recorder.record)
+                record(trade)
             except Exception:
                 pass
 
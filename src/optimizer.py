@@ -0,0 +1,242 @@
+# src/optimizer.py
+"""
+ThreeTickStrategy 參數掃描 / walk-forward 最佳化。
+- 參數：atr_period / stop_atr_mult / rr / warmup / fee_ticks / slippage（grid 為各參數的候選值）
+- Kbar 欄位先寫成 .npy，worker 以 numpy memmap 開啟，多個行程共用同一份 page cache，不各自複製
+- 每組參數以 backtest.vectorized_trades 回測，結果依 --rank-by 排序後寫出
+- 同一區段、同一 atr_period 的 ATR 由 indicators.CACHE 快取，worker 內不重算
+用法（於專案根目錄）：
+    python -m src.optimizer --contract TMF202512 --start 2025-11-01 --end 2025-11-30 \\
+        --grid '{"atr_period": [10, 14, 20], "stop_atr_mult": [1.0, 1.2, 1.5], "rr": [1.5, 1.8, 2.2]}'
+    python -m src.optimizer --kbars data/kbars_3tick/sample.parquet --walk-forward 200000 50000
+    python -m src.optimizer --synthetic 600000 --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import vectorized_trades
+from src.storage import PartitionedStore, read_frame, write_frame
+from src.strategy import ThreeTickStrategy
+
+BAR_COLUMNS = ("time", "open", "high", "low", "close")
+DEFAULT_GRID = {
+    "atr_period": [10, 14, 20],
+    "stop_atr_mult": [1.0, 1.2, 1.5],
+    "rr": [1.5, 1.8, 2.2],
+    "warmup": [15],
+}
+STRATEGY_PARAMS = ("atr_period", "stop_atr_mult", "rr", "warmup", "fee_ticks", "slippage")
+METRICS = ("trades", "net_pnl", "win_rate", "expectancy", "profit_factor", "max_drawdown")
+
+def param_grid(grid: dict):
+    """{"rr": [1.5, 1.8], ...} -> [{"rr": 1.5, ...}, ...]（笛卡兒積）。"""
+    for k in grid:
+        if k not in STRATEGY_PARAMS:
+            raise KeyError(f"unknown strategy parameter: {k}")
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def share_bars(kbars: pd.DataFrame, directory) -> Path:
+    """把 Kbar 欄位存成 .npy（time 存為 int64 ns），回傳目錄。"""
+    d = Path(directory)
+    d.mkdir(parents=True, exist_ok=True)
+    for c in BAR_COLUMNS:
+        if c == "time":
+            arr = pd.to_datetime(kbars["time"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        else:
+            arr = kbars[c].to_numpy(dtype=float)
+        np.save(d / f"{c}.npy", arr)
+    return d
+
+def open_bars(directory) -> dict:
+    """以 memmap 唯讀開啟 share_bars 的輸出（零複製）。"""
+    d = Path(directory)
+    bars = {c: np.load(d / f"{c}.npy", mmap_mode="r") for c in BAR_COLUMNS}
+    bars["time"] = bars["time"].view("datetime64[ns]")
+    return bars
+
+def trade_metrics(pnl) -> dict:
+    pnl = np.asarray(pnl, dtype=float)
+    n = len(pnl)
+    if n == 0:
+        return {"trades": 0, "net_pnl": 0.0, "win_rate": 0.0, "expectancy": 0.0,
+                "profit_factor": 0.0, "max_drawdown": 0.0}
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    gains = pnl[pnl > 0].sum()
+    losses = -pnl[pnl < 0].sum()
+    return {
+        "trades": n,
+        "net_pnl": float(equity[-1]),
+        "win_rate": float((pnl > 0).mean()),
+        "expectancy": float(pnl.mean()),
+        "profit_factor": float(gains / losses) if losses > 0 else float("inf"),
+        "max_drawdown": float(drawdown.max()),
+    }
+
+# ---------- worker ----------
+_BARS = None
+_BASE = None
+
+def _init_worker(bars_dir, base):
+    global _BARS, _BASE
+    _BARS = open_bars(bars_dir)
+    _BASE = base
+
+def _evaluate(params, lo=0, hi=None):
+    """在 worker 內對 [lo, hi) 區段回測一組參數，回傳 params + 指標。"""
+    hi = len(_BARS["close"]) if hi is None else hi
+    bars = {c: a[lo:hi] for c, a in _BARS.items()}
+    kw = dict(fee_ticks=_BASE["fee_ticks"], slippage=_BASE["slippage"])
+    kw.update(params)
+    strategy = ThreeTickStrategy(**kw)
+    trades = vectorized_trades(bars, strategy, _BASE["capital"], _BASE["risk_pct"],
+                               tick_value=_BASE["tick_value"], both_hit=_BASE["both_hit"],
+                               dataset=("optimizer", lo, hi))
+    return dict(params, **trade_metrics(trades["pnl"]))
+
+def _evaluate_star(args):
+    return _evaluate(*args)
+
+def base_from_config(cfg: dict) -> dict:
+    bt = cfg.get("backtest", {})
+    return {
+        "fee_ticks": cfg.get("fee_ticks", 4),
+        "slippage": cfg.get("slippage_ticks", 0.5),
+        "capital": bt.get("initial_capital", 1_000_000),
+        "risk_pct": bt.get("risk_per_trade_pct", 0.5),
+        "both_hit": bt.get("both_hit", "stop"),
+        "tick_value": 10,
+    }
+
+class Optimizer:
+    """
+    kbars：DataFrame；base：base_from_config(cfg) 的結果。
+    使用方式：
+        with Optimizer(kbars, base, workers=8) as opt:
+            table = opt.sweep(param_grid(DEFAULT_GRID))
+    """
+    def __init__(self, kbars: pd.DataFrame, base: dict, workers=None, rank_by="net_pnl"):
+        if rank_by not in METRICS:
+            raise ValueError(f"rank_by must be one of {METRICS}")
+        self.n_bars = len(kbars)
+        self.base = base
+        self.rank_by = rank_by
+        self.workers = workers or os.cpu_count() or 1
+        self._tmp = tempfile.TemporaryDirectory(prefix="tmf_opt_")
+        self.bars_dir = share_bars(kbars, self._tmp.name)
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(str(self.bars_dir), self.base))
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._tmp.cleanup()
+
+    def _map(self, tasks):
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        return list(self._pool.map(_evaluate_star, tasks, chunksize=chunksize))
+
+    def _rank(self, rows) -> pd.DataFrame:
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        ascending = self.rank_by == "max_drawdown"
+        df = df.sort_values(self.rank_by, ascending=ascending, kind="stable").reset_index(drop=True)
+        df.insert(0, "rank", np.arange(1, len(df) + 1))
+        return df
+
+    def sweep(self, combos, lo=0, hi=None) -> pd.DataFrame:
+        """對 [lo, hi) 區段回測所有參數組合，回傳排序後的結果表。"""
+        return self._rank(self._map([(p, lo, hi) for p in combos]))
+
+    def walk_forward(self, combos, train_bars, test_bars, step=None) -> pd.DataFrame:
+        """
+        滾動視窗：每個 fold 以 train 區段掃描選出最佳參數，再以 test 區段樣本外驗證。
+        回傳每個 fold 一列：區段範圍、最佳參數、樣本內 / 樣本外指標（test_ 前綴）。
+        """
+        step = step or test_bars
+        folds = []
+        start = 0
+        while start + train_bars + test_bars <= self.n_bars:
+            folds.append((start, start + train_bars, start + train_bars + test_bars))
+            start += step
+        rows = []
+        for k, (lo, mid, hi) in enumerate(folds):
+            results = self._map([(p, lo, mid) for p in combos])
+            pick = min if self.rank_by == "max_drawdown" else max
+            best = pick(results, key=lambda r: r[self.rank_by])
+            params = {p: best[p] for p in combos[0]}
+            test = self._map([(params, mid, hi)])[0]
+            row = {"fold": k, "train_start": lo, "train_end": mid, "test_end": hi}
+            row.update({p: best[p] for p in params})
+            row.update({m: best[m] for m in METRICS})
+            row.update({f"test_{m}": test[m] for m in METRICS})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+def load_bars(args) -> pd.DataFrame:
+    if args.synthetic:
+        from src.synthetic import kbars_frame
+        return kbars_frame(args.synthetic, seed=7)
+    if args.kbars:
+        return read_frame(args.kbars)
+    return PartitionedStore("data/kbars_3tick").read(args.contract, args.start, args.end)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ThreeTickStrategy 參數最佳化")
+    src = ap.add_argument_group("資料來源（擇一）")
+    src.add_argument("--kbars", help="單一 Kbar 檔")
+    src.add_argument("--contract", help="分區資料集的合約代碼（搭配 --start/--end）")
+    src.add_argument("--start")
+    src.add_argument("--end")
+    src.add_argument("--synthetic", type=int, default=0, help="使用 N 根合成 Kbar")
+    ap.add_argument("--config", default="config/config.json")
+    ap.add_argument("--grid", help="JSON：{參數: [候選值, ...]}", default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--rank-by", default="net_pnl", choices=METRICS)
+    ap.add_argument("--walk-forward", nargs=2, type=int, metavar=("TRAIN", "TEST"))
+    ap.add_argument("--step", type=int, default=None)
+    ap.add_argument("--out", default="results/optimizer.csv")
+    ap.add_argument("--format", default="csv", choices=["parquet", "feather", "csv"])
+    args = ap.parse_args(argv)
+
+    cfg = {}
+    if Path(args.config).exists():
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    grid = json.loads(args.grid) if args.grid else DEFAULT_GRID
+    combos = param_grid(grid)
+    kbars = load_bars(args)
+    if kbars.empty:
+        print("沒有 Kbar 資料。")
+        return 1
+    print(f"{len(kbars)} 根 Kbar，{len(combos)} 組參數")
+    with Optimizer(kbars, base_from_config(cfg), workers=args.workers, rank_by=args.rank_by) as opt:
+        if args.walk_forward:
+            table = opt.walk_forward(combos, *args.walk_forward, step=args.step)
+        else:
+            table = opt.sweep(combos)
+    out = write_frame(table, args.out, fmt=args.format)
+    print(table.head(10).to_string(index=False))
+    print(f"結果已儲存: {out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
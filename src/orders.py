@@ -0,0 +1,348 @@
+# src/orders.py
+"""
+委託管理：策略訊號 -> 進場 + 停損 / 目標括號單（OCO），以及本機模擬交易所。
+
+    訊號 ─> OrderManager.on_signal ─> 進場市價單 ─> gateway.submit
+    成交回報 ─> OrderManager.on_fill ─> 進場成交：依成交價掛停損（stop）與目標（limit）兩腳，互為 OCO
+                                    └> 任一腳成交：撤銷另一腳、結算損益、呼叫 TickEngine.on_order_filled
+
+gateway 需提供 submit(order) / cancel(order_id)，成交時呼叫 manager.on_fill(order_id, price, time)。
+SimulatedExchange 為本機撮合器，由逐筆驅動（錄製檔重播或即時管線的 quote_sinks），不需券商連線；
+券商 gateway 依同一介面實作即可替換。
+
+鎖的範圍：報價路徑（SimulatedExchange.on_tick）不取鎖，新委託 / 撤單經 deque 交給撮合器，
+只有成交時才進入 OrderManager 的鎖更新委託狀態（訊號在管線的 order 執行緒、成交在管線的聚合執行緒）。
+用法（於專案根目錄）：
+    python -m src.orders --synthetic 200000 --latency-ticks 1
+"""
+import argparse
+import itertools
+import threading
+import time
+from collections import deque
+
+ORDER_STATES = ("pending", "working", "filled", "cancelled", "rejected")
+ORDER_TYPES = ("market", "stop", "limit")
+_now = time.perf_counter_ns
+
+class Order:
+    __slots__ = ("order_id", "bracket_id", "kind", "side", "type", "price", "size", "status",
+                 "fill_price", "fill_time", "submitted_ns", "filled_ns")
+
+    def __init__(self, order_id, bracket_id, kind, side, type_, price, size):
+        if type_ not in ORDER_TYPES:
+            raise ValueError(f"order type must be one of {ORDER_TYPES}")
+        self.order_id = order_id
+        self.bracket_id = bracket_id
+        self.kind = kind            # "entry" / "stop" / "target" / "flatten"
+        self.side = side            # +1 買 / -1 賣
+        self.type = type_
+        self.price = price          # stop：觸發價；limit：限價；market：None
+        self.size = size
+        self.status = "pending"
+        self.fill_price = None
+        self.fill_time = None
+        self.submitted_ns = 0
+        self.filled_ns = 0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class Bracket:
+    """一組進場 + 停損 + 目標；stop / target 在進場成交後才建立。"""
+    __slots__ = ("bracket_id", "side", "size", "stop_ticks", "signal_time", "entry", "stop", "target",
+                 "exit", "state")
+
+    def __init__(self, bracket_id, side, size, stop_ticks, signal_time):
+        self.bracket_id = bracket_id
+        self.side = side
+        self.size = size
+        self.stop_ticks = stop_ticks
+        self.signal_time = signal_time
+        self.entry = self.stop = self.target = self.exit = None
+        self.state = "entering"     # entering -> open -> closed
+
+class OrderManager:
+    """
+    gateway：SimulatedExchange 或券商 gateway；engine：TickEngine（成交時呼叫 on_order_filled 更新部位）
+    size_fn(signal) -> 口數；未指定時依 capital / risk_pct 以 calc_position_size 計算。
+    同一時間只允許 max_brackets 組括號單（預設 1，同實盤單一部位），其餘訊號略過並計數。
+    latency：src.latency.LatencyRecorder（可選），記錄 signal_to_submit / submit_to_fill / fill_to_oco。
+    """
+    def __init__(self, gateway=None, engine=None, rr=1.8, fee_ticks=4, tick_value=10, size_fn=None,
+                 capital=1_000_000, risk_pct=0.5, max_brackets=1, latency=None):
+        self.gateway = gateway
+        self.engine = engine
+        self.rr = rr
+        self.fee_ticks = fee_ticks
+        self.tick_value = tick_value
+        self.capital = capital
+        self.risk_pct = risk_pct
+        if size_fn is None:
+            # 在建構時載入（src.utils 會帶入 pandas），避免第一筆訊號才付匯入成本
+            from src.utils import calc_position_size
+            self._calc_size = calc_position_size
+            size_fn = self._default_size
+        self.size_fn = size_fn
+        self.max_brackets = max_brackets
+        self.latency = latency
+        self.orders = {}
+        self.brackets = {}
+        self.active = {}
+        self.trades = []
+        self.skipped = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _default_size(self, signal) -> int:
+        return self._calc_size(self.capital, self.risk_pct, signal["stop_ticks"], tick_value=self.tick_value)
+
+    def _new_order(self, bracket, kind, side, type_, price, size) -> Order:
+        order = Order(f"O{next(self._ids)}", bracket.bracket_id, kind, side, type_, price, size)
+        self.orders[order.order_id] = order
+        return order
+
+    def _submit(self, order):
+        order.status = "working"
+        order.submitted_ns = _now()
+        self.gateway.submit(order)
+
+    # ---------- 訊號（管線 order 執行緒） ----------
+    def on_signal(self, signal, size=None):
+        """signal：strategy.on_kbar 的輸出（side / price / stop_ticks，可含 time）。回傳 Bracket 或 None。"""
+        t0 = _now()
+        size = self.size_fn(signal) if size is None else size
+        with self._lock:
+            if size <= 0 or len(self.active) >= self.max_brackets:
+                self.skipped += 1
+                return None
+            side = 1 if signal["side"] == "buy" else -1
+            bracket = Bracket(f"B{next(self._ids)}", side, size, signal["stop_ticks"], signal.get("time"))
+            bracket.entry = self._new_order(bracket, "entry", side, "market", None, size)
+            self.brackets[bracket.bracket_id] = bracket
+            self.active[bracket.bracket_id] = bracket
+            self._submit(bracket.entry)
+        if self.latency is not None:
+            self.latency.record("signal_to_submit", t0)
+        return bracket
+
+    # ---------- 成交回報（撮合器 / 券商 callback 執行緒） ----------
+    def on_fill(self, order_id, price, fill_time=None):
+        t0 = _now()
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order.status != "working":
+                return None
+            order.status = "filled"
+            order.fill_price = price
+            order.fill_time = fill_time
+            order.filled_ns = t0
+            bracket = self.brackets[order.bracket_id]
+            if order.kind == "entry":
+                self._on_entry(bracket, order)
+            else:
+                self._on_exit(bracket, order)
+        if self.latency is not None:
+            self.latency.record("submit_to_fill", order.submitted_ns, t0)
+            if order.kind == "entry":
+                self.latency.record("fill_to_oco", t0)
+        self._report(order)
+        return order
+
+    def _on_entry(self, bracket, order):
+        s, st = bracket.side, bracket.stop_ticks
+        entry = order.fill_price
+        bracket.stop = self._new_order(bracket, "stop", -s, "stop", entry - s * st, bracket.size)
+        bracket.target = self._new_order(bracket, "target", -s, "limit", entry + s * self.rr * st, bracket.size)
+        bracket.state = "open"
+        self._submit(bracket.stop)
+        self._submit(bracket.target)
+
+    def _on_exit(self, bracket, order):
+        # OCO：一腳成交即撤銷另一腳
+        for other in (bracket.stop, bracket.target, bracket.exit):
+            if other is not None and other is not order and other.status == "working":
+                other.status = "cancelled"
+                self.gateway.cancel(other.order_id)
+        bracket.state = "closed"
+        self.active.pop(bracket.bracket_id, None)
+        entry = bracket.entry
+        s = bracket.side
+        self.trades.append({
+            "side": "buy" if s > 0 else "sell", "time": bracket.signal_time, "entry": entry.fill_price,
+            "stop": bracket.stop.price, "target": bracket.target.price, "size": bracket.size,
+            "exit_time": order.fill_time, "exit_price": order.fill_price,
+            "exit_reason": "eod" if order.kind == "flatten" else order.kind,
+            "pnl": ((order.fill_price - entry.fill_price) * s - self.fee_ticks) * self.tick_value * bracket.size,
+        })
+
+    def _report(self, order):
+        if self.engine is not None:
+            self.engine.on_order_filled({"time": order.fill_time, "order_id": order.order_id,
+                                         "side": "buy" if order.side > 0 else "sell", "kind": order.kind,
+                                         "price": order.fill_price, "size": order.size, "status": "filled"})
+
+    # ---------- 控制 ----------
+    def flatten(self):
+        """以市價平掉所有已成交的括號單（收盤 / 停止時）；尚未成交的進場單直接撤銷。"""
+        with self._lock:
+            for bracket in list(self.active.values()):
+                if bracket.state == "entering":
+                    bracket.entry.status = "cancelled"
+                    self.gateway.cancel(bracket.entry.order_id)
+                    self.active.pop(bracket.bracket_id, None)
+                elif bracket.exit is None:
+                    bracket.exit = self._new_order(bracket, "flatten", -bracket.side, "market", None, bracket.size)
+                    self._submit(bracket.exit)
+
+    def working(self):
+        return [o for o in self.orders.values() if o.status == "working"]
+
+class SimulatedExchange:
+    """
+    本機撮合器，以逐筆價格撮合：
+    - 新委託在送出後第 latency_ticks 筆 tick 才生效（0 表示下一筆 tick 即可成交）
+    - market：生效的那筆 tick 價格加計 slippage 成交
+    - stop：價格觸及觸發價（買：>=、賣：<=）時以該筆價格加計 slippage 成交（市價）
+    - limit：價格觸及限價時以限價成交
+    on_tick 只由單一 tick 執行緒呼叫；submit / cancel 可由其他執行緒呼叫（經 deque 交接，不取鎖）。
+    """
+    def __init__(self, on_fill=None, latency_ticks=1, slippage=0.5):
+        self.on_fill = on_fill
+        self.latency_ticks = max(int(latency_ticks), 1)
+        self.slippage = slippage
+        self._incoming = deque()
+        self._cancels = deque()
+        self._book = []
+        self.ticks = 0
+        self.fills = 0
+
+    def attach(self, manager: OrderManager):
+        manager.gateway = self
+        self.on_fill = manager.on_fill
+        return self
+
+    def submit(self, order):
+        self._incoming.append((order, self.ticks + self.latency_ticks))
+
+    def cancel(self, order_id):
+        self._cancels.append(order_id)
+
+    def _drain(self):
+        while self._incoming:
+            self._book.append(self._incoming.popleft())
+        if self._cancels:
+            cancelled = set()
+            while self._cancels:
+                cancelled.add(self._cancels.popleft())
+            self._book = [(o, due) for o, due in self._book if o.order_id not in cancelled]
+
+    def on_tick(self, tick):
+        """tick：dict（time / price）；可直接放入 QuotePipeline 的 quote_sinks（聚合階段逐筆呼叫，不會漏 tick）。"""
+        self.match(tick["time"], tick["price"])
+
+    def match(self, t, price):
+        self.ticks += 1
+        if self._incoming or self._cancels:
+            self._drain()
+        if not self._book:
+            return
+        n = self.ticks
+        for entry in list(self._book):
+            order, due = entry
+            if due > n or order.status != "working":
+                continue
+            s = order.side
+            if order.type == "market":
+                fill = price + s * self.slippage
+            elif order.type == "stop":
+                if not (price >= order.price if s > 0 else price <= order.price):
+                    continue
+                fill = price + s * self.slippage
+            else:
+                if not (price <= order.price if s > 0 else price >= order.price):
+                    continue
+                fill = order.price
+            self._book.remove(entry)
+            self.fills += 1
+            self.on_fill(order.order_id, fill, t)
+            # 成交回報可能撤掉簿內其他委託（OCO），重新整理後再繼續
+            if self._cancels:
+                self._drain()
+
+    def close_out(self, t, price):
+        """資料結束：把仍在簿內的 market 委託以 price 成交（配合 OrderManager.flatten）。"""
+        self._drain()
+        for entry in list(self._book):
+            order, _ = entry
+            if order.type == "market" and order.status == "working":
+                self._book.remove(entry)
+                self.fills += 1
+                self.on_fill(order.order_id, price + order.side * self.slippage, t)
+
+def run_simulation(ticks, config=None, latency_ticks=1, latency=None):
+    """
+    以逐筆重播驅動 QuoteManager -> ThreeTickStrategy -> OrderManager -> SimulatedExchange（同一執行緒）。
+    ticks：逐筆 DataFrame 或欄位 mapping。回傳 (OrderManager, SimulatedExchange, 秒數)。
+    """
+    import numpy as np
+    import pandas as pd
+    from src.engine import StrategyState, TickEngine
+    from src.quote_manager import QuoteManager
+    from src.replay import FillLog
+    from src.strategy import ThreeTickStrategy
+    config = config or {}
+    bt = config.get("backtest", {})
+    strategy = ThreeTickStrategy(fee_ticks=config.get("fee_ticks", 4), slippage=config.get("slippage_ticks", 0.5),
+                                 **config.get("strategy", {}))
+    engine = TickEngine(StrategyState(), config.get("bias", "auto"), {}, trade_logger=FillLog())
+    manager = OrderManager(engine=engine, rr=strategy.rr, fee_ticks=strategy.fee_ticks,
+                           capital=bt.get("initial_capital", 1_000_000), risk_pct=bt.get("risk_per_trade_pct", 0.5),
+                           latency=latency)
+    exchange = SimulatedExchange(latency_ticks=latency_ticks, slippage=strategy.slippage).attach(manager)
+    qm = QuoteManager(ticks_per_kbar=3)
+    times = np.asarray(pd.to_datetime(ticks["time"])).astype("datetime64[us]").tolist()
+    prices = np.asarray(ticks["price"], dtype=float).tolist()
+    volumes = np.asarray(ticks["volume"]).astype(np.int64).tolist() if "volume" in ticks else [0] * len(prices)
+    t0 = time.perf_counter()
+    for t, p, v in zip(times, prices, volumes):
+        exchange.match(t, p)
+        kbar = qm.on_tick({"time": t, "price": p, "volume": v})
+        if kbar is not None:
+            sig = strategy.on_kbar(kbar)
+            if sig:
+                sig["time"] = kbar["time"]
+                manager.on_signal(sig)
+    if times:
+        manager.flatten()
+        exchange.close_out(times[-1], prices[-1])
+    return manager, exchange, time.perf_counter() - t0
+
+def main(argv=None):
+    from src.latency import LatencyRecorder
+    ap = argparse.ArgumentParser(description="以本機模擬交易所重播逐筆，量測委託處理的延遲與吞吐量")
+    ap.add_argument("--raw", help="逐筆資料檔")
+    ap.add_argument("--synthetic", type=int, default=0, help="使用 N 筆合成逐筆")
+    ap.add_argument("--latency-ticks", type=int, default=1)
+    ap.add_argument("--no-quality", action="store_true", help="--raw 不做品質清理（與 Kbar 轉檔的資料不同）")
+    args = ap.parse_args(argv)
+    if args.synthetic:
+        from src.synthetic import ticks_frame
+        ticks = ticks_frame(args.synthetic, seed=11)
+    elif args.raw:
+        from src import tick_quality
+        ticks = tick_quality.load_clean(args.raw, None if args.no_quality else tick_quality.DEFAULTS)
+    else:
+        ap.error("需指定 --raw 或 --synthetic")
+    lat = LatencyRecorder(("signal_to_submit", "fill_to_oco", "submit_to_fill"))
+    manager, exchange, dt = run_simulation(ticks, latency_ticks=args.latency_ticks, latency=lat)
+    n = exchange.ticks
+    print(f"{n:,} 筆 tick，{dt:.2f}s（{n / dt:,.0f} ticks/s），委託 {len(manager.orders)} 筆、"
+          f"成交 {exchange.fills} 筆、交易 {len(manager.trades)} 筆、略過訊號 {manager.skipped}")
+    print(f"部位（TickEngine.state.position）：{manager.engine.state.position}，"
+          f"損益 {sum(t['pnl'] for t in manager.trades):,.0f}")
+    print(lat.format())
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,422 @@
+# src/pipeline.py
+"""
+即時報價管線：Shioaji callback 執行緒只負責放入佇列，其餘工作由各自的消費執行緒處理。
+
+    callback ──> [tick 佇列] ──> 聚合（QuoteManager）──> [bar 佇列] ──> 訊號（strategy.on_kbar）
+                                   │  └─> quote_sinks（同步，如模擬撮合）      │
+                                   └─> [record 佇列] ──> 記錄（TickEngine.on_tick 等）
+                                                                            └─> [signal 佇列] ──> 下單
+
+tick / bar 佇列有上限與溢位策略（overflow）：
+- "drop_oldest"：丟掉最舊的一筆再放入（預設；報價以最新為準）
+- "drop_newest"：丟掉新進的這筆
+- "block"：等待空位（最多 block_timeout 秒，逾時仍丟棄；None 表示不逾時），僅適合非 callback 執行緒的生產者
+signal 佇列不論 overflow 一律 block 且不逾時：訊號 / 下單不可丟；record 佇列固定 drop_oldest。
+tick / bar 佇列丟棄時以 logger.warning 回報（每 warn_interval 秒最多一次，附累計丟棄數）。
+metrics() 回傳各佇列深度 / 高水位 / 丟棄數與各階段處理數 / 錯誤數 / 忙碌時間。
+
+快照（src/snapshot.py）：snapshot_path 有設定時，每 snapshot_interval 秒與 stop() 時
+在 tick 佇列放入 marker；聚合階段在 marker 到達時記下 QuoteManager 狀態，
+訊號階段在處理完先前所有 bar 後記下策略狀態並寫檔，兩者對應同一個 tick 位置。
+
+延遲量測（src/latency.py）：latency=True 或傳入 LatencyRecorder 時，callback 進入時打上
+perf_counter_ns 時間戳並隨 tick / bar / 訊號一起傳遞，各階段記錄 LATENCY_STAGES 的直方圖；
+未啟用時使用原本的 handler，不多做任何事。
+
+重播（離線測試）：
+    python -m src.pipeline --raw data/raw_ticks/TMF202512/2025-11-26.parquet --speed 10
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+_STOP = object()
+_now = time.perf_counter_ns
+# 佇列等待（*_queue）、各階段處理時間，以及由 callback 起算的端到端延遲
+LATENCY_STAGES = ("tick_queue", "aggregate", "bar_queue", "strategy", "tick_to_decision",
+                  "tick_to_signal", "signal_queue", "order", "tick_to_order")
+
+class _SnapshotMarker:
+    """沿管線傳遞的快照請求；各階段依序填入自己的狀態。"""
+    __slots__ = ("snapshot",)
+
+    def __init__(self):
+        self.snapshot = None
+
+class BoundedQueue:
+    """
+    有上限的執行緒安全佇列，put 依溢位策略處理，並記錄背壓指標。
+    block_timeout=None：block 策略等到有空位為止，永不丟棄。
+    warn_interval：丟棄時以 logger.warning 回報，同一佇列每 warn_interval 秒最多一次；None 不回報。
+    """
+    def __init__(self, name, maxsize=10_000, overflow="drop_oldest", block_timeout=0.1, warn_interval=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.warn_interval = warn_interval
+        self._warned_at = None
+        self._warned_dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.blocked_seconds = 0.0
+
+    def put(self, item) -> bool:
+        """放入一筆；回傳 False 表示本筆被丟棄。"""
+        with self._cond:
+            if len(self._items) >= self.maxsize and item is not _STOP:
+                if self.overflow == "drop_newest":
+                    self._drop()
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._items.popleft()
+                    self._drop()
+                else:
+                    t0 = time.perf_counter()
+                    ok = self._cond.wait_for(lambda: len(self._items) < self.maxsize, self.block_timeout)
+                    self.blocked_seconds += time.perf_counter() - t0
+                    if not ok:
+                        self._drop()
+                        return False
+            self._items.append(item)
+            if item is _STOP:
+                self._cond.notify_all()
+                return True
+            self.put_count += 1
+            if len(self._items) > self.high_water:
+                self.high_water = len(self._items)
+            self._cond.notify_all()
+            return True
+
+    def _drop(self):
+        """持有鎖時呼叫：計數，必要時（節流）寫 warning。"""
+        self.dropped += 1
+        if self.warn_interval is None:
+            return
+        now = time.monotonic()
+        if self._warned_at is None or now - self._warned_at >= self.warn_interval:
+            logger.warning("佇列 %s 已滿（%d），%s 丟棄 %d 筆，累計 %d 筆", self.name, self.maxsize, self.overflow,
+                           self.dropped - self._warned_dropped, self.dropped)
+            self._warned_at = now
+            self._warned_dropped = self.dropped
+
+    def get(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._items)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def metrics(self) -> dict:
+        return {"depth": len(self._items), "high_water": self.high_water, "put": self.put_count,
+                "dropped": self.dropped, "blocked_seconds": round(self.blocked_seconds, 6)}
+
+class Stage(threading.Thread):
+    """單一消費階段：從 inbox 取出、呼叫 handler，handler 例外只記錄不中斷。"""
+    def __init__(self, name, inbox: BoundedQueue, handler, downstream=()):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.inbox = inbox
+        self.handler = handler
+        self.downstream = downstream
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                for q in self.downstream:
+                    q.put(_STOP)
+                return
+            t0 = time.perf_counter()
+            try:
+                self.handler(item)
+            except Exception:
+                self.errors += 1
+                logger.exception("pipeline stage %s 處理失敗", self.name)
+            self.busy_seconds += time.perf_counter() - t0
+            self.processed += 1
+
+    def metrics(self) -> dict:
+        return {"processed": self.processed, "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 6)}
+
+def shioaji_tick_to_dict(tick) -> dict:
+    """Shioaji tick 物件 -> {'time','price','volume'}（相容 datetime / ts 兩種欄位）。"""
+    t = getattr(tick, "datetime", None) or getattr(tick, "ts", None)
+    return {"time": t, "price": float(tick.close), "volume": getattr(tick, "volume", 0)}
+
+class QuotePipeline:
+    """
+    quote_manager：QuoteManager（不要再設定 on_kbar_callback，bar 由管線轉交）
+    strategy：有 on_kbar(kbar) 的物件
+    tick_sinks：每筆 tick 要呼叫的記錄函式（如 TickEngine.on_tick、TickRecorder.record），
+        經 record 佇列（滿了丟最舊），不可用於需要完整逐筆的消費者
+    quote_sinks：在聚合階段逐筆同步呼叫（與產生 bar 的 tick 完全一致、不會被丟），
+        如 SimulatedExchange.on_tick；會直接增加 tick -> 訊號延遲，必須很快
+    on_signal：下單 / 模擬下單函式，預設只寫 log
+    warn_interval：tick / bar 佇列丟棄時的 warning 節流秒數（None 不回報）
+    """
+    def __init__(self, quote_manager, strategy, tick_sinks=(), on_signal=None, quote_sinks=(),
+                 maxsize=10_000, overflow="drop_oldest", record_maxsize=100_000,
+                 state=None, snapshot_path=None, snapshot_interval=60.0, latency=None, warn_interval=5.0):
+        self.quote_manager = quote_manager
+        self.strategy = strategy
+        self.tick_sinks = list(tick_sinks)
+        self.quote_sinks = list(quote_sinks)
+        self.on_signal = on_signal or (lambda sig: logger.info("Signal: %s", sig))
+        self.ticks = BoundedQueue("tick", maxsize, overflow, warn_interval=warn_interval)
+        self.bars = BoundedQueue("bar", maxsize, overflow, warn_interval=warn_interval)
+        # 訊號不可丟：生產者是訊號階段（非 callback 執行緒），滿了就等下單階段消化
+        self.signals = BoundedQueue("signal", maxsize, "block", block_timeout=None)
+        # 記錄不可拖慢交易：固定丟最舊
+        self.records = BoundedQueue("record", record_maxsize, "drop_oldest")
+        if latency is True:
+            from src.latency import LatencyRecorder
+            latency = LatencyRecorder(LATENCY_STAGES)
+        self.latency = latency
+        if latency is None:
+            handlers = (self._aggregate, self._signal, self.on_signal)
+        else:
+            # 生產者改放入 (時間戳, tick)；實例屬性覆蓋類別方法，未啟用時不影響熱路徑
+            self.on_tick = self._on_tick_timed
+            self.on_shioaji_tick = self._on_shioaji_tick_timed
+            self._hist = [latency.histogram(name) for name in LATENCY_STAGES]
+            handlers = (self._aggregate_timed, self._signal_timed, self._order_timed)
+        self.stages = [
+            Stage("aggregate", self.ticks, handlers[0], (self.bars, self.records)),
+            Stage("signal", self.bars, handlers[1], (self.signals,)),
+            Stage("order", self.signals, handlers[2]),
+            Stage("record", self.records, self._record),
+        ]
+        self._started = False
+        self.state = state
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshots_saved = 0
+        self._last_time = None
+        self._same_time = 0
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread = None
+
+    # ---------- 生產者（callback 執行緒） ----------
+    def on_tick(self, tick: dict) -> bool:
+        """只放入佇列，不做其他工作。"""
+        return self.ticks.put(tick)
+
+    def on_shioaji_tick(self, exchange, tick):
+        """可直接註冊為 api.quote.set_on_tick_fop_v1_callback 的 callback。"""
+        self.ticks.put(shioaji_tick_to_dict(tick))
+
+    def _on_tick_timed(self, tick: dict) -> bool:
+        return self.ticks.put((_now(), tick))
+
+    def _on_shioaji_tick_timed(self, exchange, tick):
+        t0 = _now()
+        self.ticks.put((t0, shioaji_tick_to_dict(tick)))
+
+    # ---------- 消費階段 ----------
+    def _aggregate(self, tick):
+        if type(tick) is _SnapshotMarker:
+            from src.snapshot import take_snapshot
+            # 策略狀態由訊號階段補上
+            tick.snapshot = take_snapshot(self.strategy, self.quote_manager, self.state,
+                                          self._last_time, self._same_time)
+            self.bars.put(tick)
+            return
+        self.records.put(tick)
+        for sink in self.quote_sinks:
+            sink(tick)
+        self._advance(tick["time"])
+        kbar = self.quote_manager.on_tick(tick)
+        if kbar:
+            self.bars.put(kbar)
+
+    def _advance(self, t):
+        if t == self._last_time:
+            self._same_time += 1
+        else:
+            self._last_time = t
+            self._same_time = 1
+
+    def _signal(self, kbar):
+        if type(kbar) is _SnapshotMarker:
+            from src.snapshot import save_snapshot, strategy_state
+            kbar.snapshot["strategy"] = strategy_state(self.strategy)
+            save_snapshot(kbar.snapshot, self.snapshot_path)
+            self.snapshots_saved += 1
+            return
+        sig = self.strategy.on_kbar(kbar)
+        if sig:
+            self.signals.put(sig)
+
+    # 計時版 handler：項目為 (callback 時間戳, 放入佇列時間戳, 內容)，快照 marker 照舊傳遞；
+    # self._hist 依 LATENCY_STAGES 順序
+    def _aggregate_timed(self, item):
+        if type(item) is _SnapshotMarker:
+            return self._aggregate(item)
+        t0, tick = item
+        t1 = _now()
+        self.records.put(tick)
+        for sink in self.quote_sinks:
+            sink(tick)
+        self._advance(tick["time"])
+        kbar = self.quote_manager.on_tick(tick)
+        t2 = _now()
+        h = self._hist
+        h[0].record(t1 - t0)
+        h[1].record(t2 - t1)
+        if kbar:
+            self.bars.put((t0, t2, kbar))
+
+    def _signal_timed(self, item):
+        if type(item) is _SnapshotMarker:
+            return self._signal(item)
+        t0, t_put, kbar = item
+        t1 = _now()
+        sig = self.strategy.on_kbar(kbar)
+        t2 = _now()
+        h = self._hist
+        h[2].record(t1 - t_put)
+        h[3].record(t2 - t1)
+        h[4].record(t2 - t0)
+        if sig:
+            h[5].record(t2 - t0)
+            self.signals.put((t0, t2, sig))
+
+    def _order_timed(self, item):
+        t0, t_put, sig = item
+        t1 = _now()
+        self.on_signal(sig)
+        t2 = _now()
+        h = self._hist
+        h[6].record(t1 - t_put)
+        h[7].record(t2 - t1)
+        h[8].record(t2 - t0)
+
+    def _record(self, tick):
+        for sink in self.tick_sinks:
+            sink(tick)
+
+    # ---------- 控制 ----------
+    def resume_from(self, last_tick_time, same_time_count):
+        """warm start 後設定已處理到的 tick 位置（snapshot.catch_up 的回傳值），之後的快照由此接續。"""
+        self._last_time = last_tick_time
+        self._same_time = same_time_count
+
+    def request_snapshot(self) -> bool:
+        if not self.snapshot_path:
+            return False
+        return self.ticks.put(_SnapshotMarker())
+
+    def _snapshot_loop(self):
+        while not self._snapshot_stop.wait(self.snapshot_interval):
+            self.request_snapshot()
+
+    def start(self):
+        if not self._started:
+            for s in self.stages:
+                s.start()
+            if self.snapshot_path and self.snapshot_interval:
+                self._snapshot_stop.clear()
+                self._snapshot_thread = threading.Thread(target=self._snapshot_loop,
+                                                         name="pipeline-snapshot", daemon=True)
+                self._snapshot_thread.start()
+            self._started = True
+        return self
+
+    def stop(self, timeout=None):
+        """送出結束標記，各階段處理完佇列內剩餘項目後結束；有設定快照時先寫最後一份。"""
+        if not self._started:
+            return
+        if self._snapshot_thread is not None:
+            self._snapshot_stop.set()
+            self._snapshot_thread.join(timeout)
+            self._snapshot_thread = None
+        self.request_snapshot()
+        self.ticks.put(_STOP)
+        for s in self.stages:
+            s.join(timeout)
+        self._started = False
+
+    def metrics(self, reset_latency=False) -> dict:
+        out = {
+            "queues": {q.name: q.metrics() for q in (self.ticks, self.bars, self.signals, self.records)},
+            "stages": {s.name.replace("pipeline-", ""): s.metrics() for s in self.stages},
+        }
+        if self.latency is not None:
+            out["latency"] = self.latency.snapshot(reset_latency)
+        return out
+
+def replay(pipeline: QuotePipeline, ticks, speed: float = 0.0):
+    """
+    依錄製時間間隔把 ticks 送入管線。speed=1 為原速、10 為十倍速，0 表示不等待（盡快送出）。
+    ticks：可迭代的 tick dict（time 可為 datetime / Timestamp）。回傳送出筆數。
+    """
+    n = 0
+    t_wall0 = time.perf_counter()
+    t_data0 = None
+    for tick in ticks:
+        if speed > 0:
+            t = tick["time"]
+            if t_data0 is None:
+                t_data0 = t
+            due = (t - t_data0).total_seconds() / speed
+            wait = due - (time.perf_counter() - t_wall0)
+            if wait > 0:
+                time.sleep(wait)
+        pipeline.on_tick(tick)
+        n += 1
+    return n
+
+def main(argv=None):
+    from src import tick_quality
+    from src.quote_manager import QuoteManager
+    from src.strategy import ThreeTickStrategy
+    ap = argparse.ArgumentParser(description="以錄製的逐筆重播即時管線")
+    ap.add_argument("--raw", help="逐筆資料檔（data/raw_ticks 內的檔案）")
+    ap.add_argument("--synthetic", type=int, default=0, help="改用 N 筆合成逐筆")
+    ap.add_argument("--speed", type=float, default=0.0, help="重播倍速，0 為不等待")
+    ap.add_argument("--maxsize", type=int, default=10_000)
+    # 重播的生產者不是 callback 執行緒，預設 block 以免全速重播時丟資料
+    ap.add_argument("--overflow", default="block", choices=OVERFLOW_POLICIES)
+    ap.add_argument("--latency", action="store_true", help="量測各階段延遲並輸出直方圖統計")
+    ap.add_argument("--no-quality", action="store_true", help="--raw 不做品質清理（與 Kbar 轉檔的資料不同）")
+    args = ap.parse_args(argv)
+    if args.synthetic:
+        from src.synthetic import ticks_frame
+        df = ticks_frame(args.synthetic)
+    else:
+        df = tick_quality.load_clean(args.raw, None if args.no_quality else tick_quality.DEFAULTS)
+    signals = []
+    pipe = QuotePipeline(QuoteManager(ticks_per_kbar=3), ThreeTickStrategy(), on_signal=signals.append,
+                         maxsize=args.maxsize, overflow=args.overflow, latency=args.latency or None).start()
+    t0 = time.perf_counter()
+    n = replay(pipe, df[["time", "price", "volume"]].to_dict("records"), speed=args.speed)
+    pipe.stop()
+    dt = time.perf_counter() - t0
+    print(f"重播 {n} 筆，{dt:.2f}s（{n / dt:,.0f} ticks/s），訊號 {len(signals)} 個")
+    for kind, items in pipe.metrics().items():
+        if kind == "latency":
+            continue
+        for name, m in items.items():
+            print(f"{kind:>6} {name:<10} {m}")
+    if pipe.latency is not None:
+        print(pipe.latency.format())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# src/portfolio.py
+"""
+多合約 / 多策略共用資金的投資組合回測。
+- 各 leg（合約或策略實例）的 Kbar 以串流提供（generator），以 heapq.merge 依時間做 k 路合併，
+  記憶體只與 leg 數有關，與資料年數無關（PartitionedStore 逐分區讀取）
+- 共用權益：已實現損益即時併入權益，下一筆進場以當下權益計算口數（複利）
+- 風控：每 leg 最大口數、保證金占權益上限（max_margin_pct）、名目曝險槓桿上限（max_leverage）；
+  超過時縮減口數，不足 1 口則略過並計入 rejected
+- 每個 leg 同時只持有一個部位（同實盤）；進出場規則同 Backtester：
+  訊號 Kbar close 加滑價進場，自下一根起以 high/low 判定停損 / 目標（both_hit 規則同 src/exits.py），
+  停損與資料結束（eod）為市價出場扣滑價，目標為限價
+權益曲線以逐根的市值權益（含未實現損益）串流計算最大回撤；curve="trade" 只保存每筆出場後的權益，
+curve="bar" 保存每根（資料量大時會占用記憶體）。
+用法（於專案根目錄）：
+    python -m src.portfolio --leg TMF:TMF202512 --leg MXF:MXF202512 --start 2025-11-01 --end 2025-11-30
+    python -m src.portfolio --synthetic 200000
+"""
+import argparse
+import heapq
+import itertools
+import json
+from pathlib import Path
+
+from src.strategy import ThreeTickStrategy
+from src.utils import calc_position_size
+
+# 每點價值（元）與每口原始保證金（元，約略值；實際以期交所公告為準，可由 config 覆寫）
+CONTRACT_SPECS = {
+    "TMF": {"tick_value": 10, "margin": 16_100},
+    "MXF": {"tick_value": 50, "margin": 80_500},
+    "TXF": {"tick_value": 200, "margin": 322_000},
+}
+PORTFOLIO_TRADE_FIELDS = ["leg", "side", "time", "entry", "stop", "target", "size",
+                          "exit_time", "exit_price", "exit_reason", "holding_bars", "pnl", "equity"]
+
+class Leg:
+    """
+    name：leg 名稱；bars：依時間排序的 Kbar dict 可迭代物件（time/open/high/low/close）
+    strategy：有 on_kbar 的策略（預設 ThreeTickStrategy）；tick_value / margin 未指定時依 CONTRACT_SPECS[product]。
+    """
+    def __init__(self, name, bars, strategy=None, product=None, tick_value=None, margin=None,
+                 max_contracts=None):
+        spec = CONTRACT_SPECS.get(product or name, {})
+        self.name = name
+        self.bars = bars
+        self.strategy = strategy or ThreeTickStrategy()
+        self.tick_value = tick_value if tick_value is not None else spec.get("tick_value", 10)
+        self.margin = margin if margin is not None else spec.get("margin", 0)
+        self.max_contracts = max_contracts
+        self.position = None
+        self.last_close = None
+        self.bar_index = -1
+
+def merge_bars(legs):
+    """k 路合併各 leg 的 Kbar 串流，依 (time, leg 順序) 產生 (leg_index, kbar)。各 leg 的 time 型別需一致。"""
+    def keyed(i, bars):
+        seq = itertools.count()
+        for bar in bars:
+            yield bar["time"], i, next(seq), bar
+    for _, i, _, bar in heapq.merge(*(keyed(i, leg.bars) for i, leg in enumerate(legs))):
+        yield i, bar
+
+def frame_bars(df):
+    """DataFrame -> Kbar dict generator（time 轉為 datetime，供不同來源的 leg 比較時間）。"""
+    import pandas as pd
+    times = pd.to_datetime(df["time"]).dt.to_pydatetime()
+    cols = [df[c].to_numpy(dtype=float).tolist() for c in ("open", "high", "low", "close")]
+    for t, o, h, l, c in zip(times, *cols):
+        yield {"time": t, "open": o, "high": h, "low": l, "close": c}
+
+def store_bars(root, contract, start=None, end=None):
+    """逐分區讀取 PartitionedStore 的 Kbar（一次只載入一個交易日）。"""
+    from src.storage import PartitionedStore
+    for df in PartitionedStore(root).scan(contract, start, end, columns=["time", "open", "high", "low", "close"]):
+        if not df.empty:
+            yield from frame_bars(df)
+
+class Portfolio:
+    """
+    capital：起始資金；risk_pct：每筆風險占「當下權益」百分比（複利）
+    max_margin_pct：所有部位保證金合計 / 權益上限（1.0 = 100%）
+    max_leverage：所有部位名目價值合計 / 權益上限；None 表示不限制
+    run() 回傳交易 list（PORTFOLIO_TRADE_FIELDS），之後可讀 summary() / equity_curve / rejected。
+    """
+    def __init__(self, legs, capital=1_000_000, risk_pct=0.5, max_margin_pct=0.5, max_leverage=None,
+                 both_hit="stop", compound=True, curve="trade"):
+        if curve not in ("trade", "bar"):
+            raise ValueError("curve must be 'trade' or 'bar'")
+        self.legs = list(legs)
+        self.initial_capital = capital
+        self.cash = float(capital)          # 已實現權益
+        self.risk_pct = risk_pct
+        self.max_margin_pct = max_margin_pct
+        self.max_leverage = max_leverage
+        self.both_hit = both_hit
+        self.compound = compound
+        self.curve = curve
+        self.trades = []
+        self.equity_curve = []
+        self.rejected = {"in_position": 0, "risk": 0, "margin": 0, "leverage": 0}
+        self.peak = float(capital)
+        self.max_drawdown = 0.0
+        self.bars_processed = 0
+
+    # ---------- 帳戶 ----------
+    def unrealized(self) -> float:
+        total = 0.0
+        for leg in self.legs:
+            pos = leg.position
+            if pos is not None and leg.last_close is not None:
+                total += (leg.last_close - pos["entry"]) * pos["side"] * leg.tick_value * pos["size"]
+        return total
+
+    def equity(self) -> float:
+        return self.cash + self.unrealized()
+
+    def used_margin(self) -> float:
+        return sum(leg.margin * leg.position["size"] for leg in self.legs if leg.position is not None)
+
+    def exposure(self) -> float:
+        return sum(leg.last_close * leg.tick_value * leg.position["size"]
+                   for leg in self.legs if leg.position is not None)
+
+    def size_for(self, leg, price, stop_ticks) -> int:
+        """依當下權益計算口數，再依 max_contracts / 保證金 / 槓桿上限縮減；不足 1 口回傳 0 並記錄原因。"""
+        capital = self.cash if self.compound else self.initial_capital
+        size = calc_position_size(capital, self.risk_pct, stop_ticks, tick_value=leg.tick_value)
+        if size <= 0:
+            self.rejected["risk"] += 1
+            return 0
+        if leg.max_contracts is not None:
+            size = min(size, leg.max_contracts)
+        equity = self.equity()
+        if leg.margin:
+            room = equity * self.max_margin_pct - self.used_margin()
+            size = min(size, int(room // leg.margin)) if room > 0 else 0
+            if size <= 0:
+                self.rejected["margin"] += 1
+                return 0
+        if self.max_leverage is not None:
+            notional = price * leg.tick_value
+            room = equity * self.max_leverage - self.exposure()
+            size = min(size, int(room // notional)) if room > 0 and notional > 0 else 0
+            if size <= 0:
+                self.rejected["leverage"] += 1
+                return 0
+        return size
+
+    # ---------- 事件 ----------
+    def _check_exit(self, leg, bar):
+        pos = leg.position
+        s, st, tg = pos["side"], pos["stop"], pos["target"]
+        o, h, lo = bar["open"], bar["high"], bar["low"]
+        hit_stop = lo <= st if s > 0 else h >= st
+        hit_target = h >= tg if s > 0 else lo <= tg
+        if not (hit_stop or hit_target):
+            return
+        if hit_stop and hit_target:
+            use_stop = abs(o - st) <= abs(tg - o) if self.both_hit == "open" else self.both_hit == "stop"
+        else:
+            use_stop = hit_stop
+        if use_stop:
+            level = o if (o < st if s > 0 else o > st) else st
+            self._close(leg, bar, level - s * leg.strategy.slippage, "stop")
+        else:
+            level = o if (o > tg if s > 0 else o < tg) else tg
+            self._close(leg, bar, level, "target")
+
+    def _close(self, leg, bar, exit_price, reason):
+        pos = leg.position
+        pnl = ((exit_price - pos["entry"]) * pos["side"] - leg.strategy.fee_ticks) * leg.tick_value * pos["size"]
+        self.cash += pnl
+        leg.position = None
+        trade = {
+            "leg": leg.name, "side": "buy" if pos["side"] > 0 else "sell", "time": pos["time"],
+            "entry": pos["entry"], "stop": pos["stop"], "target": pos["target"], "size": pos["size"],
+            "exit_time": bar["time"], "exit_price": exit_price, "exit_reason": reason,
+            "holding_bars": leg.bar_index - pos["bar_index"], "pnl": pnl, "equity": self.cash,
+        }
+        self.trades.append(trade)
+        if self.curve == "trade":
+            self.equity_curve.append((bar["time"], self.cash))
+
+    def _open(self, leg, bar, sig):
+        if leg.position is not None:
+            self.rejected["in_position"] += 1
+            return
+        stop_ticks = sig["stop_ticks"]
+        size = self.size_for(leg, sig["price"], stop_ticks)
+        if size <= 0:
+            return
+        s = 1 if sig["side"] == "buy" else -1
+        entry = sig["price"] + s * leg.strategy.slippage
+        rr = leg.strategy.rr
+        leg.position = {"side": s, "entry": entry, "stop": entry - s * stop_ticks,
+                        "target": entry + s * rr * stop_ticks, "size": size,
+                        "time": bar["time"], "bar_index": leg.bar_index}
+
+    def on_bar(self, i, bar):
+        leg = self.legs[i]
+        leg.bar_index += 1
+        leg.last_close = bar["close"]
+        if leg.position is not None:
+            self._check_exit(leg, bar)
+        sig = leg.strategy.on_kbar(bar)
+        if sig:
+            self._open(leg, bar, sig)
+        equity = self.equity()
+        if equity > self.peak:
+            self.peak = equity
+        elif self.peak - equity > self.max_drawdown:
+            self.max_drawdown = self.peak - equity
+        if self.curve == "bar":
+            self.equity_curve.append((bar["time"], equity))
+        self.bars_processed += 1
+
+    def run(self):
+        last = {}
+        for i, bar in merge_bars(self.legs):
+            self.on_bar(i, bar)
+            last[i] = bar
+        # 資料結束仍有部位：以各 leg 最後一根 close 市價出場
+        for i, leg in enumerate(self.legs):
+            if leg.position is not None:
+                bar = last[i]
+                self._close(leg, bar, bar["close"] - leg.position["side"] * leg.strategy.slippage, "eod")
+        return self.trades
+
+    def summary(self) -> dict:
+        by_leg = {}
+        for t in self.trades:
+            d = by_leg.setdefault(t["leg"], {"trades": 0, "pnl": 0.0})
+            d["trades"] += 1
+            d["pnl"] += t["pnl"]
+        wins = sum(1 for t in self.trades if t["pnl"] > 0)
+        return {
+            "bars": self.bars_processed,
+            "trades": len(self.trades),
+            "initial_capital": self.initial_capital,
+            "final_equity": self.cash,
+            "return_pct": (self.cash / self.initial_capital - 1) * 100,
+            "max_drawdown": self.max_drawdown,
+            "win_rate": wins / len(self.trades) if self.trades else 0.0,
+            "rejected": dict(self.rejected),
+            "legs": by_leg,
+        }
+
+def legs_from_config(cfg, leg_args, start=None, end=None, root="data/kbars_3tick"):
+    """leg_args：["TMF:TMF202512", ...]（名稱:合約）；cfg["portfolio"]["legs"][名稱] 可覆寫 tick_value / margin / max_contracts。"""
+    specs = cfg.get("portfolio", {}).get("legs", {})
+    legs = []
+    for arg in leg_args:
+        name, _, contract = arg.partition(":")
+        spec = specs.get(name, {})
+        strategy = ThreeTickStrategy(fee_ticks=cfg.get("fee_ticks", 4), slippage=cfg.get("slippage_ticks", 0.5),
+                                     **cfg.get("strategy", {}))
+        legs.append(Leg(name, store_bars(root, contract or name, start, end), strategy,
+                        tick_value=spec.get("tick_value"), margin=spec.get("margin"),
+                        max_contracts=spec.get("max_contracts")))
+    return legs
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="多合約共用資金的投資組合回測")
+    ap.add_argument("--leg", action="append", default=[], help="名稱:合約，例 TMF:TMF202512（可重複）")
+    ap.add_argument("--kbars-root", default="data/kbars_3tick")
+    ap.add_argument("--start")
+    ap.add_argument("--end")
+    ap.add_argument("--synthetic", type=int, default=0, help="以 TMF / MXF / TXF 各 N 根合成 Kbar 測試")
+    ap.add_argument("--config", default="config/config.json")
+    ap.add_argument("--out", default="results/portfolio_trades.csv")
+    ap.add_argument("--registry", default="data/runs", help="回測結果登錄目錄")
+    ap.add_argument("--no-registry", action="store_true")
+    args = ap.parse_args(argv)
+
+    cfg = {}
+    if Path(args.config).exists():
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    pcfg = cfg.get("portfolio", {})
+    if args.synthetic:
+        from src.synthetic import iter_kbars
+        legs = [Leg(name, iter_kbars(args.synthetic, seed=i, start_price=p))
+                for i, (name, p) in enumerate((("TMF", 23000.0), ("MXF", 23000.0), ("TXF", 23000.0)))]
+    elif args.leg:
+        legs = legs_from_config(cfg, args.leg, args.start, args.end, args.kbars_root)
+    else:
+        ap.error("需指定 --leg 或 --synthetic")
+    pf = Portfolio(legs, capital=pcfg.get("initial_capital", cfg.get("backtest", {}).get("initial_capital", 1_000_000)),
+                   risk_pct=pcfg.get("risk_per_trade_pct", cfg.get("backtest", {}).get("risk_per_trade_pct", 0.5)),
+                   max_margin_pct=pcfg.get("max_margin_pct", 0.5), max_leverage=pcfg.get("max_leverage"),
+                   both_hit=cfg.get("backtest", {}).get("both_hit", "stop"))
+    trades = pf.run()
+    for k, v in pf.summary().items():
+        print(f"{k:>16}: {v:,.2f}" if isinstance(v, float) else f"{k:>16}: {v}")
+    if trades:
+        from src.storage import write_frame
+        import pandas as pd
+        out = write_frame(pd.DataFrame(trades, columns=PORTFOLIO_TRADE_FIELDS), args.out, fmt="csv")
+        print(f"交易明細已儲存: {out}")
+    if not args.no_registry:
+        from src.runs import RunRegistry
+        run_id = RunRegistry(args.registry).record(
+            trades, cfg, name="+".join(leg.name for leg in legs), kind="portfolio",
+            capital=pf.initial_capital, equity=pf.equity_curve, fields=PORTFOLIO_TRADE_FIELDS)
+        print(f"已登錄回測結果: {run_id}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
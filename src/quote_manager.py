@@ -1,41 +1,245 @@
-from collections import deque
-import pandas as pd
+BAR_TYPES = ("tick", "time", "volume")
+_TIME_UNITS = {"s": 1, "m": 60, "h": 3600}
+_EPOCH_ORDINAL = 719163   # date(1970, 1, 1).toordinal()
+
+def parse_bar_spec(spec):
+    """
+    "3t" / "10t" -> ("tick", 3)；"100v" -> ("volume", 100)；"30s" / "1m" / "1h" -> ("time", 秒數)。
+    ("tick", 3) 這類 tuple 原樣回傳。
+    """
+    if isinstance(spec, tuple):
+        bar_type, size = spec
+    else:
+        text = str(spec).strip().lower()
+        unit, num = text[-1], text[:-1]
+        if unit == "t":
+            bar_type, size = "tick", int(num)
+        elif unit == "v":
+            bar_type, size = "volume", int(num)
+        elif unit in _TIME_UNITS:
+            bar_type, size = "time", int(num) * _TIME_UNITS[unit]
+        else:
+            raise ValueError(f"unknown bar spec: {spec!r}（例：3t / 100v / 30s / 1m / 1h）")
+    if bar_type not in BAR_TYPES or size <= 0:
+        raise ValueError(f"invalid bar spec: {spec!r}")
+    return bar_type, size
+
+def plan_series(series, rollup=True):
+    """
+    series：["3t", "12t", "1m", "5m"] 或 {名稱: spec}。
+    回傳依處理順序排列的 [(名稱, bar_type, size, 來源名稱或 None), ...]：
+    rollup=True 時，tick / time 序列由同類型、週期可整除的最大較小序列組成（例：12t <- 3t、5m <- 1m）；
+    volume bar 因最後一筆可能超過門檻，一律由 tick 直接聚合。
+    """
+    items = series.items() if isinstance(series, dict) else ((str(s), s) for s in series)
+    parsed = [(name, *parse_bar_spec(spec)) for name, spec in items]
+    parsed.sort(key=lambda x: (BAR_TYPES.index(x[1]), x[2]))
+    plan = []
+    for name, bar_type, size in parsed:
+        source = None
+        if rollup and bar_type != "volume":
+            for other, t, s, _ in plan:
+                if t == bar_type and s < size and size % s == 0:
+                    source = other
+        plan.append((name, bar_type, size, source))
+    return plan
+
+class BarAggregator:
+    """
+    逐筆更新的 OHLCV 聚合器（__slots__，收到 tick 時直接更新欄位，不保留 tick、不建立中間 list）。
+    bar_type：
+    - "tick"：每 size 筆 tick 一根
+    - "time"：每 size 秒一根（以牆上時間切齊，例如 60 -> 每分鐘整點）；
+      區間內第一筆 tick 開新 bar，下一個區間的 tick 到達時輸出前一根
+    - "volume"：累積成交量達 size 時輸出（不拆分單筆 tick，最後一筆可能超過門檻）
+    輸出 dict：time（最後一筆 tick 時間）/open/high/low/close/volume/ticks
+    """
+    __slots__ = ("bar_type", "size", "count", "open", "high", "low", "close", "volume", "time", "_key")
+
+    def __init__(self, bar_type="tick", size=3):
+        if bar_type not in BAR_TYPES:
+            raise ValueError(f"bar_type must be one of {BAR_TYPES}")
+        if size <= 0:
+            raise ValueError("size must be positive")
+        self.bar_type = bar_type
+        self.size = size
+        self.count = 0
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = 0
+        self.time = None
+        self._key = None
+
+    def _emit(self):
+        bar = {"time": self.time, "open": self.open, "high": self.high, "low": self.low,
+               "close": self.close, "volume": self.volume, "ticks": self.count}
+        self.count = 0
+        self.volume = 0
+        return bar
+
+    def _time_key(self, time):
+        return ((time.toordinal() - _EPOCH_ORDINAL) * 86400
+                + time.hour * 3600 + time.minute * 60 + time.second) // self.size
+
+    def update(self, time, price, volume=0):
+        """加入一筆 tick；完成一根 bar 時回傳該 bar dict，否則回傳 None。"""
+        bar = None
+        if self.bar_type == "time":
+            key = self._time_key(time)
+            if self.count and key != self._key:
+                bar = self._emit()
+            self._key = key
+        if self.count == 0:
+            self.open = self.high = self.low = price
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.time = time
+        self.count += 1
+        if self.bar_type == "tick":
+            if self.count >= self.size:
+                bar = self._emit()
+        elif self.bar_type == "volume":
+            if self.volume >= self.size:
+                bar = self._emit()
+        return bar
+
+    def merge(self, bar):
+        """併入一根較小週期的 bar（階層式 rollup）；完成一根時回傳 bar dict。"""
+        out = None
+        if self.bar_type == "time":
+            key = self._time_key(bar["time"])
+            if self.count and key != self._key:
+                out = self._emit()
+            self._key = key
+        if self.count == 0:
+            self.open, self.high, self.low = bar["open"], bar["high"], bar["low"]
+        else:
+            if bar["high"] > self.high:
+                self.high = bar["high"]
+            if bar["low"] < self.low:
+                self.low = bar["low"]
+        self.close = bar["close"]
+        self.volume += bar["volume"]
+        self.time = bar["time"]
+        self.count += bar["ticks"]
+        if self.bar_type == "tick":
+            if self.count >= self.size:
+                out = self._emit()
+        elif self.bar_type == "volume":
+            if self.volume >= self.size:
+                out = self._emit()
+        return out
+
+    def roll(self, time):
+        """time bar：time 已進入下一個區間時輸出目前的 bar（rollup 時由較小序列驅動）。"""
+        if self.bar_type == "time" and self.count and self._time_key(time) != self._key:
+            return self._emit()
+        return None
+
+    def flush(self):
+        """輸出尚未完成的 bar（收盤或停止時使用）；沒有資料時回傳 None。"""
+        return self._emit() if self.count else None
+
+    @property
+    def pending(self) -> int:
+        """目前 bar 已累積的 tick 數。"""
+        return self.count
 
 class QuoteManager:
     """
-    將 tick 聚合為 3-tick Kbar。
-    使用簡單緩衝：每收到一筆 tick（價格、volume），累積到 3 筆後輸出一根 Kbar。
+    將 tick 聚合為 Kbar（預設 3-tick）。
+    每筆 tick 直接更新 BarAggregator 的 OHLCV，湊滿一根即輸出；bar_type 可改為 "time" / "volume"。
     提供 callback 機制讓 strategy 接收 kbar。
     """
-    def __init__(self, on_kbar_callback=None, ticks_per_kbar=3):
+    def __init__(self, on_kbar_callback=None, ticks_per_kbar=3, bar_type="tick", bar_size=None):
         self.ticks_per_kbar = ticks_per_kbar
-        self.buffer = deque()
+        self.aggregator = BarAggregator(bar_type, bar_size if bar_size is not None else ticks_per_kbar)
         self.on_kbar = on_kbar_callback
 
     def on_tick(self, tick):
         """
         tick: dict-like with keys: 'time','price','volume'
         """
-        self.buffer.append(tick)
-        if len(self.buffer) >= self.ticks_per_kbar:
-            k = self._build_kbar(list(self.buffer)[:self.ticks_per_kbar])
-            for _ in range(self.ticks_per_kbar):
-                self.buffer.popleft()
-            if self.on_kbar:
-                self.on_kbar(k)
-            return k
-        return None
+        k = self.aggregator.update(tick["time"], tick["price"], tick.get("volume", 0))
+        if k is not None and self.on_kbar:
+            self.on_kbar(k)
+        return k
+
+    def flush(self):
+        """輸出未完成的 Kbar（例如 time bar 在收盤時）。"""
+        k = self.aggregator.flush()
+        if k is not None and self.on_kbar:
+            self.on_kbar(k)
+        return k
+
+class MultiBarAggregator:
+    """
+    單一 tick 流同時聚合多個週期（例：3t / 10t / 1m / 5m），每筆 tick 只走訪一次。
+    較大週期由較小週期的完成 bar 組成（plan_series 的 rollup 規則），結果與各自獨立聚合相同。
+    on(name, callback) 註冊個別序列的 callback；on_bar(name, bar) 接收所有序列。
+    """
+    def __init__(self, series, on_bar=None, rollup=True):
+        self.plan = plan_series(series, rollup)
+        self.names = [name for name, _, _, _ in self.plan]
+        self.aggregators = {name: BarAggregator(t, s) for name, t, s, _ in self.plan}
+        self._aggs = [self.aggregators[name] for name in self.names]
+        self._sources = [-1 if src is None else self.names.index(src) for _, _, _, src in self.plan]
+        self._last = [None] * len(self.plan)
+        self._callbacks = {name: [] for name in self.names}
+        self.on_bar = on_bar
+
+    def on(self, name, callback):
+        self._callbacks[name].append(callback)
+        return self
+
+    def _dispatch(self, name, bar):
+        for cb in self._callbacks[name]:
+            cb(bar)
+        if self.on_bar:
+            self.on_bar(name, bar)
+
+    def update(self, time, price, volume=0):
+        """加入一筆 tick；回傳本筆完成的 [(名稱, bar), ...]（多數 tick 為空 tuple）。"""
+        out = ()
+        last = self._last
+        for i, agg in enumerate(self._aggs):
+            src = self._sources[i]
+            if src < 0:
+                bar = agg.update(time, price, volume)
+            elif last[src] is not None:
+                bar = agg.merge(last[src])
+                if bar is None:
+                    bar = agg.roll(time)
+            else:
+                bar = None
+            last[i] = bar
+            if bar is not None:
+                if not out:
+                    out = []
+                out.append((self.names[i], bar))
+                self._dispatch(self.names[i], bar)
+        return out
+
+    def on_tick(self, tick):
+        return self.update(tick["time"], tick["price"], tick.get("volume", 0))
 
-    def _build_kbar(self, ticks):
-        times = [t["time"] for t in ticks]
-        prices = [t["price"] for t in ticks]
-        vols = [t.get("volume", 0) for t in ticks]
-        kbar = {
-            "time": times[-1],
-            "open": prices[0],
-            "high": max(prices),
-            "low": min(prices),
-            "close": prices[-1],
-            "volume": sum(vols)
-        }
-        return kbar
+    def flush(self):
+        """輸出各序列未完成的 bar（較小序列的殘餘先併入較大序列）。"""
+        out = []
+        last = self._last
+        for i, agg in enumerate(self._aggs):
+            src = self._sources[i]
+            if src >= 0 and last[src] is not None:
+                done = agg.merge(last[src])
+                if done is not None:
+                    out.append((self.names[i], done))
+                    self._dispatch(self.names[i], done)
+            bar = agg.flush()
+            last[i] = bar
+            if bar is not None:
+                out.append((self.names[i], bar))
+                self._dispatch(self.names[i], bar)
+        return out
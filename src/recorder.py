@@ -22,3 +22,180 @@ class TickRecorder:
         if self._file:
             self._file.close()
             self._file = None
+
+class BufferedRecorder:
+    """
+    批次寫入的 tick / trade 記錄器。
+    - record / record_trade 只把欄位值附加到記憶體中的欄式緩衝（dict of lists），不做 I/O
+    - 背景執行緒在緩衝達 batch_size 筆或每 flush_interval 秒時交換緩衝並寫檔，寫檔時不持有鎖
+    - 依交易日輪替檔案：<directory>/ticks_<YYYY-MM-DD>.<ext>、<directory>/trades_<YYYY-MM-DD>.<ext>
+      （15:00 後的夜盤歸屬下一個交易日，週五夜盤歸屬下週一）
+    - close() 會停止背景執行緒、寫出剩餘資料並 fsync；程式結束時也會自動呼叫
+    fmt 預設 csv（每批直接附加，中途當機也保有已寫入的資料）；parquet 需等檔案關閉才完整。
+    欄式格式以固定的 TICK_SCHEMA / TRADE_SCHEMA 寫入（不由第一批推斷）；某一批寫入失敗時改附加到
+    同日的 <kind>_<day>.spill.csv，連 csv 也寫不進去時放回緩衝，下次 flush 重試，不丟資料。
+    """
+    TICK_SCHEMA = (("time", "timestamp[ns]"), ("price", "double"), ("volume", "int64"),
+                   ("bid", "double"), ("ask", "double"))
+    TRADE_SCHEMA = (("time", "timestamp[ns]"), ("order_id", "string"), ("side", "string"), ("kind", "string"),
+                    ("price", "double"), ("size", "int64"), ("status", "string"))
+    TICK_COLUMNS = tuple(name for name, _ in TICK_SCHEMA)
+    TRADE_COLUMNS = tuple(name for name, _ in TRADE_SCHEMA)
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+    def __init__(self, directory: str = 'records', batch_size: int = 5000, flush_interval: float = 1.0,
+                 fmt: str = 'csv'):
+        import atexit
+        import threading
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._buffers = {"ticks": self._new_buffer(self.TICK_COLUMNS),
+                         "trades": self._new_buffer(self.TRADE_COLUMNS)}
+        self._appenders = {}
+        self._written = set()
+        self.flushed_rows = {"ticks": 0, "trades": 0}
+        self.flush_count = 0
+        self._thread = threading.Thread(target=self._run, name="recorder-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _new_buffer(columns):
+        return {c: [] for c in columns}
+
+    def _append(self, kind, row: dict):
+        with self._lock:
+            buf = self._buffers[kind]
+            for c, values in buf.items():
+                values.append(row.get(c))
+            n = len(buf["time"])
+        if n >= self.batch_size:
+            self._wake.set()
+
+    def record(self, tick: dict):
+        self._append("ticks", tick)
+
+    def record_trade(self, trade: dict):
+        if trade.get("time") is None:
+            from datetime import datetime
+            trade = dict(trade, time=datetime.now())
+        self._append("trades", trade)
+
+    @staticmethod
+    def trading_days(times):
+        """夜盤（15:00 起）歸屬下一個交易日；週五夜盤歸屬下週一。回傳當日 00:00 的 Timestamp Series。"""
+        import pandas as pd
+        day = times.dt.normalize() + pd.to_timedelta((times.dt.hour >= 15).astype(int), unit="D")
+        return day + pd.to_timedelta((day.dt.weekday == 5).astype(int) * 2, unit="D")
+
+    def _swap(self):
+        with self._lock:
+            out = self._buffers
+            self._buffers = {"ticks": self._new_buffer(self.TICK_COLUMNS),
+                             "trades": self._new_buffer(self.TRADE_COLUMNS)}
+        return out
+
+    def flush(self):
+        """寫出目前緩衝內的所有資料（背景執行緒定期呼叫，也可手動呼叫）。"""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        import pandas as pd
+        failed = None
+        for kind, buf in self._swap().items():
+            if not buf["time"]:
+                continue
+            df = pd.DataFrame(buf)
+            df["time"] = pd.to_datetime(df["time"])
+            for day, part in df.groupby(self.trading_days(df["time"]), sort=True):
+                part = part.reset_index(drop=True)
+                try:
+                    self._write(kind, day.strftime("%Y-%m-%d"), part)
+                except Exception as e:
+                    # 連 spill 也失敗：放回緩衝（排在新資料之前），下次 flush 重試
+                    self._restore(kind, part)
+                    failed = failed or e
+                    continue
+                self.flushed_rows[kind] += len(part)
+        self.flush_count += 1
+        if failed is not None:
+            raise failed
+
+    def _write(self, kind, day, part):
+        key = (kind, day)
+        if key not in self._appenders:
+            # 換日：關閉同類型其他日期的檔案（含 spill）；同日的 spill 保留
+            for old in [k for k in self._appenders if k[0] == kind and k[-1] != day]:
+                self._appenders.pop(old).close()
+            self._appenders[key] = self._open(kind, day)
+        try:
+            self._appenders[key].append(part)
+        except Exception as e:
+            if self.fmt == 'csv':
+                raise
+            print(f'[ERROR] recorder {kind} {day} 寫入 {self.fmt} 失敗，改寫入 spill csv:', e)
+            self._spill(kind, day, part)
+
+    def _spill(self, kind, day, part):
+        from src.storage import FrameAppender
+        key = (kind, "spill", day)
+        if key not in self._appenders:
+            path = self.directory / f"{kind}_{day}.spill.csv"
+            self._appenders[key] = FrameAppender(path, fmt='csv', date_format=self.DATE_FORMAT, resume=True)
+            self._written.add(self._appenders[key].path)
+        self._appenders[key].append(part)
+
+    def _restore(self, kind, part):
+        with self._lock:
+            buf = self._buffers[kind]
+            for c, values in buf.items():
+                col = part[c].tolist() if c in part else [None] * len(part)
+                values[:0] = col
+
+    def _open(self, kind, day):
+        from src.storage import FrameAppender
+        path = self.directory / f"{kind}_{day}.{self.fmt}"
+        if self.fmt != 'csv':
+            # 欄式檔案無法接續附加：同一天重啟時另開新檔
+            n = 1
+            while path.exists():
+                path = self.directory / f"{kind}_{day}_{n}.{self.fmt}"
+                n += 1
+        schema = self.TICK_SCHEMA if kind == "ticks" else self.TRADE_SCHEMA
+        app = FrameAppender(path, fmt=self.fmt, date_format=self.DATE_FORMAT, resume=True, schema=schema)
+        self._written.add(app.path)
+        return app
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print('[ERROR] recorder flush failed:', e)
+
+    def close(self):
+        """停止背景執行緒，寫出剩餘資料、關閉檔案並 fsync。可重複呼叫。"""
+        import os
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        for app in self._appenders.values():
+            app.close()
+        self._appenders.clear()
+        for p in self._written:
+            if p.exists():
+                with open(p, 'rb+') as f:
+                    os.fsync(f.fileno())
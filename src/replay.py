@@ -0,0 +1,267 @@
+# src/replay.py
+"""
+逐筆重播回測：以 data/raw_ticks 的逐筆資料，依實盤相同路徑驅動
+    tick -> TickEngine.on_tick -> QuoteManager -> ThreeTickStrategy.on_kbar -> 下單
+下單交給 FillModel 模擬成交，成交時呼叫 TickEngine.on_order_filled（更新部位、記錄成交）。
+與 Backtester 的差異：
+- 同一時間只持有一個部位（有部位時的訊號略過），Backtester 的每個訊號各自成交
+- 停損 / 目標以逐筆判定：先觸及者先出場，不需要同根同時觸及的 both_hit 規則
+熱路徑不做 I/O：成交只寫入記憶體（FillLog），engine 不掛 tick_recorder。
+用法（於專案根目錄）：
+    python -m src.replay --contract TMF202512 --start 2025-11-24 --end 2025-11-28
+    python -m src.replay --raw data/raw_ticks/TMF202512/2025-11-26.parquet --latency-ticks 1
+    python -m src.replay --synthetic 200000
+    python -m src.replay --archive data/tick_archive --contract TMF202512 --start 2025-11-24 --end 2025-11-28
+"""
+import argparse
+import itertools
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import TRADE_FIELDS, vectorized_trades
+from src.engine import StrategyState, TickEngine
+from src.quote_manager import QuoteManager
+from src.storage import PartitionedStore, write_frame
+from src.strategy import ThreeTickStrategy
+from src.utils import calc_position_size
+
+class FillLog:
+    """記憶體版 TradeLogger：只保存成交回報，不列印、不寫檔。"""
+    def __init__(self):
+        self.fills = []
+
+    def log_trade(self, trade: dict):
+        self.fills.append(trade)
+
+class FillModel:
+    """
+    模擬交易所成交。
+    - 進場：市價單，latency_ticks=0 時以訊號 Kbar 的 close 成交（同 Backtester），
+      否則以訊號後第 latency_ticks 筆 tick 的價格成交；皆加計 slippage
+    - 停損：逐筆價格觸及後以該筆價格市價出場（扣 slippage）
+    - 目標：限價單，以目標價成交
+    - finish()：重播結束仍有部位時以最後一筆價格市價出場（eod）
+    """
+    def __init__(self, engine: TickEngine, rr=1.8, fee_ticks=4, slippage=0.5, tick_value=10,
+                 latency_ticks=0):
+        self.engine = engine
+        self.rr = rr
+        self.fee_ticks = fee_ticks
+        self.slippage = slippage
+        self.tick_value = tick_value
+        self.latency_ticks = latency_ticks
+        self.trades = []
+        self.pending = None
+        self.open = None
+        self._countdown = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def busy(self) -> bool:
+        return self.pending is not None or self.open is not None
+
+    def submit(self, signal: dict, size: int, bar_time, bar_index: int):
+        order = {"side": 1 if signal["side"] == "buy" else -1, "stop_ticks": signal["stop_ticks"],
+                 "size": size, "time": bar_time, "bar": bar_index, "order_id": f"R{next(self._ids)}"}
+        if self.latency_ticks <= 0:
+            self._fill_entry(order, signal["price"], bar_time)
+        else:
+            self.pending = order
+            self._countdown = self.latency_ticks
+
+    def on_tick(self, t, price, bar_index):
+        if self.open is not None:
+            tr = self.open
+            s = tr["_side"]
+            if (price <= tr["stop"]) if s > 0 else (price >= tr["stop"]):
+                self._fill_exit(price - s * self.slippage, "stop", t, bar_index)
+            elif (price >= tr["target"]) if s > 0 else (price <= tr["target"]):
+                self._fill_exit(tr["target"], "target", t, bar_index)
+        elif self.pending is not None:
+            self._countdown -= 1
+            if self._countdown <= 0:
+                order, self.pending = self.pending, None
+                self._fill_entry(order, price, t)
+
+    def finish(self, t, price, bar_index):
+        self.pending = None
+        if self.open is not None:
+            self._fill_exit(price - self.open["_side"] * self.slippage, "eod", t, bar_index)
+
+    def _report(self, order_id, side, kind, price, size, t):
+        self.engine.on_order_filled({"time": t, "order_id": order_id, "side": "buy" if side > 0 else "sell",
+                                     "kind": kind, "price": price, "size": size, "status": "filled"})
+
+    def _fill_entry(self, order, price, t):
+        s = order["side"]
+        stop = order["stop_ticks"]
+        entry = price + s * self.slippage
+        self.open = {
+            "side": "buy" if s > 0 else "sell", "time": order["time"], "entry": entry,
+            "stop": entry - s * stop, "target": entry + s * self.rr * stop, "size": order["size"],
+            "_side": s, "_bar": order["bar"], "_id": order["order_id"],
+        }
+        self._report(order["order_id"], s, "entry", entry, order["size"], t)
+
+    def _fill_exit(self, exit_price, reason, t, bar_index):
+        tr, self.open = self.open, None
+        s = tr.pop("_side")
+        tr.update({
+            "exit_time": t, "exit_price": exit_price, "exit_reason": reason,
+            "holding_bars": bar_index - tr.pop("_bar"),
+            "pnl": ((exit_price - tr["entry"]) * s - self.fee_ticks) * self.tick_value * tr["size"],
+        })
+        self._report(tr.pop("_id"), -s, reason, exit_price, tr["size"], t)
+        self.trades.append(tr)
+
+class ReplayBacktester:
+    """
+    config：同 Backtester（fee_ticks / slippage_ticks / backtest.initial_capital / risk_per_trade_pct / strategy）。
+    engine 未指定時建立不掛記錄器的 TickEngine，成交寫入 FillLog。
+    run(ticks) 回傳交易 DataFrame（TRADE_FIELDS）；之後 self.bars 為重播產生的 Kbar，
+    divergence() 以同一組 Kbar 跑 vectorized_trades 並比較差異。
+    """
+    def __init__(self, config, ticks_per_kbar=3, latency_ticks=0, engine: TickEngine = None):
+        self.config = config
+        bt = config.get("backtest", {})
+        self.capital = bt.get("initial_capital", 1_000_000)
+        self.risk_pct = bt.get("risk_per_trade_pct", 0.5)
+        self.both_hit = bt.get("both_hit", "stop")
+        self.tick_value = 10
+        self.strategy = ThreeTickStrategy(fee_ticks=config.get("fee_ticks", 4),
+                                          slippage=config.get("slippage_ticks", 0.5),
+                                          **config.get("strategy", {}))
+        self.quote_manager = QuoteManager(ticks_per_kbar=ticks_per_kbar)
+        self.engine = engine or TickEngine(StrategyState(), config.get("bias", "auto"), {}, trade_logger=FillLog())
+        self.fills = FillModel(self.engine, rr=self.strategy.rr, fee_ticks=self.strategy.fee_ticks,
+                               slippage=self.strategy.slippage, tick_value=self.tick_value,
+                               latency_ticks=latency_ticks)
+        self.bars = pd.DataFrame()
+        self.ticks_replayed = 0
+
+    def run(self, ticks) -> pd.DataFrame:
+        """ticks：逐筆 DataFrame，或欄位 mapping（如 TickArchive.columns 的 memmap view，不先組 DataFrame）。"""
+        # 先整欄轉成 Python 物件，迴圈內只做實盤也會做的事
+        times = np.asarray(pd.to_datetime(ticks["time"])).astype("datetime64[us]").tolist()
+        prices = np.asarray(ticks["price"], dtype=float).tolist()
+        if "volume" in ticks:
+            volumes = np.asarray(ticks["volume"]).astype(np.int64).tolist()
+        else:
+            volumes = [0] * len(prices)
+        engine_on_tick = self.engine.on_tick
+        qm_on_tick = self.quote_manager.on_tick
+        on_kbar = self.strategy.on_kbar
+        fills = self.fills
+        state = self.engine.state
+        bars = []
+        for t, p, v in zip(times, prices, volumes):
+            n_bars = len(bars)
+            if fills.busy:
+                fills.on_tick(t, p, n_bars)
+            tick = {"time": t, "price": p, "volume": v}
+            engine_on_tick(tick)
+            kbar = qm_on_tick(tick)
+            if kbar is None:
+                continue
+            bars.append(kbar)
+            sig = on_kbar(kbar)
+            if sig and state.position == 0 and not fills.busy:
+                size = calc_position_size(self.capital, self.risk_pct, sig["stop_ticks"], tick_value=self.tick_value)
+                if size > 0:
+                    fills.submit(sig, size, kbar["time"], n_bars)
+        if times:
+            fills.finish(times[-1], prices[-1], max(len(bars) - 1, 0))
+        self.ticks_replayed = len(times)
+        self.bars = pd.DataFrame(bars, columns=["time", "open", "high", "low", "close", "volume"])
+        return pd.DataFrame(fills.trades, columns=TRADE_FIELDS)
+
+    def vectorized(self) -> pd.DataFrame:
+        """以重播產生的同一組 Kbar 執行 vectorized_trades。"""
+        return vectorized_trades(self.bars, self.strategy, self.capital, self.risk_pct,
+                                 tick_value=self.tick_value, both_hit=self.both_hit)
+
+    def divergence(self, trades: pd.DataFrame = None) -> dict:
+        trades = pd.DataFrame(self.fills.trades, columns=TRADE_FIELDS) if trades is None else trades
+        return divergence_report(trades, self.vectorized())
+
+def divergence_report(replay: pd.DataFrame, vector: pd.DataFrame) -> dict:
+    """
+    以訊號 Kbar 時間與方向配對兩邊的交易：
+    - vectorized_only：重播時因已有部位而略過的訊號
+    - exit_reason_mismatch / exit_price_mae：配對交易的出場原因不同筆數、出場價平均絕對差
+    - matched_pnl_diff：配對交易的損益差（重播 - 向量化）
+    """
+    keys = ["time", "side"]
+    m = replay.merge(vector, on=keys, how="outer", suffixes=("_replay", "_vector"), indicator=True)
+    both = m[m["_merge"] == "both"]
+    return {
+        "replay_trades": len(replay),
+        "vectorized_trades": len(vector),
+        "matched": len(both),
+        "replay_only": int((m["_merge"] == "left_only").sum()),
+        "vectorized_only": int((m["_merge"] == "right_only").sum()),
+        "entry_price_mae": float((both["entry_replay"] - both["entry_vector"]).abs().mean()) if len(both) else 0.0,
+        "exit_reason_mismatch": int((both["exit_reason_replay"] != both["exit_reason_vector"]).sum()),
+        "exit_price_mae": float((both["exit_price_replay"] - both["exit_price_vector"]).abs().mean())
+        if len(both) else 0.0,
+        "replay_pnl": float(replay["pnl"].sum()) if len(replay) else 0.0,
+        "vectorized_pnl": float(vector["pnl"].sum()) if len(vector) else 0.0,
+        "matched_pnl_diff": float((both["pnl_replay"] - both["pnl_vector"]).sum()) if len(both) else 0.0,
+    }
+
+def load_ticks(args):
+    if args.synthetic:
+        from src.synthetic import ticks_frame
+        return ticks_frame(args.synthetic, seed=11)
+    # 與 Kbar 轉檔相同的品質清理（去重 / 異常價），重播的 Kbar 才會與回測的 Kbar 一致；archive 建立時已清理
+    from src import tick_quality
+    quality = None if args.no_quality else tick_quality.DEFAULTS
+    if args.raw:
+        return tick_quality.load_clean(args.raw, quality)
+    if args.archive:
+        from src.tick_archive import TickArchive
+        return TickArchive(args.archive).columns(args.contract, args.start, args.end)
+    return tick_quality.read_clean(PartitionedStore("data/raw_ticks"), args.contract, args.start, args.end, quality)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="逐筆重播回測（實盤路徑）與向量化回測差異報告")
+    src = ap.add_argument_group("資料來源（擇一）")
+    src.add_argument("--raw", help="單一逐筆檔")
+    src.add_argument("--contract", help="data/raw_ticks 的合約代碼（搭配 --start/--end）")
+    src.add_argument("--start")
+    src.add_argument("--end")
+    src.add_argument("--synthetic", type=int, default=0, help="使用 N 筆合成逐筆")
+    src.add_argument("--archive", help="改由 tick archive 目錄（src/tick_archive.py）讀取 --contract 的逐筆")
+    src.add_argument("--no-quality", action="store_true", help="使用未清理的原始逐筆（與 Kbar 轉檔的資料不同）")
+    ap.add_argument("--config", default="config/config.json")
+    ap.add_argument("--ticks-per-kbar", type=int, default=3)
+    ap.add_argument("--latency-ticks", type=int, default=0, help="進場延遲筆數，0 為以訊號 Kbar close 成交")
+    ap.add_argument("--out", default="results/replay_trades.csv")
+    args = ap.parse_args(argv)
+
+    cfg = {}
+    if Path(args.config).exists():
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    ticks = load_ticks(args)
+    if not len(ticks) or len(ticks["price"]) == 0:
+        print("沒有逐筆資料。")
+        return 1
+    rb = ReplayBacktester(cfg, ticks_per_kbar=args.ticks_per_kbar, latency_ticks=args.latency_ticks)
+    t0 = time.perf_counter()
+    trades = rb.run(ticks)
+    dt = time.perf_counter() - t0
+    print(f"重播 {rb.ticks_replayed} 筆 tick、{len(rb.bars)} 根 Kbar，{dt:.2f}s"
+          f"（{rb.ticks_replayed / dt:,.0f} ticks/s），交易 {len(trades)} 筆")
+    for k, v in rb.divergence(trades).items():
+        print(f"{k:>22}: {v:,.2f}" if isinstance(v, float) else f"{k:>22}: {v}")
+    out = write_frame(trades, args.out, fmt="csv")
+    print(f"交易明細已儲存: {out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,15 +1,51 @@
-from src.config_loader import load_config
-from src.backtest import Backtester
+import argparse
 import csv
+from pathlib import Path
 
-cfg = load_config()
-bt = Backtester(cfg, 'data/kbars_3tick/sample.csv')
-trades = bt.run()
-print('trades:', len(trades))
-
-with open('backtest_trades.csv','w', newline='', encoding='utf-8') as f:
-    w = csv.DictWriter(f, fieldnames=['side','entry','stop','target','size'])
-    w.writeheader()
-    for t in trades:
-        w.writerow(t)
-print('saved backtest_trades.csv')
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="以 Kbar 檔或分區資料集執行回測")
+    ap.add_argument("--kbars", default="data/kbars_3tick/sample.csv", help="單一 Kbar 檔")
+    ap.add_argument("--contract", help="改讀 data/kbars_3tick 分區資料集（搭配 --start/--end）")
+    ap.add_argument("--start")
+    ap.add_argument("--end")
+    ap.add_argument("--mode", choices=["event", "vectorized"], default=None, help="預設依 config")
+    ap.add_argument("--config", default="config/config.json")
+    ap.add_argument("--out", default="backtest_trades.csv")
+    ap.add_argument("--registry", default="data/runs", help="回測結果登錄目錄（交易 / 權益曲線 / 設定 + 索引）")
+    ap.add_argument("--no-registry", action="store_true", help="只寫 --out，不登錄")
+    ap.add_argument("--name", help="登錄名稱（預設為 Kbar 檔名或合約）")
+    args = ap.parse_args(argv)
+
+    from src.config_loader import load_config
+    from src.backtest import Backtester, TRADE_FIELDS
+    cfg = load_config(args.config)
+    if args.contract:
+        from src.storage import PartitionedStore
+        kbars = PartitionedStore("data/kbars_3tick").read(args.contract, args.start, args.end)
+    else:
+        kbars = args.kbars
+    bt = Backtester(cfg, kbars)
+    mode = args.mode or bt.mode
+    trades = bt.run(mode=mode)
+    # 登錄實際使用的模式：vectorized 允許部位重疊，交易與 event 模式不同，須能以 p_mode 區分
+    cfg = {**cfg, "backtest": {**cfg["backtest"], "mode": mode}}
+    print('trades:', len(trades))
+
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=TRADE_FIELDS)
+        w.writeheader()
+        for t in trades:
+            w.writerow(t)
+    print('saved', args.out)
+
+    if not args.no_registry:
+        from src.runs import RunRegistry, print_metrics
+        reg = RunRegistry(args.registry)
+        run_id = reg.record(trades, cfg, name=args.name or args.contract or Path(args.kbars).stem,
+                            fields=TRADE_FIELDS)
+        print_metrics(reg.config(run_id)["metrics"])
+        print('registered', run_id)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
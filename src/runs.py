@@ -0,0 +1,365 @@
+# src/runs.py
+"""
+回測結果登錄（run registry）與整欄計算的績效指標。
+每次回測一個目錄，交易與權益曲線存成欄式檔（parquet，未安裝 pyarrow 時 csv）：
+    data/runs/<run_id>/trades.parquet   交易明細（TRADE_FIELDS / PORTFOLIO_TRADE_FIELDS）
+    data/runs/<run_id>/equity.parquet   權益曲線：time / equity / drawdown
+    data/runs/<run_id>/run.json         設定、參數、指標
+    data/runs/_runs.parquet             索引：每個 run 一列（參數 p_* 與指標）
+    data/runs/_runs.jsonl               尚未併入索引的 run（record 只附加一行，累積 COMPACT_ROWS 列才改寫索引）
+查詢數千個 run 時只讀索引篩選 / 排序，再依 run_id 讀取需要的交易（可只讀部分欄位）。
+    python -m src.runs list --where "sharpe > 1 and trades >= 50" --sort sharpe --limit 20
+    python -m src.runs show <run_id>
+    python -m src.runs reindex
+"""
+import argparse
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.storage import DEFAULT_FORMAT, find_existing, parse_times, read_frame, write_frame
+
+DEFAULT_RUNS_ROOT = Path("data/runs")
+TRADING_DAYS = 252
+HOLD_QUANTILES = (0.5, 0.9)
+
+# ---------- 指標 ----------
+def _times(values) -> pd.Series:
+    s = pd.Series(values)
+    return s if pd.api.types.is_datetime64_any_dtype(s) else parse_times(s)
+
+def equity_curve(trades: pd.DataFrame, capital) -> pd.DataFrame:
+    """依出場時間累加損益：time / equity / drawdown（第一列為起始資金，時間為第一筆進場）。"""
+    if trades.empty:
+        return pd.DataFrame({"time": pd.Series([], dtype="datetime64[ns]"), "equity": [], "drawdown": []})
+    time = pd.concat([_times(trades["time"].iloc[:1]), _times(trades["exit_time"])], ignore_index=True)
+    equity = capital + np.concatenate([[0.0], np.cumsum(trades["pnl"].to_numpy(dtype=float))])
+    return pd.DataFrame({"time": time, "equity": equity,
+                         "drawdown": np.maximum.accumulate(equity) - equity})
+
+def curve_frame(points) -> pd.DataFrame:
+    """[(time, equity), ...]（如 Portfolio.equity_curve）-> time / equity / drawdown。"""
+    df = pd.DataFrame(points, columns=["time", "equity"])
+    equity = df["equity"].to_numpy(dtype=float)
+    df["drawdown"] = np.maximum.accumulate(equity) - equity if len(equity) else equity
+    return df
+
+def daily_pnl(trades: pd.DataFrame) -> np.ndarray:
+    """依出場日彙總損益；期間內沒有出場的營業日補 0（Sharpe 的分母要算進平盤日）。"""
+    exit_day = _times(trades["exit_time"]).dt.normalize().to_numpy(dtype="datetime64[D]")
+    first = _times(trades["time"]).min().normalize()
+    bdays = pd.bdate_range(first, pd.Timestamp(exit_day.max())).to_numpy(dtype="datetime64[D]")
+    days = np.union1d(bdays, exit_day)
+    return np.bincount(np.searchsorted(days, exit_day), weights=trades["pnl"].to_numpy(dtype=float),
+                       minlength=len(days))
+
+def run_metrics(trades: pd.DataFrame, capital=1_000_000, equity: pd.DataFrame = None) -> dict:
+    """
+    trades：交易 DataFrame（需 time / exit_time / pnl，holding_bars 可選）。
+    回傳 optimizer.trade_metrics 的指標，另加：
+    sharpe（日損益 / 起始資金，年化 √252）、max_drawdown_pct、avg_win / avg_loss、
+    持倉根數與持倉分鐘的平均 / 中位數 / p90 / 最大值。
+    equity：另外提供的權益曲線（如逐根權益）時，最大回撤以它計算。
+    """
+    from src.optimizer import trade_metrics
+    pnl = trades["pnl"].to_numpy(dtype=float) if len(trades) else np.zeros(0)
+    m = trade_metrics(pnl)
+    m.update({"sharpe": 0.0, "max_drawdown_pct": 0.0, "avg_win": 0.0, "avg_loss": 0.0,
+              "hold_bars_mean": 0.0, "hold_bars_p50": 0.0, "hold_bars_p90": 0.0, "hold_bars_max": 0.0,
+              "hold_minutes_p50": 0.0, "hold_minutes_p90": 0.0, "hold_minutes_max": 0.0,
+              "start": None, "end": None})
+    if not len(pnl):
+        return m
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    m["avg_win"] = float(wins.mean()) if len(wins) else 0.0
+    m["avg_loss"] = float(losses.mean()) if len(losses) else 0.0
+    daily = daily_pnl(trades) / capital
+    sd = daily.std(ddof=1) if len(daily) > 1 else 0.0
+    m["sharpe"] = float(daily.mean() / sd * np.sqrt(TRADING_DAYS)) if sd > 0 else 0.0
+    curve = equity if equity is not None and len(equity) else equity_curve(trades, capital)
+    eq = curve["equity"].to_numpy(dtype=float)
+    peak = np.maximum.accumulate(eq)
+    m["max_drawdown"] = max(m["max_drawdown"], float((peak - eq).max()))
+    m["max_drawdown_pct"] = float(((peak - eq) / peak).max() * 100)
+    if "holding_bars" in trades:
+        hb = trades["holding_bars"].to_numpy(dtype=float)
+        q = np.quantile(hb, HOLD_QUANTILES)
+        m.update(hold_bars_mean=float(hb.mean()), hold_bars_p50=float(q[0]), hold_bars_p90=float(q[1]),
+                 hold_bars_max=float(hb.max()))
+    entry, exit_ = _times(trades["time"]), _times(trades["exit_time"])
+    minutes = ((exit_ - entry).dt.total_seconds() / 60).to_numpy()
+    q = np.quantile(minutes, HOLD_QUANTILES)
+    m.update(hold_minutes_p50=float(q[0]), hold_minutes_p90=float(q[1]), hold_minutes_max=float(minutes.max()),
+             start=str(entry.min()), end=str(exit_.max()))
+    return m
+
+def duration_distribution(trades: pd.DataFrame, bins=(1, 2, 5, 10, 20, 50, 100, 200)) -> pd.DataFrame:
+    """持倉根數分佈：每個區間（[bins[i-1], bins[i])，最後一格含以上）的筆數、勝率與平均損益。"""
+    hb = trades["holding_bars"].to_numpy(dtype=float)
+    pnl = trades["pnl"].to_numpy(dtype=float)
+    edges = np.asarray(bins, dtype=float)
+    idx = np.searchsorted(edges, hb, side="right")
+    n = np.bincount(idx, minlength=len(edges) + 1)
+    wins = np.bincount(idx, weights=pnl > 0, minlength=len(edges) + 1)
+    total = np.bincount(idx, weights=pnl, minlength=len(edges) + 1)
+    labels = [f"<{int(edges[0])}"] + [f"{int(a)}-{int(b) - 1}" for a, b in zip(edges[:-1], edges[1:])] + \
+             [f">={int(edges[-1])}"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({"holding_bars": labels, "trades": n,
+                             "win_rate": np.where(n > 0, wins / n, 0.0),
+                             "avg_pnl": np.where(n > 0, total / n, 0.0)})
+
+# ---------- 登錄 ----------
+def _json_default(o):
+    """numpy 純量轉成 Python 值（其餘物件轉字串），數值在 json 中保持數值型態。"""
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+def normalize_params(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    p_* 欄各 run 的型態可能不同（例 strategy.rr 為 2.0 與 "x"），欄式檔無法混型態：
+    全為數值（含缺值）者轉 float64 / Int64，其餘整欄轉字串（缺值保持缺值）。
+    """
+    for col in [c for c in df.columns if c.startswith("p_")]:
+        s = df[col]
+        values = s.dropna()
+        if values.map(lambda v: isinstance(v, (bool, np.bool_))).all():
+            df[col] = s.astype("boolean") if len(values) else s
+        elif values.map(lambda v: isinstance(v, (int, float, np.integer, np.floating))
+                        and not isinstance(v, (bool, np.bool_))).all():
+            num = pd.to_numeric(s)
+            integral = values.map(lambda v: isinstance(v, (int, np.integer))).all()
+            df[col] = num.astype("Int64") if integral and len(values) else num.astype("float64")
+        else:
+            df[col] = s.map(lambda v: v if pd.isna(v) else str(v)).astype("string")
+    return df
+
+def _params(config: dict) -> dict:
+    """索引中可查詢的參數欄（p_ 前綴）：策略參數 + 成本 / 資金設定。"""
+    config = config or {}
+    bt = config.get("backtest", {})
+    out = {f"p_{k}": v for k, v in sorted(config.get("strategy", {}).items())
+           if isinstance(v, (int, float, str, bool))}
+    for key, value in (("fee_ticks", config.get("fee_ticks")), ("slippage_ticks", config.get("slippage_ticks")),
+                       ("risk_pct", bt.get("risk_per_trade_pct")), ("mode", bt.get("mode"))):
+        if value is not None:
+            out[f"p_{key}"] = value
+    return out
+
+class RunRegistry:
+    """
+    record() 寫入一次回測並在 _runs.jsonl 附加一列（不改寫整個索引），累積 COMPACT_ROWS 列才併入索引檔；
+    index() / query() 只讀索引與 jsonl（檔案更新時自動重新載入）；
+    trades() / equity() / config() 依 run_id 讀取單一 run；trades_many() 合併多個 run 的交易（可只讀部分欄位）。
+    索引由主行程更新，不支援多個行程同時 record()。
+    """
+    INDEX = "_runs"
+    COMPACT_ROWS = 500
+
+    def __init__(self, root=DEFAULT_RUNS_ROOT, fmt=None):
+        self.root = Path(root)
+        self.fmt = fmt or DEFAULT_FORMAT
+        self._index = None
+        self._mtime = None
+
+    # ---------- 索引 ----------
+    @property
+    def index_path(self):
+        return find_existing(self.root / f"{self.INDEX}.parquet")
+
+    @property
+    def pending_path(self):
+        return self.root / f"{self.INDEX}.jsonl"
+
+    def _pending(self) -> list:
+        """jsonl 中尚未併入索引的列；當機留下的半行略過（reindex 可由 run.json 補回）。"""
+        rows = []
+        if not self.pending_path.exists():
+            return rows
+        with self.pending_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue
+        return rows
+
+    def index(self, columns=None) -> pd.DataFrame:
+        p, q = self.index_path, self.pending_path
+        mtime = (p.stat().st_mtime_ns if p is not None else None,
+                 q.stat().st_mtime_ns if q.exists() else None)
+        if self._index is None or mtime != self._mtime:
+            base = read_frame(p) if p is not None else pd.DataFrame(columns=["run_id"])
+            pending = self._pending()
+            if pending:
+                rows = pd.DataFrame(pending)
+                df = rows if base.empty else pd.concat([base, rows], ignore_index=True)
+                # 併入索引後、清空 jsonl 前當機時，同一 run 會出現兩次
+                base = normalize_params(df.drop_duplicates("run_id", keep="last").reset_index(drop=True))
+            self._index = base
+            self._mtime = mtime
+        return self._index if columns is None else self._index[[c for c in columns if c in self._index]]
+
+    def _save_index(self, df: pd.DataFrame):
+        self.root.mkdir(parents=True, exist_ok=True)
+        old = self.index_path
+        # 先寫暫存檔再 rename，讀取端不會看到寫到一半的索引
+        tmp = write_frame(normalize_params(df.copy()), self.root / f"{self.INDEX}-tmp", fmt=self.fmt)
+        final = tmp.with_name(f"{self.INDEX}{tmp.suffix}")
+        os.replace(tmp, final)
+        if old is not None and old != final:
+            old.unlink(missing_ok=True)
+        self.pending_path.unlink(missing_ok=True)
+        self._index = None
+
+    def _append_pending(self, row: dict) -> int:
+        """附加一列到 jsonl，回傳目前待併入的列數。"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self.pending_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n")
+        self._index = None
+        with self.pending_path.open("rb") as f:
+            return sum(1 for _ in f)
+
+    def compact(self):
+        """把 jsonl 的列併入索引檔。"""
+        if self.pending_path.exists():
+            self._save_index(self.index())
+
+    def query(self, where=None, sort=None, ascending=False, limit=None, columns=None) -> pd.DataFrame:
+        """where：DataFrame.query 運算式（例 "sharpe > 1 and p_rr == 1.8"）；只讀索引。"""
+        df = self.index()
+        if where:
+            df = df.query(where)
+        if sort:
+            df = df.sort_values(sort, ascending=ascending, kind="stable")
+        if limit:
+            df = df.head(limit)
+        return df if columns is None else df[[c for c in ["run_id", *columns] if c in df]]
+
+    # ---------- 寫入 ----------
+    def record(self, trades, config=None, name=None, kind="backtest", capital=None, equity=None,
+               tags=None, fields=None) -> str:
+        """
+        trades：交易 list[dict] 或 DataFrame；fields：欄位順序（預設依 trades）。
+        equity：權益曲線 DataFrame 或 [(time, equity), ...]；未提供時依交易累加。
+        回傳 run_id。
+        """
+        config = config or {}
+        df = pd.DataFrame(trades, columns=fields) if not isinstance(trades, pd.DataFrame) else trades
+        capital = capital if capital is not None else config.get("backtest", {}).get("initial_capital", 1_000_000)
+        if equity is not None and not isinstance(equity, pd.DataFrame):
+            equity = curve_frame(equity)
+        curve = equity if equity is not None and len(equity) else equity_curve(df, capital)
+        metrics = run_metrics(df, capital, equity)
+        created = datetime.now()
+        run_id = f"{created:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        d = self.root / run_id
+        d.mkdir(parents=True, exist_ok=True)
+        meta = {"run_id": run_id, "created": created.isoformat(timespec="seconds"), "name": name, "kind": kind,
+                "capital": capital, "tags": list(tags or []), "params": _params(config), "metrics": metrics,
+                "config": config}
+        try:
+            write_frame(df, d / "trades", fmt=self.fmt)
+            write_frame(curve, d / "equity", fmt=self.fmt)
+            with (d / "run.json").open("w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=1, default=_json_default)
+            pending = self._append_pending(self._row(meta))
+        except BaseException:
+            # 沒進索引的 run 目錄不留下（reindex 會把它撿回來，與呼叫端收到的例外不一致）
+            shutil.rmtree(d, ignore_errors=True)
+            raise
+        if pending >= self.COMPACT_ROWS:
+            try:
+                self.compact()
+            except Exception as e:
+                # 已登錄在 jsonl，下次 record / compact 再併入
+                print(f"⚠️ 回測索引合併失敗: {e}")
+        return run_id
+
+    @staticmethod
+    def _row(meta: dict) -> dict:
+        return {"run_id": meta["run_id"], "created": meta["created"], "name": meta["name"], "kind": meta["kind"],
+                "capital": meta["capital"], "tags": ",".join(meta["tags"]), **meta["params"], **meta["metrics"]}
+
+    def reindex(self) -> int:
+        """掃描各 run 目錄的 run.json 重建索引（並清空 jsonl）。"""
+        rows = []
+        for p in sorted(self.root.glob("*/run.json")):
+            with p.open("r", encoding="utf-8") as f:
+                rows.append(self._row(json.load(f)))
+        self._save_index(pd.DataFrame(rows, columns=None if rows else ["run_id"]))
+        return len(rows)
+
+    def remove(self, run_ids):
+        """刪除 run 後由 run.json 重建索引：p_* 欄的型態依剩下的 run 重新判斷（例 "x" 刪除後 p_rr 回到數值）。"""
+        run_ids = {run_ids} if isinstance(run_ids, str) else set(run_ids)
+        for r in run_ids:
+            shutil.rmtree(self.root / r, ignore_errors=True)
+        self.reindex()
+
+    # ---------- 讀取 ----------
+    def config(self, run_id) -> dict:
+        with (self.root / run_id / "run.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def trades(self, run_id, columns=None) -> pd.DataFrame:
+        df = read_frame(self.root / run_id / "trades.parquet", columns=columns)
+        if "exit_time" in df and not pd.api.types.is_datetime64_any_dtype(df["exit_time"]):
+            df["exit_time"] = parse_times(df["exit_time"])
+        return df
+
+    def equity(self, run_id) -> pd.DataFrame:
+        return read_frame(self.root / run_id / "equity.parquet")
+
+    def trades_many(self, run_ids, columns=None) -> pd.DataFrame:
+        """多個 run 的交易合併成一個 DataFrame（加上 run_id 欄），逐一讀取所選 run，不讀其他 run。"""
+        frames = []
+        for r in run_ids:
+            df = self.trades(r, columns)
+            df.insert(0, "run_id", r)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def print_metrics(metrics: dict):
+    for k, v in metrics.items():
+        print(f"{k:>18}: {v:,.4f}" if isinstance(v, float) else f"{k:>18}: {v}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="回測結果登錄查詢")
+    ap.add_argument("--root", default=str(DEFAULT_RUNS_ROOT))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ls = sub.add_parser("list", help="依索引篩選 / 排序")
+    ls.add_argument("--where", help='DataFrame.query 運算式，例 "sharpe > 1 and trades >= 50"')
+    ls.add_argument("--sort", default="created")
+    ls.add_argument("--ascending", action="store_true")
+    ls.add_argument("--limit", type=int, default=20)
+    ls.add_argument("--columns", nargs="*",
+                    default=["name", "kind", "trades", "net_pnl", "sharpe", "max_drawdown_pct", "win_rate",
+                             "expectancy", "hold_bars_p50"])
+    sh = sub.add_parser("show", help="單一 run 的指標與持倉根數分佈")
+    sh.add_argument("run_id")
+    sub.add_parser("reindex", help="由各 run 的 run.json 重建索引")
+    args = ap.parse_args(argv)
+    reg = RunRegistry(args.root)
+    if args.cmd == "reindex":
+        print(f"{reg.reindex()} 個 run")
+    elif args.cmd == "list":
+        df = reg.query(args.where, args.sort, args.ascending, args.limit, args.columns)
+        print(df.to_string(index=False) if not df.empty else "沒有符合的 run。")
+    else:
+        meta = reg.config(args.run_id)
+        print(f"{meta['run_id']}  {meta['name'] or ''}  {meta['kind']}  {meta['created']}")
+        print_metrics(meta["metrics"])
+        trades = reg.trades(args.run_id)
+        if "holding_bars" in trades and len(trades):
+            print(duration_distribution(trades).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,6 @@
 import logging
-import shioaji as sj
+
+from src.contracts import DEFAULT_CACHE_PATH, ContractCache, select_contract
 
 logger = logging.getLogger(__name__)
 
@@ -7,14 +8,19 @@ class ShioajiClient:
     def __init__(self, config):
         self.config = config
         self.simulation = config.get("simulation", True)
+        import shioaji as sj
         self.api = sj.Shioaji(simulation=self.simulation)
+        self.contract_cache = ContractCache(config.get("contract_cache", {}).get("path", DEFAULT_CACHE_PATH))
 
     def login(self):
+        # 合約快取屬於今日交易日時不下載合約表（select_tmf_contract 由快取選約）
+        fetch = not self.contract_cache.is_fresh("TMF")
         try:
             self.api.login(
                 api_key=self.config["api_key"],
                 secret_key=self.config["secret_key"],
-                contracts_timeout=10000
+                fetch_contract=fetch,
+                contracts_timeout=10000 if fetch else 0
             )
             logger.info("登入成功｜模式：%s", "模擬" if self.simulation else "真實")
         except Exception as e:
@@ -31,11 +37,14 @@ class ShioajiClient:
             logger.info("憑證啟用成功")
 
     def select_tmf_contract(self):
-        # 選擇最近到期且非 R1/R2 的 TMF 合約
-        contracts = [c for c in self.api.Contracts.Futures.TMF]
-        candidates = [x for x in contracts if x.code[-2:] not in ["R1","R2"]]
-        if not candidates:
+        # 選擇最近到期且非 R1/R2 的 TMF 合約（快取過期時才由合約表選取並更新快取）
+        contract = select_contract(self.api, "TMF", self.contract_cache)
+        if contract is None:
             raise RuntimeError("找不到 TMF 合約")
-        contract = min(candidates, key=lambda x: x.delivery_date)
         logger.info("選擇合約：%s", contract.code)
         return contract
+
+    def subscribe_ticks(self, contract):
+        from shioaji.constant import QuoteType, QuoteVersion
+        self.api.quote.subscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1)
+        logger.info("已訂閱 Tick：%s", contract.code)
@@ -1,9 +1,26 @@
 # src/shioaji_fetch_and_convert.py
+"""
+逐筆抓取與 N-tick 轉檔。
+單一合約 / 日期（使用設定區預設值）：
+    python -m src.shioaji_fetch_and_convert
+多合約、日期區間（抓取用執行緒池、轉檔用行程池，已存在的分區略過，失敗自動重試）：
+    python -m src.shioaji_fetch_and_convert --contracts TMF202512 TMF202601 \
+        --start 2025-11-01 --end 2025-11-30 --fetch-workers 4 --convert-workers 4
+離線測試（以 src.synthetic.FakeTicksAPI 代替 api.ticks）：
+    python -m src.shioaji_fetch_and_convert --fake --start 2025-11-24 --end 2025-11-28
+同一次走訪另外輸出其他週期（各存於 data/kbars_<週期>/）：
+    python -m src.shioaji_fetch_and_convert --fake --start 2025-11-26 --bars 12t 1m 5m
+"""
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 import csv
 import pandas as pd
-import shioaji as sj
+from src.tick_aggregator import MultiTickAggregator, TickAggregator
+from src.storage import DEFAULT_FORMAT, FrameAppender, PartitionedStore, write_frame
+from src import tick_quality
 
 # ---------- 設定區（請修改） ----------
 PERSON_ID = "YOUR_PERSON_ID"
@@ -13,69 +30,234 @@ CONTRACT_CODE = "TMF202512"
 DATE_STR = "2025-11-26"   # YYYY-MM-DD
 OUT_RAW_DIR = Path("data/raw_ticks")
 OUT_KBAR_DIR = Path("data/kbars_3tick")
+OUT_QUALITY_DIR = tick_quality.DEFAULT_REPORT_ROOT   # 每日品質報告：data/quality/<合約>/<日期>.json
+STORAGE_FORMAT = DEFAULT_FORMAT   # "parquet" / "feather" / "csv"
 OUT_RAW_DIR.mkdir(parents=True, exist_ok=True)
 OUT_KBAR_DIR.mkdir(parents=True, exist_ok=True)
-RAW_CSV = OUT_RAW_DIR / f"{CONTRACT_CODE}_{DATE_STR}_ticks.csv"
-KBAR_CSV = OUT_KBAR_DIR / f"{CONTRACT_CODE}_{DATE_STR}_3tick.csv"
+# 依合約 / 交易日分區：data/<raw_ticks|kbars_3tick>/<合約>/<日期>.<副檔名>
+RAW_STORE = PartitionedStore(OUT_RAW_DIR)
+KBAR_STORE = PartitionedStore(OUT_KBAR_DIR)
 # ------------------------------------
 
+_BAR_STORES = {}
+
+def bar_store(spec: str) -> PartitionedStore:
+    """其他週期的分區資料集：data/kbars_<spec>/（例：data/kbars_1m）。"""
+    if spec not in _BAR_STORES:
+        _BAR_STORES[spec] = PartitionedStore(OUT_KBAR_DIR.parent / f"kbars_{spec}")
+    return _BAR_STORES[spec]
+
+def final_bars(agg: MultiTickAggregator) -> dict:
+    """
+    收尾：time bar 的最後一根（收盤所在區間）保留；
+    N-tick / volume bar 尾端不足一根者捨棄（與 ticks_to_3tick_kbar 相同）。
+    """
+    kinds = {name: bar_type for name, bar_type, _, _ in agg.plan}
+    return {name: df for name, df in agg.flush().items() if kinds[name] == "time" and not df.empty}
+
 def login_shioaji(person_id: str, password: str):
+    import shioaji as sj
     api = sj.Shioaji()
     api.login(person_id=person_id, passwd=password)
     return api
 
-def fetch_ticks_save(api, contract_code: str, date_str: str, out_path: Path) -> pd.DataFrame:
+TICK_COLUMNS = ["time", "price", "volume", "bid", "ask"]
+# 逐筆 csv 的時間格式固定到微秒，分批寫入與一次寫入的輸出才會逐位元組相同
+TICK_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def _field(t, name, default=None):
+    # 支援 dict 或物件屬性兩種情況；只在欄位不存在時用預設值（0 / 0.0 是合法值，不可用 or 判斷）
+    if isinstance(t, dict):
+        value = t.get(name, default)
+    else:
+        value = getattr(t, name, default)
+    return default if value is None else value
+
+def _tick_row(t) -> dict:
+    return {"time": _field(t, "time"), "price": _field(t, "price"), "volume": _field(t, "volume", 0),
+            "bid": _field(t, "bid"), "ask": _field(t, "ask")}
+
+def normalize_ticks(rows) -> pd.DataFrame:
+    """逐筆 dict 列表 -> 固定欄位與型別的 DataFrame（time datetime64、價格 float64、volume int64）。"""
+    df = pd.DataFrame(rows, columns=TICK_COLUMNS)
+    df["time"] = pd.to_datetime(df["time"])
+    for c in ("price", "bid", "ask"):
+        df[c] = pd.to_numeric(df[c]).astype("float64")
+    df["volume"] = pd.to_numeric(df["volume"]).fillna(0).astype("int64")
+    return df
+
+def iter_tick_chunks(ticks, chunk_size: int = 50_000):
+    """把 api.ticks 的結果切成固定筆數的 DataFrame（generator），一次只保留一批。"""
+    rows = []
+    for t in ticks:
+        rows.append(_tick_row(t))
+        if len(rows) >= chunk_size:
+            yield normalize_ticks(rows)
+            rows = []
+    if rows:
+        yield normalize_ticks(rows)
+
+def fetch_ticks_save(api, contract_code: str, date_str: str, out_path: Path, fmt: str = None) -> pd.DataFrame:
     print(f"抓取 {contract_code} {date_str} 的逐筆資料...")
     # 嘗試直接以代碼呼叫 ticks；若你的 shioaji 版本需要 contract 物件，請在互動式環境取得 contract 並改寫此處
     ticks = api.ticks(contract_code, date=date_str)
-    rows = []
-    for t in ticks:
-        # 支援 dict 或物件屬性兩種情況
-        time = getattr(t, "time", None) or (t.get("time") if isinstance(t, dict) else None)
-        price = getattr(t, "price", None) or (t.get("price") if isinstance(t, dict) else None)
-        volume = getattr(t, "volume", None) or (t.get("volume") if isinstance(t, dict) else 0)
-        bid = getattr(t, "bid", None) or (t.get("bid") if isinstance(t, dict) else None)
-        ask = getattr(t, "ask", None) or (t.get("ask") if isinstance(t, dict) else None)
-        rows.append({"time": time, "price": price, "volume": volume, "bid": bid, "ask": ask})
-    df = pd.DataFrame(rows)
-    if not df.empty and not pd.api.types.is_datetime64_any_dtype(df["time"]):
-        df["time"] = pd.to_datetime(df["time"])
-    df.to_csv(out_path, index=False, encoding="utf-8")
+    df = normalize_ticks([_tick_row(t) for t in ticks])
+    out_path = write_frame(df, out_path, fmt=fmt or STORAGE_FORMAT, date_format=TICK_TIME_FORMAT)
     print(f"已儲存原始逐筆到: {out_path} (rows: {len(df)})")
     return df
 
-def ticks_to_3tick_kbar(df_ticks: pd.DataFrame, out_kbar_path: Path) -> pd.DataFrame:
+class NonMonotonicTicks(ValueError):
+    """api.ticks 回傳的逐筆時間倒退：資料本身的問題，重試無用，改走批次路徑。"""
+
+def stream_ticks_to_kbar(api, contract_code: str, date_str: str, raw_path: Path, kbar_path: Path,
+                         chunk_size: int = 50_000, ticks_per_kbar: int = 3, fmt: str = None,
+                         extra_paths: dict = None, quality: dict = None, report_path=None):
+    """
+    串流版 fetch_ticks_save + ticks_to_3tick_kbar：正規化、N-tick 聚合與寫檔逐批進行，
+    記憶體只與 chunk_size 有關。輸出與批次路徑相同（假設 api.ticks 依時間排序回傳；
+    發現時間倒退時丟出 NonMonotonicTicks，請改用批次路徑）。
+    任何失敗都會關閉並刪除已寫出一部分的 raw / Kbar / 其他週期檔案，不留下半個分區。
+    extra_paths：{週期: 路徑}（例：{"1m": ...}），與 N-tick Kbar 在同一次走訪中一併輸出。
+    quality：tick_quality.clean_ticks 的參數；指定時逐批以 StreamCleaner 清理後再聚合（原始逐筆照原樣寫出），
+    Kbar 與報告（report_path）和批次路徑 convert_partition 相同。
+    回傳 (raw 資訊, kbar 資訊或 None, {週期: 資訊或 None})，資訊為 {"path", "rows", "start", "end"}。
+    """
+    fmt = fmt or STORAGE_FORMAT
+    print(f"抓取 {contract_code} {date_str} 的逐筆資料（串流，每批 {chunk_size} 筆）...")
+    ticks = api.ticks(contract_code, date=date_str)
+    primary = f"{ticks_per_kbar}t"
+    paths = dict(extra_paths or {})
+    paths.pop(primary, None)
+    agg = MultiTickAggregator([primary, *paths]) if paths else None
+    tick_agg = TickAggregator(ticks_per_kbar)
+    raw_out = FrameAppender(raw_path, fmt=fmt, date_format=TICK_TIME_FORMAT, empty=normalize_ticks([]))
+    kbar_out = FrameAppender(kbar_path, fmt=fmt)
+    extra_out = {spec: FrameAppender(path, fmt=fmt) for spec, path in paths.items()}
+    spans = {spec: [None, None] for spec in [primary, *paths]}
+
+    def write(spec, out, bars):
+        if bars.empty:
+            return
+        span = spans[spec]
+        span[0] = bars["time"].iloc[0] if span[0] is None else span[0]
+        span[1] = bars["time"].iloc[-1]
+        out.append(bars)
+
+    def feed(chunk):
+        if not len(chunk):
+            return
+        if agg is None:
+            write(primary, kbar_out, tick_agg.push(chunk))
+            return
+        for spec, bars in agg.push(chunk).items():
+            write(spec, kbar_out if spec == primary else extra_out[spec], bars)
+
+    cleaner = tick_quality.StreamCleaner(**quality) if quality is not None else None
+    report = None
+    last_time = None
+    raw_first = raw_last = None
+    try:
+        with raw_out, kbar_out:
+            for chunk in iter_tick_chunks(ticks, chunk_size):
+                times = chunk["time"]
+                if (last_time is not None and times.iloc[0] < last_time) or not times.is_monotonic_increasing:
+                    raise NonMonotonicTicks(f"{contract_code} {date_str} 逐筆時間非遞增，無法串流轉檔")
+                last_time = times.iloc[-1]
+                raw_first = times.iloc[0] if raw_first is None else raw_first
+                raw_last = last_time
+                raw_out.append(chunk)
+                feed(cleaner.push(chunk) if cleaner is not None else chunk)
+            if cleaner is not None and raw_out.rows:
+                tail, report = cleaner.finish()
+                feed(tail)
+            if agg is not None and raw_out.rows:
+                for spec, bars in final_bars(agg).items():
+                    write(spec, extra_out[spec], bars)
+            for out in extra_out.values():
+                out.close()
+    except BaseException:
+        for out in [raw_out, kbar_out, *extra_out.values()]:
+            try:
+                out.close()
+            finally:
+                out.path.unlink(missing_ok=True)
+        raise
+    print(f"已儲存原始逐筆到: {raw_out.path} (rows: {raw_out.rows})")
+    if report is not None:
+        if report_path is not None:
+            tick_quality.write_report(report, report_path)
+        found = tick_quality.issues(report)
+        if found:
+            print(f"⚠️ 品質 {contract_code} {date_str}: {found}")
+
+    def info(spec, out):
+        first, last = spans[spec]
+        return {"path": out.path, "rows": out.rows,
+                "start": None if first is None else str(first), "end": None if last is None else str(last)}
+
+    raw_info = {"path": raw_out.path, "rows": raw_out.rows,
+                "start": None if raw_first is None else str(raw_first),
+                "end": None if raw_last is None else str(raw_last)}
+    if raw_out.rows == 0:
+        # 與批次路徑一致：無逐筆時不留 Kbar 檔；有逐筆但不足一根時留下空檔
+        print("沒有逐筆資料，跳過轉檔。")
+        for out in [kbar_out, *extra_out.values()]:
+            out.path.unlink(missing_ok=True)
+        return raw_info, None, {spec: None for spec in extra_out}
+    extra_info = {spec: info(spec, out) if out.rows else None for spec, out in extra_out.items()}
+    for spec, out in extra_out.items():
+        print(f"已儲存 {spec} Kbar 到: {out.path} (bars: {out.rows})")
+    if kbar_out.rows == 0:
+        return raw_info, None, extra_info
+    print(f"已儲存 {ticks_per_kbar}-tick Kbar 到: {kbar_out.path} (bars: {kbar_out.rows})")
+    return raw_info, info(primary, kbar_out), extra_info
+
+def ticks_to_3tick_kbar(df_ticks: pd.DataFrame, out_kbar_path: Path, ticks_per_kbar: int = 3,
+                        aggregator: TickAggregator = None, fmt: str = None) -> pd.DataFrame:
+    """
+    整欄聚合為 N-tick Kbar（預設 3）。
+    傳入 aggregator 時沿用其餘數 tick，供分批呼叫時跨批次接續。
+    """
     if df_ticks.empty:
         print("沒有逐筆資料，跳過轉檔。")
         return pd.DataFrame()
-    df_ticks = df_ticks.sort_values("time").reset_index(drop=True)
-    rows = []
-    buffer = []
-    for _, r in df_ticks.iterrows():
-        buffer.append({"time": r["time"], "price": float(r["price"]), "volume": int(r.get("volume", 0))})
-        if len(buffer) >= 3:
-            times = [b["time"] for b in buffer[:3]]
-            prices = [b["price"] for b in buffer[:3]]
-            vols = [b["volume"] for b in buffer[:3]]
-            kbar = {
-                "time": pd.to_datetime(times[-1]).isoformat(),
-                "open": prices[0],
-                "high": max(prices),
-                "low": min(prices),
-                "close": prices[-1],
-                "volume": sum(vols)
-            }
-            rows.append(kbar)
-            buffer = buffer[3:]
-    df_k = pd.DataFrame(rows)
-    df_k.to_csv(out_kbar_path, index=False, encoding="utf-8")
-    print(f"已儲存 3-tick Kbar 到: {out_kbar_path} (bars: {len(df_k)})")
+    # stable：同一時間的逐筆保持原始順序
+    df_ticks = df_ticks.sort_values("time", kind="stable").reset_index(drop=True)
+    agg = aggregator if aggregator is not None else TickAggregator(ticks_per_kbar)
+    df_k = agg.push(df_ticks)
+    if df_k.empty:
+        df_k = pd.DataFrame()
+    out_kbar_path = write_frame(df_k, out_kbar_path, fmt=fmt or STORAGE_FORMAT)
+    print(f"已儲存 {agg.ticks_per_kbar}-tick Kbar 到: {out_kbar_path} (bars: {len(df_k)})")
     return df_k
 
-def run_backtest_if_available(kbar_path: Path):
+def ticks_to_multi_kbar(df_ticks: pd.DataFrame, out_paths: dict, fmt: str = None) -> dict:
+    """
+    一次走訪逐筆、同時輸出多個週期（MultiTickAggregator，較大週期由較小週期組成）。
+    out_paths：{週期: 路徑}，例 {"3t": ..., "12t": ..., "1m": ...}；回傳 {週期: DataFrame}。
+    N-tick 週期的輸出與 ticks_to_3tick_kbar 相同。
+    """
+    if df_ticks.empty:
+        print("沒有逐筆資料，跳過轉檔。")
+        return {spec: pd.DataFrame() for spec in out_paths}
+    df_ticks = df_ticks.sort_values("time", kind="stable").reset_index(drop=True)
+    agg = MultiTickAggregator(list(out_paths))
+    frames = agg.push(df_ticks)
+    for spec, tail in final_bars(agg).items():
+        frames[spec] = pd.concat([frames[spec], tail], ignore_index=True) if not frames[spec].empty else tail
+    out = {}
+    for spec, path in out_paths.items():
+        df_k = frames[spec] if not frames[spec].empty else pd.DataFrame()
+        path = write_frame(df_k, path, fmt=fmt or STORAGE_FORMAT)
+        print(f"已儲存 {spec} Kbar 到: {path} (bars: {len(df_k)})")
+        out[spec] = df_k
+    return out
+
+def run_backtest_if_available(kbar_path: Path, name: str = None, registry="data/runs"):
+    """對一個 Kbar 分區回測，交易寫到 backtest_trades/；registry 為 None 時不登錄到回測結果目錄。"""
     try:
         from src.config_loader import load_config
-        from src.backtest import Backtester
+        from src.backtest import Backtester, TRADE_FIELDS
     except Exception:
         print("找不到 src.config_loader 或 src.backtest，跳過回測。")
         return None
@@ -83,21 +265,280 @@ def run_backtest_if_available(kbar_path: Path):
     bt = Backtester(cfg, str(kbar_path))
     trades = bt.run()
     print("回測完成，交易筆數:", len(trades))
-    out_trades = Path("backtest_trades") / f"{kbar_path.stem}.csv"
+    out_trades = Path("backtest_trades") / f"{name or kbar_path.stem}.csv"
     out_trades.parent.mkdir(parents=True, exist_ok=True)
     with open(out_trades, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["side","entry","stop","target","size"])
+        w = csv.DictWriter(f, fieldnames=TRADE_FIELDS)
         w.writeheader()
         for t in trades:
             w.writerow(t)
     print("交易明細已儲存:", out_trades)
+    if registry is not None:
+        from src.runs import RunRegistry
+        cfg = {**cfg, "backtest": {**cfg["backtest"], "mode": bt.mode}}
+        run_id = RunRegistry(registry).record(trades, cfg, name=name or kbar_path.stem, fields=TRADE_FIELDS)
+        print("已登錄回測結果:", run_id)
     return trades
 
-def main():
-    api = login_shioaji(PERSON_ID, PASSWORD)
-    df_ticks = fetch_ticks_save(api, CONTRACT_CODE, DATE_STR, RAW_CSV)
-    df_kbar = ticks_to_3tick_kbar(df_ticks, KBAR_CSV)
-    run_backtest_if_available(KBAR_CSV)
+# 資料本身的錯誤，重試結果相同
+NON_RETRYABLE = (NonMonotonicTicks,)
+
+def trading_days(start: str, end: str):
+    """start～end（含）之間的週一至週五；假日由 api.ticks 回傳空資料時略過。"""
+    return [d.strftime("%Y-%m-%d") for d in pd.bdate_range(start, end)]
+
+def with_retry(fn, *args, retries=3, backoff=1.0, label=""):
+    """失敗時以指數退避重試，retries 為重試次數（不含第一次）；NON_RETRYABLE 的錯誤直接丟出。"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except NON_RETRYABLE:
+            raise
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            print(f"⚠️ {label} 失敗（第 {attempt + 1} 次）：{e}，{wait:.1f}s 後重試")
+            time.sleep(wait)
+
+def fetch_partition(api, contract_code: str, date_str: str, fmt: str):
+    """抓取一個分區的逐筆並寫檔，回傳 (路徑, DataFrame)。"""
+    path = RAW_STORE.partition_path(contract_code, date_str, fmt)
+    df = fetch_ticks_save(api, contract_code, date_str, path, fmt=fmt)
+    return path, df
+
+def convert_partition(raw_path, kbar_path, ticks_per_kbar: int = 3, fmt: str = None, extra_paths: dict = None,
+                      quality: dict = None, report_path=None):
+    """
+    行程池工作：讀逐筆分區、轉 N-tick Kbar（及 extra_paths 的其他週期）並寫檔。
+    quality：tick_quality.clean_ticks 的參數；指定時先清理（去重、排序、濾除異常價）再轉檔，
+    報告寫到 report_path（原始逐筆分區不修改）。
+    回傳 (kbar 路徑, manifest entry, {週期: entry})；無資料時 entry 為 None。
+    manifest 由主行程統一更新，避免多行程同時改寫。
+    """
+    from src.storage import read_frame
+    df_ticks = read_frame(raw_path)
+    if quality is not None:
+        df_ticks, report = tick_quality.clean_ticks(df_ticks, **quality)
+        if report_path is not None:
+            tick_quality.write_report(report, report_path)
+        found = tick_quality.issues(report)
+        if found:
+            print(f"⚠️ 品質 {Path(raw_path).parent.name} {Path(raw_path).stem}: {found}")
+    primary = f"{ticks_per_kbar}t"
+    extra_paths = {spec: path for spec, path in (extra_paths or {}).items() if spec != primary}
+    extras = {}
+    if extra_paths:
+        frames = ticks_to_multi_kbar(df_ticks, {primary: Path(kbar_path), **extra_paths}, fmt=fmt)
+        df_k = frames[primary]
+        extras = {spec: None if frames[spec].empty
+                  else PartitionedStore._entry(bar_store(spec).root, path, frames[spec])
+                  for spec, path in extra_paths.items()}
+    else:
+        df_k = ticks_to_3tick_kbar(df_ticks, Path(kbar_path), ticks_per_kbar=ticks_per_kbar, fmt=fmt)
+    if df_k.empty:
+        return None, None, extras
+    return Path(kbar_path), PartitionedStore._entry(KBAR_STORE.root, kbar_path, df_k), extras
+
+def extra_partition_paths(contract_code: str, date_str: str, extra_bars, fmt: str) -> dict:
+    return {spec: bar_store(spec).partition_path(contract_code, date_str, fmt) for spec in extra_bars}
+
+def quality_path(contract_code: str, date_str: str) -> Path:
+    return tick_quality.report_path(OUT_QUALITY_DIR, contract_code, date_str)
+
+def stream_partition(api, contract_code: str, date_str: str, fmt: str, ticks_per_kbar: int, chunk_size: int,
+                     extra_bars=(), quality: dict = None):
+    """
+    串流轉檔一個分區，回傳 (raw entry, kbar entry, {週期: entry})。
+    逐筆時間倒退時（串流的部分檔案已刪除）改以批次路徑重抓並排序後轉檔。
+    """
+    raw_path = RAW_STORE.partition_path(contract_code, date_str, fmt)
+    kbar_path = KBAR_STORE.partition_path(contract_code, date_str, fmt)
+    extra_paths = extra_partition_paths(contract_code, date_str, extra_bars, fmt)
+    try:
+        raw, kbar, extras = stream_ticks_to_kbar(
+            api, contract_code, date_str, raw_path, kbar_path, chunk_size=chunk_size,
+            ticks_per_kbar=ticks_per_kbar, fmt=fmt, extra_paths=extra_paths,
+            quality=quality, report_path=quality_path(contract_code, date_str))
+    except NonMonotonicTicks as e:
+        print(f"⚠️ {e}，改用批次路徑")
+        raw_path, df = fetch_partition(api, contract_code, date_str, fmt)
+        if df.empty:
+            return None, None, {spec: None for spec in extra_paths}
+        _, kbar_entry, extras = convert_partition(raw_path, kbar_path, ticks_per_kbar, fmt, extra_paths,
+                                                  quality, quality_path(contract_code, date_str))
+        return PartitionedStore._entry(RAW_STORE.root, raw_path, df), kbar_entry, extras
+
+    def entry(store, info):
+        if info is None:
+            return None
+        e = dict(info, file=Path(info["path"]).relative_to(store.root).as_posix())
+        del e["path"]
+        return e
+
+    return (entry(RAW_STORE, raw), entry(KBAR_STORE, kbar),
+            {spec: entry(bar_store(spec), info) for spec, info in extras.items()})
+
+def run_pipeline(api, contracts, days, fetch_workers=4, convert_workers=2, retries=3,
+                 backoff=1.0, ticks_per_kbar=3, fmt=None, force=False, stream=False, chunk_size=50_000,
+                 extra_bars=(), quality=tick_quality.DEFAULTS):
+    """
+    多合約 / 多日抓取與轉檔。
+    - extra_bars：其他週期（例 ["12t", "1m", "5m"]），與 N-tick Kbar 同一次走訪逐筆輸出至 bar_store(週期)
+    - 抓取：ThreadPoolExecutor(fetch_workers)，完成後立即送交轉檔
+    - 轉檔：ProcessPoolExecutor(convert_workers)
+    - quality：轉檔前的品質檢查參數（tick_quality.clean_ticks），報告寫到 data/quality/；None 表示不檢查
+    - stream=True：抓取執行緒內直接以 stream_ticks_to_kbar 分批轉檔（記憶體固定），不使用行程池；
+      品質檢查逐批進行（tick_quality.StreamCleaner），Kbar 與報告和批次路徑相同；
+      時間倒退的日期刪除串流的部分檔案，改走批次路徑
+    - 已有 Kbar 分區者略過；已有逐筆分區者只轉檔
+    - api=None：只轉檔已存在的逐筆分區（不抓取），沒有逐筆分區的日期列為無資料
+    回傳 {"done": [...], "skipped": [...], "empty": [...], "failed": [(contract, day, error), ...]}
+    """
+    fmt = fmt or STORAGE_FORMAT
+    extra_bars = [spec for spec in extra_bars if spec != f"{ticks_per_kbar}t"]
+    stores = [KBAR_STORE] + [bar_store(spec) for spec in extra_bars]
+    summary = {"done": [], "skipped": [], "empty": [], "failed": []}
+
+    def register_extras(c, d, extras):
+        for spec, entry in extras.items():
+            if entry is not None:
+                bar_store(spec).register_many([(c, d, entry)])
+
+    jobs = []
+    for c in contracts:
+        for d in days:
+            if not force and all(store.has(c, d) for store in stores):
+                summary["skipped"].append((c, d))
+            else:
+                jobs.append((c, d))
+    if not jobs:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=convert_workers) as convert_pool:
+        fetches = {}
+        converts = {}
+        for c, d in jobs:
+            if stream and api is not None:
+                fut = fetch_pool.submit(with_retry, stream_partition, api, c, d, fmt, ticks_per_kbar,
+                                        chunk_size, extra_bars, quality, retries=retries, backoff=backoff,
+                                        label=f"串流 {c} {d}")
+                fetches[fut] = (c, d)
+            elif (api is None or not force) and RAW_STORE.has(c, d):
+                raw_path = RAW_STORE.root / RAW_STORE.manifest()[c][d]["file"]
+                kbar_path = KBAR_STORE.partition_path(c, d, fmt)
+                fut = convert_pool.submit(with_retry, convert_partition, raw_path, kbar_path,
+                                          ticks_per_kbar, fmt, extra_partition_paths(c, d, extra_bars, fmt),
+                                          quality, quality_path(c, d),
+                                          retries=retries, backoff=backoff, label=f"轉檔 {c} {d}")
+                converts[fut] = (c, d)
+            elif api is None:
+                summary["empty"].append((c, d))
+            else:
+                fut = fetch_pool.submit(with_retry, fetch_partition, api, c, d, fmt,
+                                        retries=retries, backoff=backoff, label=f"抓取 {c} {d}")
+                fetches[fut] = (c, d)
+
+        for fut in as_completed(fetches):
+            c, d = fetches[fut]
+            try:
+                result = fut.result()
+            except Exception as e:
+                summary["failed"].append((c, d, repr(e)))
+                continue
+            if stream:
+                raw_entry, kbar_entry, extras = result
+                if raw_entry is not None:
+                    RAW_STORE.register_many([(c, d, raw_entry)])
+                register_extras(c, d, extras)
+                if kbar_entry is None:
+                    summary["empty"].append((c, d))
+                else:
+                    KBAR_STORE.register_many([(c, d, kbar_entry)])
+                    summary["done"].append((c, d))
+                continue
+            raw_path, df = result
+            if df.empty:
+                summary["empty"].append((c, d))
+                continue
+            RAW_STORE.register(c, d, raw_path, df)
+            kbar_path = KBAR_STORE.partition_path(c, d, fmt)
+            cf = convert_pool.submit(with_retry, convert_partition, raw_path, kbar_path,
+                                     ticks_per_kbar, fmt, extra_partition_paths(c, d, extra_bars, fmt),
+                                     quality, quality_path(c, d),
+                                     retries=retries, backoff=backoff, label=f"轉檔 {c} {d}")
+            converts[cf] = (c, d)
+
+        for fut in as_completed(converts):
+            c, d = converts[fut]
+            try:
+                path, entry, extras = fut.result()
+            except Exception as e:
+                summary["failed"].append((c, d, repr(e)))
+                continue
+            register_extras(c, d, extras)
+            if entry is None:
+                summary["empty"].append((c, d))
+                continue
+            KBAR_STORE.register_many([(c, d, entry)])
+            summary["done"].append((c, d))
+    return summary
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="TMF 逐筆抓取與 N-tick 轉檔")
+    ap.add_argument("--contracts", nargs="+", default=[CONTRACT_CODE])
+    ap.add_argument("--start", default=DATE_STR)
+    ap.add_argument("--end", default=None, help="預設與 --start 相同")
+    ap.add_argument("--fetch-workers", type=int, default=4)
+    ap.add_argument("--convert-workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--backoff", type=float, default=1.0)
+    ap.add_argument("--ticks-per-kbar", type=int, default=3)
+    ap.add_argument("--bars", nargs="*", default=[],
+                    help="同時輸出的其他週期，例：12t 1m 5m 500v（存於 data/kbars_<週期>/）")
+    ap.add_argument("--format", default=STORAGE_FORMAT, choices=["parquet", "feather", "csv"])
+    ap.add_argument("--force", action="store_true", help="已存在的分區也重新抓取 / 轉檔")
+    ap.add_argument("--stream", action="store_true", help="分批串流轉檔，記憶體固定")
+    ap.add_argument("--chunk-size", type=int, default=50_000)
+    ap.add_argument("--no-quality", action="store_true", help="轉檔前不做品質檢查（去重 / 排序 / 異常價）")
+    ap.add_argument("--spike-pct", type=float, default=tick_quality.DEFAULTS["spike_pct"],
+                    help="價格偏離前後中位數超過此比例視為異常價")
+    ap.add_argument("--gap-seconds", type=float, default=tick_quality.DEFAULTS["gap_seconds"],
+                    help="同一盤別內超過此秒數無成交列入報告")
+    ap.add_argument("--backtest", action="store_true", help="轉檔完成後對每個分區執行回測")
+    ap.add_argument("--registry", default="data/runs", help="--backtest 的回測結果登錄目錄")
+    ap.add_argument("--no-registry", action="store_true", help="--backtest 只寫 backtest_trades/，不登錄")
+    ap.add_argument("--fake", action="store_true", help="使用 FakeTicksAPI，不登入 Shioaji")
+    ap.add_argument("--convert-only", action="store_true", help="只轉檔已抓取的逐筆分區，不登入")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.convert_only:
+        api = None
+    elif args.fake:
+        from src.synthetic import FakeTicksAPI
+        api = FakeTicksAPI()
+    else:
+        api = login_shioaji(PERSON_ID, PASSWORD)
+    days = trading_days(args.start, args.end or args.start)
+    summary = run_pipeline(api, args.contracts, days, fetch_workers=args.fetch_workers,
+                           convert_workers=args.convert_workers, retries=args.retries,
+                           backoff=args.backoff, ticks_per_kbar=args.ticks_per_kbar,
+                           fmt=args.format, force=args.force, stream=args.stream,
+                           chunk_size=args.chunk_size, extra_bars=args.bars,
+                           quality=None if args.no_quality else dict(tick_quality.DEFAULTS, spike_pct=args.spike_pct,
+                                                                     gap_seconds=args.gap_seconds))
+    print(f"完成 {len(summary['done'])}｜略過 {len(summary['skipped'])}｜"
+          f"無資料 {len(summary['empty'])}｜失敗 {len(summary['failed'])}")
+    for c, d, err in summary["failed"]:
+        print(f"❌ {c} {d}: {err}")
+    if args.backtest:
+        for c, d in summary["done"]:
+            run_backtest_if_available(KBAR_STORE.partition_path(c, d, args.format), name=f"{c}_{d}",
+                                      registry=None if args.no_registry else args.registry)
+    return 1 if summary["failed"] else 0
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+# src/snapshot.py
+"""
+盤中狀態快照（warm start）。
+保存 ThreeTickStrategy（ATR 環形緩衝、連續方向、已見根數）、QuoteManager 聚合器
+與 StrategyState 的狀態，以及最後處理的 tick 位置；重新啟動時還原後只需重播快照之後的 tick，
+不必重抓整段 Kbar、也不必重新暖機。
+檔案為 pickle 的純資料 dict（不含類別物件），寫入時先寫暫存檔再 os.replace，避免半寫入。
+"""
+import os
+import pickle
+import time
+from pathlib import Path
+
+SNAPSHOT_VERSION = 1
+STRATEGY_PARAMS = ("fee_ticks", "slippage", "tick_value", "atr_period", "stop_atr_mult", "rr", "warmup")
+
+def _slots(obj) -> dict:
+    out = {}
+    for name in obj.__slots__:
+        value = getattr(obj, name)
+        out[name] = list(value) if isinstance(value, list) else value
+    return out
+
+def _load_slots(obj, data: dict):
+    for name in obj.__slots__:
+        value = data[name]
+        setattr(obj, name, list(value) if isinstance(value, list) else value)
+
+def strategy_state(strategy) -> dict:
+    return {
+        "params": {p: getattr(strategy, p) for p in STRATEGY_PARAMS},
+        "bars_seen": strategy.bars_seen,
+        "atr": _slots(strategy.atr),
+        "direction": _slots(strategy.direction),
+    }
+
+def restore_strategy(strategy, data: dict):
+    params = {p: getattr(strategy, p) for p in STRATEGY_PARAMS}
+    if params != data["params"]:
+        raise ValueError(f"strategy parameters changed since snapshot: {data['params']} -> {params}")
+    strategy.bars_seen = data["bars_seen"]
+    _load_slots(strategy.atr, data["atr"])
+    _load_slots(strategy.direction, data["direction"])
+
+def take_snapshot(strategy, quote_manager, state=None, last_tick_time=None, same_time_count=0) -> dict:
+    """
+    last_tick_time / same_time_count：最後處理的 tick 時間，以及該時間已處理的筆數
+    （同一時間可能有多筆 tick，重播時略過這幾筆）。
+    呼叫端需確保 strategy 已處理完 quote_manager 送出的所有 bar（QuotePipeline 以 marker 保證）。
+    """
+    return {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "last_tick_time": last_tick_time,
+        "same_time_count": same_time_count,
+        "strategy": strategy_state(strategy),
+        "aggregator": _slots(quote_manager.aggregator),
+        "position": None if state is None else state.position,
+    }
+
+def save_snapshot(snapshot: dict, path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+def load_snapshot(path):
+    """讀取快照；檔案不存在或版本不符時回傳 None。"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+def restore_snapshot(snapshot: dict, strategy, quote_manager, state=None):
+    """把快照狀態寫回既有物件（參數不同時丟出 ValueError，呼叫端應改為冷啟動）。"""
+    restore_strategy(strategy, snapshot["strategy"])
+    _load_slots(quote_manager.aggregator, snapshot["aggregator"])
+    if state is not None and snapshot.get("position") is not None:
+        state.position = snapshot["position"]
+
+def ticks_since(ticks, snapshot: dict):
+    """由依時間排序的 tick dict 中取出快照之後的部分（generator）。"""
+    last = snapshot.get("last_tick_time")
+    skip = snapshot.get("same_time_count", 0)
+    for tick in ticks:
+        t = tick["time"]
+        if last is not None:
+            if t < last:
+                continue
+            if t == last and skip > 0:
+                skip -= 1
+                continue
+            last = None
+        yield tick
+
+def catch_up(snapshot: dict, ticks, strategy, quote_manager, on_signal=None) -> tuple:
+    """
+    重播快照之後的 tick（只更新狀態；訊號交給 on_signal，預設捨棄，避免補單）。
+    回傳 (重播筆數, 最後 tick 時間, 該時間筆數)，可接著傳給 QuotePipeline.resume_from。
+    """
+    n = 0
+    last, same = snapshot.get("last_tick_time"), snapshot.get("same_time_count", 0)
+    for tick in ticks_since(ticks, snapshot):
+        t = tick["time"]
+        if t == last:
+            same += 1
+        else:
+            last, same = t, 1
+        kbar = quote_manager.on_tick(tick)
+        if kbar is not None:
+            sig = strategy.on_kbar(kbar)
+            if sig and on_signal:
+                on_signal(sig)
+        n += 1
+    return n, last, same
+
+def recorded_ticks(directory, snapshot: dict):
+    """
+    從 BufferedRecorder（format=csv）的 ticks_<交易日>.csv 讀取快照之後的 tick（依檔名日期排序）。
+    只讀 csv：當機後 csv 最多少一列或留下半列（丟棄），parquet / feather 則可能沒有 footer 而整檔無法讀取。
+    回傳 tick dict 的 list（time 為 Timestamp）；檔案無法讀取時丟出 ValueError，由呼叫端改為冷啟動。
+    """
+    import pandas as pd
+    from src.recorder import BufferedRecorder
+    from src.storage import read_frame
+    directory = Path(directory)
+    last = snapshot.get("last_tick_time")
+    files = sorted(directory.glob("ticks_*.csv"))
+    if last is not None:
+        day = BufferedRecorder.trading_days(pd.Series([pd.Timestamp(last)])).iloc[0].strftime("%Y-%m-%d")
+        files = [p for p in files if p.stem[len("ticks_"):len("ticks_") + 10] >= day]
+    frames = []
+    for p in files:
+        try:
+            frames.append(read_frame(p, columns=["time", "price", "volume"]))
+        except Exception as e:
+            raise ValueError(f"無法讀取記錄檔 {p}: {e}") from e
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return []
+    df = pd.concat(frames, ignore_index=True)
+    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df["volume"] = pd.to_numeric(df["volume"], errors="coerce")
+    df = df.dropna(subset=["time", "price"])
+    df["volume"] = df["volume"].fillna(0).astype("int64")
+    df = df.sort_values("time", kind="stable")
+    if last is not None:
+        df = df[df["time"] >= pd.Timestamp(last)]
+    return df.to_dict("records")
@@ -1,15 +1,20 @@
 # src/startup.py
+import atexit
 import json
 import sys
+import time
 from pathlib import Path
-from datetime import datetime
 
-# 載入 shioaji
-try:
-    import shioaji as sj
-except Exception as e:
-    print("ERROR: 無法匯入 shioaji，請確認虛擬環境已安裝 shioaji:", e)
-    sys.exit(1)
+from src.contracts import DEFAULT_CACHE_PATH, ContractCache, select_contract
+
+def import_shioaji():
+    """需要連線時才載入 shioaji（離線工具不需安裝），載入失敗時結束程式。"""
+    try:
+        import shioaji as sj
+    except Exception as e:
+        print("ERROR: 無法匯入 shioaji，請確認虛擬環境已安裝 shioaji:", e)
+        sys.exit(1)
+    return sj
 
 CFG_PATH = Path("config/config.json")
 
@@ -19,14 +24,23 @@ def load_config(path=CFG_PATH):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def login_shioaji(cfg):
+def login_shioaji(cfg, fetch_contract=True):
     simulation_mode = cfg.get("simulation", True)
     api_key = cfg.get("api_key") or cfg.get("user") or cfg.get("account")
     secret_key = cfg.get("secret_key") or cfg.get("password") or cfg.get("passwd")
     if not api_key or not secret_key:
         raise ValueError("config.json 需包含 api_key 與 secret_key（或等效欄位）")
 
+    sj = import_shioaji()
     api = sj.Shioaji(simulation=simulation_mode)
+    # 合約快取可用時略過合約下載；舊版 login 不支援 fetch_contract 時改走下方的相容流程
+    if not fetch_contract:
+        try:
+            api.login(api_key=api_key, secret_key=secret_key, fetch_contract=False)
+            print(f"✅ 登入成功｜模式：{'模擬' if simulation_mode else '真實'}（使用合約快取）")
+            return api
+        except TypeError:
+            pass
     # 兼容不同版本 login 簽名
     try:
         api.login(api_key, secret_key)
@@ -58,66 +72,9 @@ def activate_ca_if_needed(api, cfg):
         except Exception as e:
             raise RuntimeError(f"憑證啟用失敗: {e}")
 
-def find_contract(api, symbol):
-    # 嘗試直接從 api.Contracts.Futures.<symbol> 取得
-    contracts = []
-    try:
-        futs = getattr(api.Contracts.Futures, symbol)
-        try:
-            contracts = list(futs)
-        except Exception:
-            # 若 futs 本身就是可迭代
-            try:
-                for c in futs:
-                    contracts.append(c)
-            except Exception:
-                pass
-    except Exception:
-        # fallback: 遍歷所有 Futures 合約
-        try:
-            all_futs = getattr(api.Contracts, "Futures", None) or getattr(api.Contracts, "futures", None)
-            if all_futs:
-                try:
-                    for attr in dir(all_futs):
-                        val = getattr(all_futs, attr)
-                        if isinstance(val, (list, tuple)):
-                            for c in val:
-                                contracts.append(c)
-                except Exception:
-                    try:
-                        for c in all_futs:
-                            contracts.append(c)
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-
-    # 以 contract.code 或 contract.symbol 包含 symbol 過濾
-    filtered = []
-    for c in contracts:
-        code = getattr(c, "code", "") or str(getattr(c, "contract_code", ""))
-        sym = getattr(c, "symbol", "") or ""
-        if symbol in code or symbol in sym:
-            filtered.append(c)
-
-    # 排除展期/保留代碼（常見 R1/R2）
-    filtered = [c for c in filtered if not str(getattr(c, "code", "")).endswith(("R1", "R2"))]
-
-    if not filtered:
-        return None
-
-    # 取最早交割日
-    def delivery_key(c):
-        d = getattr(c, "delivery_date", None)
-        if isinstance(d, datetime):
-            return d
-        try:
-            return datetime.fromisoformat(str(d))
-        except Exception:
-            return datetime.max
-
-    chosen = min(filtered, key=delivery_key)
-    return chosen
+def find_contract(api, symbol, cache=None):
+    """選近月合約（排除 R1/R2）；cache 為 ContractCache 時同一交易日內直接由本地快取選取。"""
+    return select_contract(api, symbol, cache)
 
 def subscribe_tick(api, contract):
     # 取得 QuoteType 與 QuoteVersion 的兼容方式
@@ -129,6 +86,7 @@ def subscribe_tick(api, contract):
         QuoteVersion = QV
     except Exception:
         try:
+            sj = import_shioaji()
             QuoteType = getattr(sj.constant, "QuoteType", None)
             QuoteVersion = getattr(sj.constant, "QuoteVersion", None)
         except Exception:
@@ -145,32 +103,156 @@ def subscribe_tick(api, contract):
     except Exception as e:
         print(f"⚠️ 訂閱 Tick 失敗: {e}")
 
-def init_engines(api, contract, cfg):
+def init_engines(api, contract, cfg, fetch_history=True):
     # 嘗試匯入專案內的模組，若不存在則提示並回傳 None
     try:
         from src.kline import KlineInitializer
         from src.engine import StrategyState, TickEngine
-        from src.recorder import TickRecorder
+        from src.recorder import BufferedRecorder, TickRecorder
         from src.logger import TradeLogger
     except Exception:
         print("⚠️ 找不到部分引擎模組 (kline/engine/recorder/logger)。請確認 src 內對應檔案存在。")
         return None
 
-    # 初始化 kline 與指標
-    kline = KlineInitializer(api=api, contract=contract, start=cfg.get("backtest", {}).get("start"), end=cfg.get("backtest", {}).get("end"))
-    kline.fetch_kline()
-    kline.compute_indicators()
-    indicators = kline.get_indicators()
+    # 初始化 kline 與指標（warm start 時由快照還原策略狀態，不重抓歷史）
+    if fetch_history:
+        kline = KlineInitializer(api=api, contract=contract, start=cfg.get("backtest", {}).get("start"), end=cfg.get("backtest", {}).get("end"))
+        kline.fetch_kline()
+        kline.compute_indicators()
+        indicators = kline.get_indicators()
+    else:
+        indicators = {}
 
     bias = cfg.get("bias", "auto")
     state = StrategyState()
-    tick_recorder = TickRecorder(filename=cfg.get("tick_record_file", "tick_record.csv"))
+    rec_cfg = cfg.get("recorder", {})
+    if rec_cfg.get("mode") == "buffered":
+        tick_recorder = BufferedRecorder(directory=rec_cfg.get("directory", "records"),
+                                         batch_size=rec_cfg.get("batch_size", 5000),
+                                         flush_interval=rec_cfg.get("flush_interval", 1.0),
+                                         fmt=rec_cfg.get("format", "csv"))
+    else:
+        tick_recorder = TickRecorder(filename=cfg.get("tick_record_file", "tick_record.csv"))
     trade_logger = TradeLogger(tick_recorder=tick_recorder)
     tick_engine = TickEngine(state, bias, indicators, trade_logger, tick_recorder)
 
     print("✅ 引擎初始化完成")
     return tick_engine
 
+def init_strategy(cfg):
+    """即時 / 模擬下單用的策略；與回測相同，cfg["strategy"] 可覆寫 atr_period / stop_atr_mult / rr / warmup。"""
+    from src.strategy import ThreeTickStrategy
+    return ThreeTickStrategy(fee_ticks=cfg.get("fee_ticks", 4), slippage=cfg.get("slippage_ticks", 0.5),
+                             **cfg.get("strategy", {}))
+
+def init_orders(engine, cfg, strategy):
+    """
+    cfg["orders"]：mode = "paper" 時以 OrderManager + 本機 SimulatedExchange 下括號單（OCO），
+    cfg["orders"]["latency_ticks"] 為撮合延遲；rr / 手續費 / 滑價與策略相同（strategy.rr、
+    strategy.fee_ticks、strategy.slippage，後兩者來自頂層 fee_ticks / slippage_ticks）。
+    回傳 OrderManager（未啟用時 None，訊號只寫 log）。
+    券商 gateway 尚未實作（Shioaji 期貨沒有原生停損單，需由本機監看觸發），mode = "live" 時同樣只寫 log。
+    """
+    ord_cfg = cfg.get("orders", {})
+    mode = ord_cfg.get("mode")
+    if not mode:
+        return None
+    if mode != "paper":
+        print(f"⚠️ 尚未支援 orders.mode={mode!r}，訊號只寫 log")
+        return None
+    from src.orders import OrderManager, SimulatedExchange
+    bt = cfg.get("backtest", {})
+    manager = OrderManager(engine=engine, rr=strategy.rr, fee_ticks=strategy.fee_ticks,
+                           capital=bt.get("initial_capital", 1_000_000), risk_pct=bt.get("risk_per_trade_pct", 0.5))
+    SimulatedExchange(latency_ticks=ord_cfg.get("latency_ticks", 1), slippage=strategy.slippage).attach(manager)
+    print("✅ 模擬下單（本機撮合，OCO 括號單）")
+    return manager
+
+def init_pipeline(api, engine, cfg, orders=None, strategy=None):
+    """
+    建立報價管線並註冊為 Shioaji tick callback。
+    callback 執行緒只放入佇列；聚合、訊號、記錄（engine.on_tick）與下單由管線的消費執行緒處理。
+    orders：init_orders 的 OrderManager；訊號交給 on_signal，模擬撮合器在聚合階段逐筆撮合（不經會丟資料的記錄佇列）。
+    strategy：與 init_orders 共用的策略（預設 init_strategy(cfg)）。
+    """
+    from src.pipeline import QuotePipeline
+    from src.quote_manager import QuoteManager
+
+    strategy = strategy if strategy is not None else init_strategy(cfg)
+    qm = QuoteManager(ticks_per_kbar=3)
+    pipe_cfg = cfg.get("pipeline", {})
+    snap_cfg = cfg.get("snapshot", {})
+    lat_cfg = cfg.get("latency", {})
+    pipeline = QuotePipeline(qm, strategy,
+                             tick_sinks=[engine.on_tick] if engine else (),
+                             quote_sinks=[orders.gateway.on_tick] if orders is not None else (),
+                             on_signal=orders.on_signal if orders is not None else None,
+                             maxsize=pipe_cfg.get("maxsize", 10_000),
+                             overflow=pipe_cfg.get("overflow", "drop_oldest"),
+                             state=engine.state if engine else None,
+                             snapshot_path=snap_cfg.get("path"),
+                             snapshot_interval=snap_cfg.get("interval", 60.0),
+                             latency=True if lat_cfg.get("enabled") else None)
+    if snap_cfg.get("path"):
+        warm_start(pipeline, cfg)
+    pipeline.start()
+    if pipeline.latency is not None:
+        start_latency_reporting(pipeline.latency, lat_cfg)
+    try:
+        api.quote.set_on_tick_fop_v1_callback(pipeline.on_shioaji_tick)
+        print("✅ 已註冊 Tick callback（佇列管線）")
+    except Exception as e:
+        print(f"⚠️ 註冊 Tick callback 失敗: {e}")
+    return pipeline
+
+def start_latency_reporting(recorder, lat_cfg):
+    """cfg["latency"]：dump_interval（秒，定期印出區間統計）、port（本機 HTTP endpoint）。"""
+    from src.latency import serve
+    if lat_cfg.get("dump_interval"):
+        recorder.dump_every(lat_cfg["dump_interval"])
+    if lat_cfg.get("port"):
+        try:
+            serve(recorder, lat_cfg["port"])
+            print(f"✅ 延遲統計：http://127.0.0.1:{lat_cfg['port']}/")
+        except OSError as e:
+            print(f"⚠️ 延遲統計 endpoint 啟動失敗: {e}")
+
+def warm_start(pipeline, cfg) -> bool:
+    """
+    由 cfg["snapshot"]["path"] 的快照還原策略 / 聚合器 / 部位，
+    再重播 BufferedRecorder 目錄中快照之後的 tick。
+    記錄器不是 buffered csv、無快照、記錄檔無法讀取或參數不符時回傳 False（冷啟動）。
+    """
+    from src.snapshot import catch_up, load_snapshot, recorded_ticks, restore_snapshot
+    if not warm_start_supported(cfg):
+        print("⚠️ 快照補算需要 recorder.mode=buffered 且 format=csv，改為冷啟動")
+        return False
+    t0 = time.perf_counter()
+    snapshot = load_snapshot(cfg["snapshot"]["path"])
+    if snapshot is None:
+        return False
+    # 先讀完記錄檔再還原：讀取失敗時策略狀態仍是初始值，可直接冷啟動
+    try:
+        ticks = recorded_ticks(cfg["recorder"].get("directory", "records"), snapshot)
+        restore_snapshot(snapshot, pipeline.strategy, pipeline.quote_manager, pipeline.state)
+    except ValueError as e:
+        print(f"⚠️ 快照無法使用，改為冷啟動: {e}")
+        return False
+    n, last, same = catch_up(snapshot, ticks, pipeline.strategy, pipeline.quote_manager)
+    pipeline.resume_from(last, same)
+    print(f"✅ 已由快照還原（最後 tick {snapshot['last_tick_time']}），補算 {n} 筆 tick，"
+          f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+    return True
+
+def warm_start_supported(cfg) -> bool:
+    """只有 buffered csv 記錄器的檔案在當機後仍可讀到最後一批（parquet / feather 要正常關檔才有 footer）。"""
+    rec_cfg = cfg.get("recorder", {})
+    return rec_cfg.get("mode") == "buffered" and rec_cfg.get("format", "csv") == "csv"
+
+def snapshot_available(cfg) -> bool:
+    path = cfg.get("snapshot", {}).get("path")
+    return bool(path) and Path(path).exists() and warm_start_supported(cfg)
+
 def main():
     try:
         cfg = load_config()
@@ -178,8 +260,10 @@ def main():
         print("讀取設定失敗:", e)
         sys.exit(1)
 
+    symbol = cfg.get("contract_symbol", "TMF")
+    cache = ContractCache(cfg.get("contract_cache", {}).get("path", DEFAULT_CACHE_PATH))
     try:
-        api = login_shioaji(cfg)
+        api = login_shioaji(cfg, fetch_contract=not cache.is_fresh(symbol))
     except Exception as e:
         print("登入失敗:", e)
         sys.exit(1)
@@ -190,8 +274,7 @@ def main():
         print("憑證啟用錯誤:", e)
         sys.exit(1)
 
-    symbol = cfg.get("contract_symbol", "TMF")
-    contract = find_contract(api, symbol)
+    contract = find_contract(api, symbol, cache)
     if contract is None:
         print(f"⚠️ 找不到標的 {symbol} 的合約，請在 REPL 列出 api.Contracts 以確認結構。")
         try:
@@ -203,19 +286,28 @@ def main():
     print(f"✅ 使用合約：{getattr(contract,'code', getattr(contract,'contract_code', str(contract)))}")
 
     # 初始化引擎（若有）
-    engine = init_engines(api, contract, cfg)
+    engine = init_engines(api, contract, cfg, fetch_history=not snapshot_available(cfg))
+
+    # 先註冊 callback（只放入佇列），再訂閱 Tick
+    strategy = init_strategy(cfg)
+    pipeline = init_pipeline(api, engine, cfg, orders=init_orders(engine, cfg, strategy), strategy=strategy)
+
+    # 結束時先停管線（寫最後一份快照、送完佇列內的 tick），再由記錄器的 atexit 關檔；
+    # atexit 後註冊先執行，記錄器已在 init_engines 註冊。stop() 可重複呼叫
+    atexit.register(pipeline.stop)
 
     # 訂閱 Tick
     subscribe_tick(api, contract)
 
-    # 若需要把 engine 與 api 綁定或註冊回調，請在此加入
-    # 範例（依你專案實作調整）:
-    # try:
-    #     api.quote.set_callback(contract, engine.on_tick)
-    # except Exception:
-    #     pass
-
-    print("啟動完成。")
+    print("啟動完成（Ctrl+C 結束）。")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    pipeline.stop()
+    print("管線已停止:", pipeline.metrics())
+    return 0
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
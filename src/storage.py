@@ -0,0 +1,358 @@
+# src/storage.py
+"""
+逐筆 / Kbar 資料的儲存層。
+- 格式：parquet（預設，需 pyarrow）、feather（需 pyarrow）、csv（後備）
+- 欄位型別固定：time 為 datetime64，price/open/high/low/close/bid/ask 為 float64，volume 為 int64
+- read_frame 若指定的檔案不存在，會依序尋找同名的其他格式檔案
+- PartitionedStore：每個合約、每個交易日一個分區（<root>/<contract>/<YYYY-MM-DD>.<ext>），
+  並以 <root>/_manifest.json 記錄各分區的檔案、筆數與起訖時間，供區間查詢
+搬移既有 CSV：
+    python -m src.storage migrate data/raw_ticks data/kbars_3tick --format parquet
+重建 manifest：
+    python -m src.storage reindex data/kbars_3tick
+"""
+import argparse
+import bisect
+import importlib.util
+import json
+import os
+from pathlib import Path
+import pandas as pd
+
+# 只確認是否安裝，實際讀寫 parquet / feather 時才匯入 pyarrow
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+SUFFIXES = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+# read_frame 尋找替代檔案的優先順序
+READ_ORDER = ("parquet", "feather", "csv")
+DEFAULT_FORMAT = "parquet" if HAS_PYARROW else "csv"
+DEFAULT_COMPRESSION = "zstd"
+
+FLOAT_COLUMNS = ("price", "open", "high", "low", "close", "bid", "ask")
+INT_COLUMNS = ("volume",)
+
+def resolve_format(fmt=None):
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in SUFFIXES:
+        raise ValueError(f"unknown storage format: {fmt}")
+    if fmt != "csv" and not HAS_PYARROW:
+        print(f"⚠️ 未安裝 pyarrow，{fmt} 改用 csv 儲存。")
+        fmt = "csv"
+    return fmt
+
+def format_of(path) -> str:
+    suffix = Path(path).suffix.lower()
+    for fmt, s in SUFFIXES.items():
+        if s == suffix:
+            return fmt
+    return "csv"
+
+def storage_path(path, fmt=None) -> Path:
+    """將路徑副檔名換成 fmt 對應的副檔名。"""
+    return Path(path).with_suffix(SUFFIXES[resolve_format(fmt)])
+
+def find_existing(path):
+    """回傳 path 本身或同名其他格式中第一個存在的檔案；都不存在則回傳 None。"""
+    p = Path(path)
+    if p.exists():
+        return p
+    for fmt in READ_ORDER:
+        alt = p.with_suffix(SUFFIXES[fmt])
+        if alt.exists():
+            return alt
+    return None
+
+def parse_times(values):
+    """解析 time 欄；isoformat 字串可能有無小數秒混雜，故以 ISO8601 解析。"""
+    return pd.to_datetime(values, format="ISO8601")
+
+def normalize_types(df: pd.DataFrame) -> pd.DataFrame:
+    """套用固定欄位型別（僅處理存在的欄位）。"""
+    df = df.copy()
+    if "time" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["time"]):
+        df["time"] = parse_times(df["time"])
+    for c in FLOAT_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    for c in INT_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+    return df
+
+def write_frame(df: pd.DataFrame, path, fmt=None, compression=DEFAULT_COMPRESSION, date_format=None) -> Path:
+    """
+    依 fmt 寫入，回傳實際檔案路徑（副檔名會換成對應格式）。
+    csv 寫法與既有程式相同（index=False, utf-8），欄位內容不轉型；date_format 僅用於 csv。
+    """
+    fmt = resolve_format(fmt)
+    out = Path(path).with_suffix(SUFFIXES[fmt])
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "csv":
+        df.to_csv(out, index=False, encoding="utf-8", date_format=date_format)
+    elif fmt == "parquet":
+        normalize_types(df).to_parquet(out, index=False, compression=compression)
+    else:
+        normalize_types(df).reset_index(drop=True).to_feather(out, compression=compression or "uncompressed")
+    return out
+
+def conform(df: pd.DataFrame, fields) -> pd.DataFrame:
+    """依 [(欄名, pyarrow 型別別名), ...] 補齊缺少的欄、調整欄序，整數欄轉成可為空的 Int64、字串欄轉成 string。"""
+    out = pd.DataFrame(index=df.index)
+    for name, t in fields:
+        col = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if t.startswith("int"):
+            col = pd.to_numeric(col, errors="coerce").astype("Int64")
+        elif t in ("string", "str", "utf8"):
+            col = col.astype("string")
+        elif t in ("double", "float64"):
+            col = pd.to_numeric(col, errors="coerce").astype("float64")
+        elif t.startswith("timestamp"):
+            col = parse_times(col) if not pd.api.types.is_datetime64_any_dtype(col) else col
+        out[name] = col
+    return out
+
+class FrameAppender:
+    """
+    分批附加寫入同一個檔案（串流轉檔用），close() 後檔案才完整。
+    csv：第一批寫表頭、之後附加；parquet：每批一個 row group；feather：每批一個 record batch。
+    每批內容與一次寫入整個 DataFrame 相同（csv 逐位元組相同，需各批欄位型別一致）。
+    resume=True 時，既有的非空 csv 檔會直接接續附加（不重寫表頭）。
+    schema：欄式格式的固定欄位型別 [(欄名, pyarrow 型別別名), ...]（例 ("time", "timestamp[ns]")）；
+    未指定時以第一批推斷，第一批整欄為 None 的欄位會被推斷成 null 型別，之後的批次無法寫入。
+    """
+    def __init__(self, path, fmt=None, compression=DEFAULT_COMPRESSION, date_format=None, empty=None,
+                 resume=False, schema=None):
+        self.fmt = resolve_format(fmt)
+        self.path = Path(path).with_suffix(SUFFIXES[self.fmt])
+        self.compression = compression
+        self.date_format = date_format
+        self.empty = empty if empty is not None else pd.DataFrame()
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._fields = tuple(schema) if schema is not None else None
+        self._started = (resume and self.fmt == "csv" and self.path.exists()
+                         and self.path.stat().st_size > 0)
+
+    def append(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        if self.fmt == "csv":
+            if not self._started:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(self.path, index=False, encoding="utf-8", date_format=self.date_format,
+                      mode="a" if self._started else "w", header=not self._started)
+        else:
+            import pyarrow as pa
+            if self._fields is not None:
+                if self._schema is None:
+                    self._schema = pa.schema([(name, pa.type_for_alias(t)) for name, t in self._fields])
+                table = pa.Table.from_pandas(conform(normalize_types(df), self._fields), schema=self._schema,
+                                             preserve_index=False)
+            else:
+                table = pa.Table.from_pandas(normalize_types(df), preserve_index=False)
+            if self._writer is None:
+                if self._schema is None:
+                    self._schema = table.schema
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.fmt == "parquet":
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression=self.compression)
+                    self._writer = pa.ipc.new_file(str(self.path), self._schema, options=options)
+            table = table.cast(self._schema)
+            self._writer.write_table(table)
+        self._started = True
+        self.rows += len(df)
+
+    def close(self) -> Path:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif not self._started:
+            write_frame(self.empty, self.path, fmt=self.fmt, compression=self.compression,
+                        date_format=self.date_format)
+        self._started = True
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_frame(path, columns=None) -> pd.DataFrame:
+    """讀取任一支援格式；csv 的 time 欄會解析為 datetime。"""
+    p = find_existing(path)
+    if p is None:
+        raise FileNotFoundError(f"找不到資料檔: {path}")
+    fmt = format_of(p)
+    if fmt == "parquet":
+        return pd.read_parquet(p, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(p, columns=columns)
+    df = pd.read_csv(p, usecols=columns)
+    if "time" in df.columns:
+        df["time"] = parse_times(df["time"])
+    return df
+
+def list_frames(directory, pattern="*"):
+    """列出目錄下所有支援格式的資料檔（同名多格式時只取優先順序最高者）。"""
+    d = Path(directory)
+    seen = {}
+    for fmt in READ_ORDER:
+        for p in sorted(d.glob(pattern + SUFFIXES[fmt])):
+            seen.setdefault(p.with_suffix(""), p)
+    return [seen[k] for k in sorted(seen)]
+
+def migrate(directory, fmt=None, compression=DEFAULT_COMPRESSION, remove_csv=False):
+    """把目錄（含分區子目錄）下的 csv 轉成 fmt；已轉過（目標檔較新）者略過。回傳轉換的檔案數。"""
+    fmt = resolve_format(fmt)
+    if fmt == "csv":
+        return 0
+    n = 0
+    for src in sorted(Path(directory).rglob("*.csv")):
+        dst = src.with_suffix(SUFFIXES[fmt])
+        if dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+            continue
+        df = normalize_types(pd.read_csv(src))
+        write_frame(df, dst, fmt=fmt, compression=compression)
+        print(f"{src} -> {dst} (rows: {len(df)})")
+        if remove_csv:
+            src.unlink()
+        n += 1
+    if n and (Path(directory) / PartitionedStore.MANIFEST).exists():
+        PartitionedStore(directory).reindex()
+    return n
+
+class PartitionedStore:
+    """
+    依合約 / 交易日分區的資料集。
+    查詢只讀 manifest，再依日期二分搜尋取出重疊的分區，讀檔數只與查詢區間有關。
+    start / end 為交易日（YYYY-MM-DD，含兩端）；None 表示不設限。
+    """
+    MANIFEST = "_manifest.json"
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._manifest = None
+        self._mtime = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / self.MANIFEST
+
+    def manifest(self) -> dict:
+        """{contract: {day: entry}}；manifest 檔更新時自動重新載入。"""
+        p = self.manifest_path
+        mtime = p.stat().st_mtime_ns if p.exists() else None
+        if self._manifest is None or mtime != self._mtime:
+            if mtime is None:
+                self._manifest = {}
+            else:
+                with p.open("r", encoding="utf-8") as f:
+                    self._manifest = json.load(f).get("partitions", {})
+            self._mtime = mtime
+        return self._manifest
+
+    def _save(self, partitions):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"partitions": partitions}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+        self._manifest = None
+
+    def partition_path(self, contract, day, fmt=None) -> Path:
+        return self.root / str(contract) / f"{day}{SUFFIXES[resolve_format(fmt)]}"
+
+    def has(self, contract, day) -> bool:
+        e = self.manifest().get(str(contract), {}).get(str(day))
+        return e is not None and (self.root / e["file"]).exists()
+
+    @staticmethod
+    def _entry(root, path, df):
+        start = end = None
+        if df is not None and not df.empty and "time" in df.columns:
+            start, end = str(df["time"].iloc[0]), str(df["time"].iloc[-1])
+        return {"file": Path(path).relative_to(root).as_posix(),
+                "rows": 0 if df is None else int(len(df)), "start": start, "end": end}
+
+    def register(self, contract, day, path, df=None):
+        """登錄已寫好的分區檔（df 用於記錄筆數與起訖時間）。"""
+        self.register_many([(contract, day, self._entry(self.root, path, df))])
+
+    def register_many(self, entries):
+        """一次登錄多個 (contract, day, entry)，只改寫 manifest 一次。"""
+        parts = {c: dict(d) for c, d in self.manifest().items()}
+        for contract, day, entry in entries:
+            parts.setdefault(str(contract), {})[str(day)] = entry
+        self._save(parts)
+
+    def write(self, contract, day, df, fmt=None, compression=DEFAULT_COMPRESSION) -> Path:
+        path = write_frame(df, self.partition_path(contract, day, fmt), fmt=fmt, compression=compression)
+        self.register(contract, day, path, df)
+        return path
+
+    def contracts(self):
+        return sorted(self.manifest())
+
+    def query(self, contract=None, start=None, end=None):
+        """回傳與 [start, end] 重疊的分區 [(contract, day, path), ...]，依日期、合約排序。"""
+        parts = self.manifest()
+        contracts = [str(contract)] if contract is not None else sorted(parts)
+        out = []
+        for c in contracts:
+            days = sorted(parts.get(c, {}))
+            lo = bisect.bisect_left(days, str(start)[:10]) if start else 0
+            hi = bisect.bisect_right(days, str(end)[:10]) if end else len(days)
+            out.extend((c, d, self.root / parts[c][d]["file"]) for d in days[lo:hi])
+        out.sort(key=lambda x: (x[1], x[0]))
+        return out
+
+    def scan(self, contract=None, start=None, end=None, columns=None):
+        """逐分區讀取（generator），不一次載入整段區間。"""
+        for _, _, path in self.query(contract, start, end):
+            yield read_frame(path, columns=columns)
+
+    def read(self, contract=None, start=None, end=None, columns=None) -> pd.DataFrame:
+        frames = [df for df in self.scan(contract, start, end, columns) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def reindex(self):
+        """掃描目錄重建 manifest（讀取每個分區以取得筆數與起訖時間）。"""
+        entries = []
+        for cdir in sorted(p for p in self.root.iterdir() if p.is_dir()):
+            for path in list_frames(cdir):
+                df = read_frame(path, columns=["time"])
+                entries.append((cdir.name, path.stem, self._entry(self.root, path, df)))
+        self._save({})
+        self.register_many(entries)
+        return len(entries)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="資料儲存工具")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="將 CSV 轉為欄式格式")
+    m.add_argument("dirs", nargs="*", default=["data/raw_ticks", "data/kbars_3tick"])
+    m.add_argument("--format", default=DEFAULT_FORMAT, choices=["parquet", "feather"])
+    m.add_argument("--compression", default=DEFAULT_COMPRESSION)
+    m.add_argument("--remove-csv", action="store_true")
+    r = sub.add_parser("reindex", help="重建分區 manifest")
+    r.add_argument("dirs", nargs="*", default=["data/raw_ticks", "data/kbars_3tick"])
+    args = ap.parse_args(argv)
+    if args.cmd == "reindex":
+        for d in args.dirs:
+            if Path(d).is_dir():
+                print(f"{d}: {PartitionedStore(d).reindex()} 個分區")
+        return
+    total = 0
+    for d in args.dirs:
+        total += migrate(d, args.format, args.compression, args.remove_csv)
+    print(f"完成，共轉換 {total} 個檔案。")
+
+if __name__ == "__main__":
+    main()
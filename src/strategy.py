@@ -1,5 +1,4 @@
-import pandas as pd
-from src.utils import atr
+from src.indicators import RollingATR, DirectionStreak
 
 class ThreeTickStrategy:
     """
@@ -8,27 +7,64 @@ class ThreeTickStrategy:
     - 進場：連續 3 根同向上升/下跌 Kbar（可加成交量條件）
     - 停損：stop = max(1.2 * ATR(14), fee_ticks)
     - 目標：R:R = 1:1.8 或使用追蹤停損
+    - 前 15 根為暖機期，不出訊號
+    ATR 週期、停損倍數、R:R 與暖機根數可由參數調整（預設值即上述規則）。
+    指標以逐根方式更新（見 src/indicators.py），每根 Kbar 成本固定，不保存歷史。
     """
-    def __init__(self, fee_ticks=4, slippage=0.5, tick_value=10):
+    def __init__(self, fee_ticks=4, slippage=0.5, tick_value=10,
+                 atr_period=14, stop_atr_mult=1.2, rr=1.8, warmup=15):
         self.fee_ticks = fee_ticks
         self.slippage = slippage
         self.tick_value = tick_value
-        self.kbars = []
+        self.atr_period = atr_period
+        self.stop_atr_mult = stop_atr_mult
+        self.rr = rr
+        self.warmup = warmup
+        self.bars_seen = 0
+        self.atr = RollingATR(period=atr_period)
+        self.direction = DirectionStreak()
 
     def on_kbar(self, kbar):
-        self.kbars.append(kbar)
-        if len(self.kbars) < 15:
+        self.bars_seen += 1
+        atr = self.atr.update(kbar["high"], kbar["low"], kbar["close"])
+        streak = self.direction.update(kbar["close"])
+        if self.bars_seen < self.warmup:
             return None
-        df = pd.DataFrame(self.kbars)
-        df["atr"] = atr(df["high"], df["low"], df["close"], period=14)
-        # 檢查最後 3 根是否同向上升
-        last3 = df.iloc[-3:]
-        up = (last3["close"].diff().fillna(0) > 0).all()
-        down = (last3["close"].diff().fillna(0) < 0).all()
-        if up:
-            stop_ticks = max(1.2 * df["atr"].iloc[-1], self.fee_ticks)
+        # 最後 3 根 close 皆高於（低於）前一根
+        if streak >= 3:
+            stop_ticks = max(self.stop_atr_mult * atr, self.fee_ticks)
             return {"side":"buy","price":kbar["close"], "stop_ticks":stop_ticks}
-        if down:
-            stop_ticks = max(1.2 * df["atr"].iloc[-1], self.fee_ticks)
+        if streak <= -3:
+            stop_ticks = max(self.stop_atr_mult * atr, self.fee_ticks)
             return {"side":"sell","price":kbar["close"], "stop_ticks":stop_ticks}
         return None
+
+    def batch_signals(self, high, low, close, dataset=None):
+        """
+        on_kbar 的整欄向量化版本（回測用，不更新逐根狀態）。
+        回傳 (side, stop_ticks)：side 為 +1 買 / -1 賣 / 0 無訊號。
+        dataset：資料集識別鍵；指定時 ATR 經 indicators.CACHE 快取（參數掃描時同一 atr_period 只算一次）。
+        """
+        # 回測才需要 numpy / 整欄指標，實盤只用 on_kbar，不載入
+        import numpy as np
+        from src.indicators import CACHE, atr as atr_array
+        close = np.asarray(close, dtype=float)
+        if dataset is None:
+            atr = atr_array(high, low, close, period=self.atr_period)
+        else:
+            atr = CACHE.get(dataset, "atr", {"high": high, "low": low, "close": close}, period=self.atr_period)
+        up = np.zeros(len(close), dtype=bool)
+        down = np.zeros(len(close), dtype=bool)
+        if len(close) > 1:
+            diff = np.diff(close)
+            up[1:] = diff > 0
+            down[1:] = diff < 0
+        # 最後 3 根皆同向：與前兩根的旗標做 AND
+        up[2:] &= up[1:-1] & up[:-2]
+        up[:2] = False
+        down[2:] &= down[1:-1] & down[:-2]
+        down[:2] = False
+        side = up.astype(np.int8) - down.astype(np.int8)
+        side[:max(self.warmup - 1, 0)] = 0
+        stop_ticks = np.maximum(self.stop_atr_mult * atr, self.fee_ticks)
+        return side, stop_ticks
@@ -0,0 +1,110 @@
+# src/synthetic.py
+"""
+合成 TMF 類資料（離線測試 / benchmark 用，不需登入 Shioaji）。
+價格以 1 點為 tick，隨機漫步。
+"""
+import random
+from datetime import datetime, timedelta
+
+START_TIME = datetime(2025, 11, 26, 8, 45)
+
+def iter_kbars(n, seed=0, start_price=23000.0, start_time=START_TIME):
+    """逐根產生 3-tick Kbar dict：time/open/high/low/close/volume。"""
+    rnd = random.Random(seed)
+    price = start_price
+    t = start_time
+    step = timedelta(milliseconds=500)
+    for _ in range(n):
+        o = price
+        prices = [o]
+        for _ in range(2):
+            price += rnd.choice((-2, -1, -1, 0, 1, 1, 2))
+            prices.append(price)
+        t += step
+        yield {
+            "time": t,
+            "open": o,
+            "high": max(prices),
+            "low": min(prices),
+            "close": price,
+            "volume": rnd.randint(3, 30),
+        }
+
+def kbars_frame(n, seed=0, start_price=23000.0, start_time=START_TIME):
+    """整批產生 n 根 3-tick Kbar（DataFrame），適合大量資料 benchmark。"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    steps = rng.choice(np.array([-2, -1, -1, 0, 1, 1, 2]), size=(n, 2))
+    mid = start_price + np.cumsum(steps.sum(axis=1)) - steps.sum(axis=1)
+    p1 = mid + steps[:, 0]
+    close = p1 + steps[:, 1]
+    opens = mid
+    high = np.maximum(np.maximum(opens, p1), close)
+    low = np.minimum(np.minimum(opens, p1), close)
+    time = pd.Timestamp(start_time) + pd.to_timedelta(np.arange(1, n + 1) * 500, unit="ms")
+    return pd.DataFrame({
+        "time": time,
+        "open": opens.astype(float),
+        "high": high.astype(float),
+        "low": low.astype(float),
+        "close": close.astype(float),
+        "volume": rng.integers(3, 31, size=n),
+    })
+
+def ticks_frame(n, seed=0, start_price=23000.0, start_time=START_TIME):
+    """整批產生 n 筆逐筆資料（DataFrame）：time/price/volume/bid/ask，欄位同 data/raw_ticks。"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    price = start_price + np.cumsum(rng.choice(np.array([-1, 0, 0, 1]), size=n))
+    gaps = rng.exponential(150.0, size=n).astype(np.int64)
+    time = pd.Timestamp(start_time) + pd.to_timedelta(np.cumsum(gaps), unit="ms")
+    return pd.DataFrame({
+        "time": time,
+        "price": price.astype(float),
+        "volume": rng.integers(1, 10, size=n),
+        "bid": (price - 1).astype(float),
+        "ask": (price + 1).astype(float),
+    })
+
+class FakeTicksAPI:
+    """
+    api.ticks 的本機替身（離線測試抓檔流程用）。
+    ticks(contract, date) 回傳 dict 列表，內容由 (contract, date) 決定、可重現；
+    週末回傳空列表。fail_first=n 時每個 (contract, date) 前 n 次呼叫丟出例外，用於測試重試。
+    """
+    def __init__(self, ticks_per_day=20_000, fail_first=0, lazy=False):
+        self.ticks_per_day = ticks_per_day
+        self.fail_first = fail_first
+        self.lazy = lazy
+        self.calls = {}
+
+    def ticks(self, contract, date=None):
+        import zlib
+        import pandas as pd
+        code = getattr(contract, "code", contract)
+        key = (str(code), str(date))
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.calls[key] <= self.fail_first:
+            raise ConnectionError(f"fake failure {key} #{self.calls[key]}")
+        day = pd.Timestamp(date)
+        if day.weekday() >= 5:
+            return []
+        seed = zlib.crc32(f"{code}|{date}".encode())
+        start = day + pd.Timedelta(hours=8, minutes=45)
+        if self.lazy:
+            return self._iter_ticks(seed, start)
+        return ticks_frame(self.ticks_per_day, seed=seed, start_time=start).to_dict("records")
+
+    def _iter_ticks(self, seed, start, block=10_000):
+        """lazy=True：分段產生，不一次建立整天的資料（量測串流記憶體用）。"""
+        left = self.ticks_per_day
+        i = 0
+        while left > 0:
+            n = min(block, left)
+            df = ticks_frame(n, seed=seed + i, start_time=start)
+            start = df["time"].iloc[-1]
+            yield from df.to_dict("records")
+            left -= n
+            i += 1
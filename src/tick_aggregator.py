@@ -0,0 +1,190 @@
+# src/tick_aggregator.py
+"""
+N-tick Kbar 整批聚合（歷史轉檔用）。
+以 numpy reshape 對 price / volume / time 整欄運算，不逐筆迴圈；
+不足 N 筆的尾端 tick 保留在 TickAggregator 內，併入下一次 push。
+輸出欄位與舊版 ticks_to_3tick_kbar 相同：time(isoformat 字串)/open/high/low/close/volume。
+MultiTickAggregator 以同一批 tick 一次產生多個週期（N-tick / 秒分時 / 成交量），較大週期由較小週期組成。
+"""
+import numpy as np
+import pandas as pd
+
+KBAR_COLUMNS = ["time", "open", "high", "low", "close", "volume"]
+
+def isoformat_times(times) -> np.ndarray:
+    """
+    pd.Timestamp.isoformat() 的向量化版本：
+    無小數秒時省略、有微秒取 6 位、有奈秒取 9 位；含時區時附 ±HH:MM。
+    """
+    times = pd.Series(pd.to_datetime(times))
+    if len(times) == 0:
+        return np.array([], dtype=object)
+    tz = times.dt.tz
+    wall = times.dt.tz_localize(None) if tz is not None else times
+    ns = wall.to_numpy(dtype="datetime64[ns]")
+    out = np.datetime_as_string(ns, unit="s").astype(object)
+    frac = ns.astype(np.int64) % 1_000_000_000
+    has_ns = frac % 1000 != 0
+    has_us = (frac != 0) & ~has_ns
+    if has_us.any():
+        out[has_us] = np.datetime_as_string(ns[has_us], unit="us")
+    if has_ns.any():
+        out[has_ns] = np.datetime_as_string(ns[has_ns], unit="ns")
+    if tz is not None:
+        utc = times.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        offset_min = ((ns - utc).astype("timedelta64[m]").astype(np.int64))
+        sign = np.where(offset_min < 0, "-", "+")
+        a = np.abs(offset_min)
+        hh = pd.Series(a // 60).astype(str).str.zfill(2).to_numpy()
+        mm = pd.Series(a % 60).astype(str).str.zfill(2).to_numpy()
+        out = out + sign + hh + ":" + mm
+    return out
+
+def _tick_columns(ticks):
+    """
+    price / volume / time 欄位陣列；ticks 可為 DataFrame 或欄位 mapping（如 TickArchive.columns 的 memmap view）。
+    型別已相符時不複製。
+    """
+    price = np.asarray(ticks["price"], dtype=float)
+    if "volume" in ticks:
+        volume = np.asarray(ticks["volume"]).astype(np.int64, copy=False)
+    else:
+        volume = np.zeros(len(price), dtype=np.int64)
+    return price, volume, np.asarray(ticks["time"])
+
+class TickAggregator:
+    """
+    整批 N-tick 聚合器。
+    push(df_ticks) 回傳本次可組成的完整 Kbar；餘數 tick 留待下次 push。
+    df_ticks 需含 time/price（DataFrame 或欄位 mapping），volume 缺少時視為 0。
+    """
+    def __init__(self, ticks_per_kbar=3):
+        if ticks_per_kbar <= 0:
+            raise ValueError("ticks_per_kbar must be positive")
+        self.ticks_per_kbar = ticks_per_kbar
+        self._time = None
+        self._price = np.empty(0, dtype=float)
+        self._volume = np.empty(0, dtype=np.int64)
+
+    @property
+    def pending(self) -> int:
+        """尚未組成 Kbar 的 tick 數。"""
+        return len(self._price)
+
+    def push(self, df_ticks: pd.DataFrame) -> pd.DataFrame:
+        price, volume, time = _tick_columns(df_ticks)
+        if self._time is not None and len(self._time):
+            price = np.concatenate([self._price, price])
+            volume = np.concatenate([self._volume, volume])
+            time = np.concatenate([self._time, time])
+        n = self.ticks_per_kbar
+        m = len(price) // n
+        used = m * n
+        self._price, self._volume, self._time = price[used:], volume[used:], time[used:]
+        if m == 0:
+            return pd.DataFrame(columns=KBAR_COLUMNS)
+        p = price[:used].reshape(m, n)
+        return pd.DataFrame({
+            "time": isoformat_times(time[n - 1:used:n]),
+            "open": p[:, 0],
+            "high": p.max(axis=1),
+            "low": p.min(axis=1),
+            "close": p[:, -1],
+            "volume": volume[:used].reshape(m, n).sum(axis=1),
+        })
+
+def ticks_to_kbars(df_ticks: pd.DataFrame, ticks_per_kbar=3) -> pd.DataFrame:
+    """一次性轉換：尾端不足 N 筆的 tick 捨棄（與舊版行為相同）。"""
+    return TickAggregator(ticks_per_kbar).push(df_ticks)
+
+_UNIT_FIELDS = ("open", "high", "low", "close", "volume", "time", "ticks")
+
+def _reduce_units(u, ends):
+    """把 units（tick 或較小週期 bar 的欄位陣列）依 ends（各組的結束位置，不含）合併成 bar 陣列。"""
+    stop = ends[-1]
+    starts = np.concatenate([[0], ends[:-1]])
+    return {
+        "open": u["open"][starts],
+        "high": np.maximum.reduceat(u["high"][:stop], starts),
+        "low": np.minimum.reduceat(u["low"][:stop], starts),
+        "close": u["close"][ends - 1],
+        "volume": np.add.reduceat(u["volume"][:stop], starts),
+        "time": u["time"][ends - 1],
+        "ticks": np.add.reduceat(u["ticks"][:stop], starts),
+    }
+
+class MultiTickAggregator:
+    """
+    整批多週期聚合器（MultiBarAggregator 的向量化版本，歷史轉檔用）。
+    series 與 rollup 規則同 quote_manager.plan_series，例：["3t", "12t", "1m", "5m", "500v"]。
+    push(df_ticks) 回傳 {名稱: 本次完成的 Kbar DataFrame}，未完成的部分保留到下次 push；
+    flush() 回傳各序列最後一根未完成的 bar。輸出欄位同 KBAR_COLUMNS，N-tick 序列與 TickAggregator 相同。
+    """
+    def __init__(self, series, rollup=True):
+        from src.quote_manager import plan_series
+        self.plan = plan_series(series, rollup)
+        self.names = [name for name, _, _, _ in self.plan]
+        self._pending = {name: None for name in self.names}
+
+    @staticmethod
+    def _tick_units(df_ticks):
+        price, volume, time = _tick_columns(df_ticks)
+        return {"open": price, "high": price, "low": price, "close": price, "volume": volume,
+                "time": time, "ticks": np.ones(len(price), dtype=np.int64)}
+
+    @staticmethod
+    def _ends(u, bar_type, size, final):
+        m = len(u["ticks"])
+        if m == 0:
+            return np.empty(0, dtype=np.int64)
+        if bar_type == "tick":
+            ends = np.flatnonzero(np.cumsum(u["ticks"]) % size == 0) + 1
+        elif bar_type == "time":
+            wall = pd.Series(pd.to_datetime(u["time"]))
+            if wall.dt.tz is not None:
+                wall = wall.dt.tz_localize(None)
+            key = wall.to_numpy(dtype="datetime64[ns]").view(np.int64) // (size * 1_000_000_000)
+            ends = np.flatnonzero(key[1:] != key[:-1]) + 1
+        else:
+            cum = np.cumsum(u["volume"])
+            out = []
+            base = 0
+            while True:
+                i = int(np.searchsorted(cum, base + size, side="left"))
+                if i >= m:
+                    break
+                out.append(i + 1)
+                base = cum[i]
+            ends = np.asarray(out, dtype=np.int64)
+        if final and (len(ends) == 0 or ends[-1] != m):
+            ends = np.append(ends, m)
+        return ends
+
+    def _run(self, tick_units, final):
+        done = {}
+        for name, bar_type, size, source in self.plan:
+            u = tick_units if source is None else done[source]
+            pending = self._pending[name]
+            if pending is not None:
+                u = {f: np.concatenate([pending[f], u[f]]) for f in _UNIT_FIELDS}
+            ends = self._ends(u, bar_type, size, final)
+            used = int(ends[-1]) if len(ends) else 0
+            self._pending[name] = {f: u[f][used:] for f in _UNIT_FIELDS}
+            done[name] = _reduce_units(u, ends) if used else {f: u[f][:0] for f in _UNIT_FIELDS}
+        return {name: self._frame(done[name]) for name in self.names}
+
+    @staticmethod
+    def _frame(bars):
+        if len(bars["close"]) == 0:
+            return pd.DataFrame(columns=KBAR_COLUMNS)
+        return pd.DataFrame({"time": isoformat_times(bars["time"]), "open": bars["open"],
+                             "high": bars["high"], "low": bars["low"], "close": bars["close"],
+                             "volume": bars["volume"]})
+
+    def push(self, df_ticks: pd.DataFrame) -> dict:
+        return self._run(self._tick_units(df_ticks), final=False)
+
+    def flush(self) -> dict:
+        empty = {f: np.empty(0, dtype=np.int64) for f in _UNIT_FIELDS}
+        empty["time"] = np.empty(0, dtype="datetime64[ns]")
+        return self._run(empty, final=True)
@@ -0,0 +1,220 @@
+# src/tick_archive.py
+"""
+固定寬度二進位逐筆檔（memmap 零複製讀取）。
+每個合約一個 <合約>.ticks，內容為連續的 TICK_DTYPE 記錄（40 bytes／筆，little-endian）：
+    time int64（epoch 奈秒）/ price float64 / volume int64 / bid float64 / ask float64
+依交易日順序寫入；_index.json 記錄每個交易日的起始列與筆數，查詢區間以二分搜尋換算成列範圍。
+讀取以 numpy.memmap 唯讀開啟，回傳的是檔案上的 view（不解析文字、不複製），
+多個行程（optimizer worker、平行重播）開同一個檔案時共用作業系統的 page cache。
+
+由 data/raw_ticks 建立 / 增量更新（已收錄的交易日略過；補入較早的交易日或清理參數改變時整個合約重建）。
+寫入前逐交易日套用與 Kbar 轉檔相同的品質清理（tick_quality.load_clean），重播看到的逐筆與回測的 Kbar 一致：
+    python -m src.tick_archive build --raw data/raw_ticks --out data/tick_archive
+    python -m src.tick_archive info
+讀取：
+    arc = TickArchive("data/tick_archive")
+    cols = arc.columns("TMF202512", "2025-11-24", "2025-11-28")   # {"time": datetime64 view, "price": ..., ...}
+    ReplayBacktester(cfg).run(cols)
+"""
+import argparse
+import bisect
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+TICK_DTYPE = np.dtype([("time", "<i8"), ("price", "<f8"), ("volume", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+TICK_FIELDS = TICK_DTYPE.names
+_DTYPE_SPEC = [[name, code] for name, code in TICK_DTYPE.descr]   # 寫入索引，開檔時核對
+DEFAULT_ARCHIVE = Path("data/tick_archive")
+INDEX_VERSION = 1
+
+def to_records(df) -> np.ndarray:
+    """逐筆 DataFrame -> TICK_DTYPE 陣列（依 time 穩定排序；bid / ask / volume 缺少時為 NaN / 0）。"""
+    import pandas as pd
+    df = df.sort_values("time", kind="stable")
+    out = np.empty(len(df), dtype=TICK_DTYPE)
+    out["time"] = pd.to_datetime(df["time"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    out["price"] = df["price"].to_numpy(dtype=float)
+    out["volume"] = df["volume"].fillna(0).to_numpy().astype(np.int64) if "volume" in df else 0
+    for c in ("bid", "ask"):
+        out[c] = df[c].to_numpy(dtype=float) if c in df else np.nan
+    return out
+
+class TickArchive:
+    INDEX = "_index.json"
+
+    def __init__(self, root=DEFAULT_ARCHIVE):
+        self.root = Path(root)
+        self._index = None
+        self._maps = {}
+
+    # ---------- 索引 ----------
+    @property
+    def index_path(self) -> Path:
+        return self.root / self.INDEX
+
+    def index(self) -> dict:
+        """{contract: {"file": ..., "days": [[day, start_row, rows], ...]}}（days 依日期排序）。"""
+        if self._index is None:
+            if self.index_path.exists():
+                with self.index_path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") != INDEX_VERSION or data.get("dtype") != _DTYPE_SPEC:
+                    raise ValueError(f"{self.index_path}: 格式版本不符，請重新 build")
+                self._index = data["contracts"]
+            else:
+                self._index = {}
+        return self._index
+
+    def _save_index(self, contracts):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "dtype": _DTYPE_SPEC, "contracts": contracts},
+                      f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.index_path)
+        self._index = None
+
+    def contracts(self):
+        return sorted(self.index())
+
+    def days(self, contract):
+        return [d for d, _, _ in self.index().get(str(contract), {}).get("days", [])]
+
+    def rows(self, contract, start=None, end=None):
+        """[start, end] 交易日（含兩端）對應的列範圍 (lo, hi)。"""
+        days = self.index().get(str(contract), {}).get("days", [])
+        names = [d for d, _, _ in days]
+        i = bisect.bisect_left(names, str(start)[:10]) if start else 0
+        j = bisect.bisect_right(names, str(end)[:10]) if end else len(names)
+        if i >= j:
+            return 0, 0
+        return days[i][1], days[j - 1][1] + days[j - 1][2]
+
+    # ---------- 讀取（零複製） ----------
+    def open(self, contract) -> np.ndarray:
+        """整個合約的唯讀 memmap（TICK_DTYPE 記錄陣列）；同一物件內重複開啟時沿用。"""
+        contract = str(contract)
+        entry = self.index().get(contract)
+        if entry is None:
+            raise KeyError(f"{contract} 不在 {self.root}")
+        path = self.root / entry["file"]
+        size = path.stat().st_size
+        cached = self._maps.get(contract)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        n = size // TICK_DTYPE.itemsize
+        mm = np.memmap(path, dtype=TICK_DTYPE, mode="r", shape=(n,)) if n else np.empty(0, TICK_DTYPE)
+        self._maps[contract] = (size, mm)
+        return mm
+
+    def records(self, contract, start=None, end=None) -> np.ndarray:
+        """交易日區間的記錄 view（不複製）。"""
+        lo, hi = self.rows(contract, start, end)
+        return self.open(contract)[lo:hi]
+
+    def columns(self, contract, start=None, end=None) -> dict:
+        """
+        {"time": datetime64[ns], "price", "volume", "bid", "ask"} 的欄位 view（皆指向 memmap，不複製）。
+        可直接交給 ReplayBacktester.run、TickAggregator.push、vectorized_trades 等接受 mapping 的函式。
+        """
+        rec = self.records(contract, start, end)
+        cols = {name: rec[name] for name in TICK_FIELDS}
+        cols["time"] = cols["time"].view("datetime64[ns]")
+        return cols
+
+    def frame(self, contract, start=None, end=None):
+        """轉成 DataFrame（會複製；需要 pandas 運算時使用）。"""
+        import pandas as pd
+        return pd.DataFrame({k: np.asarray(v) for k, v in self.columns(contract, start, end).items()})
+
+    def iter_days(self, contract, start=None, end=None):
+        """逐交易日產生 (day, 記錄 view)。"""
+        mm = self.open(contract)
+        for day, lo, n in self.index().get(str(contract), {}).get("days", []):
+            if (start and day < str(start)[:10]) or (end and day > str(end)[:10]):
+                continue
+            yield day, mm[lo:lo + n]
+
+    # ---------- 建立 ----------
+    def build(self, raw_root="data/raw_ticks", contract=None, start=None, end=None, quality=True) -> dict:
+        """
+        由 PartitionedStore(raw_root) 的逐筆分區寫入 archive，回傳 {contract: 新增交易日數}
+        （只計原本不在索引中的交易日；整個重寫時既有交易日不重複計入，僅清理參數改變時為 0）。
+        quality：True 為 tick_quality.DEFAULTS，dict 為 clean_ticks 參數，None 為不清理（寫入索引）。
+        已收錄的交易日略過；新交易日早於已收錄的最後一天、或清理參數與已收錄的不同時，該合約整個重寫。
+        """
+        from src import tick_quality
+        from src.storage import PartitionedStore
+        if quality is True:
+            quality = tick_quality.DEFAULTS
+        quality = dict(quality) if quality else None
+        store = PartitionedStore(raw_root)
+        contracts = {c: dict(v) for c, v in self.index().items()}
+        added = {}
+        for c in ([str(contract)] if contract else store.contracts()):
+            parts = store.query(c, start, end)
+            entry = contracts.get(c, {"file": f"{c}.ticks", "days": [], "quality": quality})
+            same_quality = entry.get("quality") == quality
+            indexed = {d for d, _, _ in entry["days"]}
+            have = indexed if same_quality else set()
+            new = [(d, p) for _, d, p in parts if d not in have]
+            if not new:
+                continue
+            path = self.root / entry["file"]
+            if entry["days"] and (not same_quality or new[0][0] < entry["days"][-1][0]):
+                # 補入較早的交易日或清理參數改變：連同既有交易日重新寫入
+                keep = {d for d, _, _ in entry["days"]}
+                new = [(d, p) for _, d, p in store.query(c) if d in keep or d in dict(new)]
+                entry = {"file": entry["file"], "days": [], "quality": quality}
+                self._maps.pop(c, None)
+                path.unlink(missing_ok=True)
+            self.root.mkdir(parents=True, exist_ok=True)
+            row = entry["days"][-1][1] + entry["days"][-1][2] if entry["days"] else 0
+            with open(path, "r+b" if row else "wb") as f:
+                f.seek(row * TICK_DTYPE.itemsize)
+                f.truncate()
+                for day, p in new:
+                    rec = to_records(tick_quality.load_clean(p, quality))
+                    f.write(rec.tobytes())
+                    entry["days"].append([day, row, len(rec)])
+                    row += len(rec)
+                f.flush()
+                os.fsync(f.fileno())
+            contracts[c] = entry
+            added[c] = sum(d not in indexed for d, _ in new)
+        if added:
+            self._save_index(contracts)
+        return added
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="memmap 逐筆 archive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="由 data/raw_ticks 建立 / 增量更新")
+    b.add_argument("--raw", default="data/raw_ticks")
+    b.add_argument("--out", default=str(DEFAULT_ARCHIVE))
+    b.add_argument("--contract")
+    b.add_argument("--start")
+    b.add_argument("--end")
+    b.add_argument("--no-quality", action="store_true", help="寫入未清理的原始逐筆（與 Kbar 轉檔的資料不同）")
+    i = sub.add_parser("info", help="列出合約、交易日數與筆數")
+    i.add_argument("--out", default=str(DEFAULT_ARCHIVE))
+    args = ap.parse_args(argv)
+    arc = TickArchive(args.out)
+    if args.cmd == "build":
+        added = arc.build(args.raw, args.contract, args.start, args.end, quality=None if args.no_quality else True)
+        for c, n in added.items():
+            print(f"{c}: 新增 {n} 個交易日")
+        if not added:
+            print("沒有新的交易日。")
+    for c in arc.contracts():
+        days = arc.index()[c]["days"]
+        rows = sum(n for _, _, n in days)
+        print(f"{c}: {len(days)} 個交易日（{days[0][0]} ~ {days[-1][0]}），{rows:,} 筆，"
+              f"{rows * TICK_DTYPE.itemsize / 2**20:,.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,380 @@
+# src/tick_quality.py
+"""
+逐筆資料品質檢查（轉檔前的清理階段），全部以 numpy 整欄運算，不逐列跑 Python：
+- invalid：time 缺值、price 非有限值或 <= 0、volume < 0，移除
+- out_of_order：時間倒退的次數；有倒退時以 time 穩定排序
+- duplicates：time / price / volume 完全相同的重複列（保留第一筆），移除
+- spikes：價格偏離前後 spike_window 筆中位數超過 spike_pct，移除
+  （置中中位數對真正的跳空不敏感：跳空後的每一筆在窗內都是多數）
+- gaps：同一盤別內相鄰兩筆間隔超過 gap_seconds，只回報不移除
+  （日盤 08:45–13:45、夜盤 15:00–05:00；盤別之間的休市不算 gap）
+- off_session：不在上述兩個盤別時間內的筆數，只回報
+clean_ticks 回傳 (清理後 DataFrame, 報告 dict)；報告依 <合約>/<交易日>.json 寫在 data/quality/。
+StreamCleaner 為分批版（串流轉檔用）：逐批 push 依時間遞增的逐筆，輸出與報告與整批 clean_ticks 相同。
+原始逐筆分區不修改；逐筆層級的使用者（重播、tick archive、模擬下單）以 load_clean / read_clean
+逐交易日套用同一組清理參數，看到的逐筆與 Kbar 轉檔相同。
+    python -m src.tick_quality scan --contract TMF202512 --start 2025-11-24 --end 2025-11-28
+    python -m src.tick_quality show --contract TMF202512
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_REPORT_ROOT = Path("data/quality")
+DEFAULTS = {"dedup": True, "spike_pct": 0.01, "spike_window": 5, "gap_seconds": 300.0}
+MAX_GAPS_LISTED = 20
+
+_MIN_NS = 60 * 10**9
+_DAY_NS = 1440 * _MIN_NS
+# 時間平移 6 小時後，夜盤（15:00–隔日 05:00）與日盤（08:45–13:45）都落在同一個日曆日內
+_SHIFT_NS = 360 * _MIN_NS
+_DAY_SESSION = (165, 465)       # 平移後的分鐘：08:45 / 13:45
+_NIGHT_SESSION = (540, 1380)    # 15:00 / 05:00
+_BLOCK = 1 << 20                # 中位數分段計算，記憶體不隨筆數成長
+
+def session_keys(t_ns: np.ndarray):
+    """回傳 (盤別鍵, 是否在盤中)；盤別鍵 = 平移日 * 2 + (夜盤 1 / 日盤 0)。"""
+    shifted = t_ns - _SHIFT_NS
+    day, rem = np.divmod(shifted, _DAY_NS)
+    minute = rem // _MIN_NS
+    night = minute >= _NIGHT_SESSION[0]
+    in_session = ((minute >= _DAY_SESSION[0]) & (minute <= _DAY_SESSION[1])) | \
+                 (night & (minute <= _NIGHT_SESSION[1]))
+    return day * 2 + night, in_session
+
+def duplicate_mask(t_ns, price, volume) -> np.ndarray:
+    """time / price / volume 完全相同者標記為 True（各組第一筆除外）；只在同時間的列之間比對。"""
+    n = len(t_ns)
+    dup = np.zeros(n, dtype=bool)
+    if n < 2:
+        return dup
+    eq = t_ns[1:] == t_ns[:-1]
+    if not eq.any():
+        return dup
+    cand = np.zeros(n, dtype=bool)
+    cand[1:] |= eq
+    cand[:-1] |= eq
+    idx = np.flatnonzero(cand)
+    # lexsort 為穩定排序：相同鍵保持原始順序，第一筆不被標記
+    o = idx[np.lexsort((volume[idx], price[idx], t_ns[idx]))]
+    same = (t_ns[o[1:]] == t_ns[o[:-1]]) & (price[o[1:]] == price[o[:-1]]) & (volume[o[1:]] == volume[o[:-1]])
+    dup[o[1:][same]] = True
+    return dup
+
+def rolling_median(price: np.ndarray, window: int) -> np.ndarray:
+    """置中的滑動中位數（兩端以邊界值補齊），分段計算。"""
+    half = window // 2
+    return _window_median(np.pad(price, half, mode="edge"), len(price), half)
+
+def _window_median(padded: np.ndarray, n: int, half: int) -> np.ndarray:
+    """padded 已在前方補 half 筆：第 i 筆的中位數取 padded[i : i + 2 * half + 1]，共 n 筆。"""
+    out = np.empty(n)
+    for lo in range(0, n, _BLOCK):
+        hi = min(lo + _BLOCK, n)
+        view = np.lib.stride_tricks.sliding_window_view(padded[lo:hi + 2 * half], 2 * half + 1)
+        out[lo:hi] = np.median(view, axis=1)
+    return out
+
+def spike_mask(price: np.ndarray, pct: float, window: int) -> np.ndarray:
+    if len(price) < 3 or not pct:
+        return np.zeros(len(price), dtype=bool)
+    med = rolling_median(price, window)
+    return np.abs(price - med) > pct * med
+
+def _iso(ns) -> str:
+    return pd.Timestamp(int(ns)).isoformat()
+
+def clean_ticks(df: pd.DataFrame, dedup=True, spike_pct=0.01, spike_window=5, gap_seconds=300.0):
+    """
+    df：逐筆 DataFrame（time / price / volume，可含 bid / ask）。
+    回傳 (清理後 DataFrame（依時間排序、index 重設）, 報告 dict)。
+    """
+    n_in = len(df)
+    report = {"rows_in": n_in, "rows_out": 0, "invalid": 0, "out_of_order": 0, "duplicates": 0, "spikes": 0,
+              "gaps": 0, "max_gap_s": 0.0, "gap_list": [], "off_session": 0, "sessions": [],
+              "first": None, "last": None}
+    if n_in == 0:
+        return df, report
+    time = pd.to_datetime(df["time"])
+    t_ns = time.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    price = df["price"].to_numpy(dtype=float)
+    volume = df["volume"].fillna(0).to_numpy().astype(np.int64) if "volume" in df else np.zeros(n_in, np.int64)
+
+    valid = time.notna().to_numpy() & np.isfinite(price) & (price > 0) & (volume >= 0)
+    report["invalid"] = int(n_in - valid.sum())
+    keep = np.flatnonzero(valid)
+    back = np.diff(t_ns[keep]) < 0
+    report["out_of_order"] = int(back.sum())
+    if report["out_of_order"]:
+        keep = keep[np.argsort(t_ns[keep], kind="stable")]
+
+    t, p, v = t_ns[keep], price[keep], volume[keep]
+    if dedup:
+        dup = duplicate_mask(t, p, v)
+        report["duplicates"] = int(dup.sum())
+        if report["duplicates"]:
+            keep, t, p, v = keep[~dup], t[~dup], p[~dup], v[~dup]
+    spikes = spike_mask(p, spike_pct, spike_window)
+    report["spikes"] = int(spikes.sum())
+    if report["spikes"]:
+        keep, t = keep[~spikes], t[~spikes]
+
+    out = df.iloc[keep].reset_index(drop=True)
+    report["rows_out"] = len(out)
+    if not len(out):
+        return out, report
+    report["first"], report["last"] = _iso(t[0]), _iso(t[-1])
+    keys, in_session = session_keys(t)
+    report["off_session"] = int((~in_session).sum())
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+    report["sessions"] = [{"session": "night" if keys[i] & 1 else "day", "first": _iso(t[i]), "last": _iso(t[j]),
+                           "rows": int(j - i + 1)} for i, j in zip(starts, ends)]
+    dt = np.diff(t)
+    within = keys[1:] == keys[:-1]
+    big = np.flatnonzero(within & (dt > gap_seconds * 1e9))
+    report["gaps"] = len(big)
+    if within.any():
+        report["max_gap_s"] = round(float(dt[within].max()) / 1e9, 3)
+    report["gap_list"] = [{"start": _iso(t[i]), "end": _iso(t[i + 1]), "seconds": round(float(dt[i]) / 1e9, 3)}
+                          for i in big[np.argsort(-dt[big], kind="stable")[:MAX_GAPS_LISTED]]]
+    return out, report
+
+class StreamCleaner:
+    """
+    clean_ticks 的分批版本：push(chunk) 回傳可確定的清理後逐筆，finish() 回傳 (剩餘逐筆, 報告)。
+    chunk 須依時間遞增（串流轉檔已檢查，倒退時改走批次路徑）；跨批次的狀態：
+    - 去重：最後一個時間點的逐筆保留到下一批（同時間的重複列可能跨批）
+    - 異常價：置中中位數需要後面 spike_window // 2 筆，最後幾筆延到下一批才輸出，前面保留同樣筆數當窗口
+    - gaps / sessions / off_session：延續上一批最後一筆的時間與盤別
+    所有 push 與 finish 輸出依序串接，等於整批 clean_ticks 的結果（報告亦同）。
+    """
+    def __init__(self, dedup=True, spike_pct=0.01, spike_window=5, gap_seconds=300.0):
+        self.dedup = dedup
+        self.spike_pct = spike_pct
+        self.half = spike_window // 2
+        self.gap_seconds = gap_seconds
+        self.report = {"rows_in": 0, "rows_out": 0, "invalid": 0, "out_of_order": 0, "duplicates": 0, "spikes": 0,
+                       "gaps": 0, "max_gap_s": 0.0, "gap_list": [], "off_session": 0, "sessions": [],
+                       "first": None, "last": None}
+        self._hold = None           # 去重：最後一個時間點的逐筆
+        self._pend = None           # 已去重、尚未判斷異常價的逐筆
+        self._ctx = None            # 異常價窗口：_pend 之前的 half 筆價格
+        self._seen = 0              # 已去重的筆數（整批 spike_mask 在不足 3 筆時不判斷）
+        self._last_t = None         # 最後一筆有效逐筆的時間（檢查遞增）
+        self._out_t = None          # 最後輸出逐筆的時間與盤別鍵
+        self._out_key = None
+        self._max_gap = None
+        self._gaps = []             # (秒數, 起, 訖)，依時間順序，只保留前 MAX_GAPS_LISTED 大
+        self._sessions = []
+        self._empty = None
+
+    @staticmethod
+    def _columns(df):
+        time = pd.to_datetime(df["time"])
+        t_ns = time.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        price = df["price"].to_numpy(dtype=float)
+        volume = df["volume"].fillna(0).to_numpy().astype(np.int64) if "volume" in df else np.zeros(len(df), np.int64)
+        return time, t_ns, price, volume
+
+    def push(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.report["rows_in"] += len(df)
+        if self._empty is None:
+            self._empty = df.iloc[:0].reset_index(drop=True)
+        if not len(df):
+            return self._empty
+        time, t_ns, price, volume = self._columns(df)
+        valid = time.notna().to_numpy() & np.isfinite(price) & (price > 0) & (volume >= 0)
+        self.report["invalid"] += int(len(df) - valid.sum())
+        t = t_ns[valid]
+        if len(t) and (np.any(np.diff(t) < 0) or (self._last_t is not None and t[0] < self._last_t)):
+            raise ValueError("StreamCleaner 需依時間遞增的逐筆")
+        if len(t):
+            self._last_t = t[-1]
+        return self._deduped(df[valid], final=False)
+
+    def finish(self):
+        tail = self._deduped(None, final=True)
+        if tail is None:
+            tail = pd.DataFrame()
+        r = self.report
+        r["max_gap_s"] = 0.0 if self._max_gap is None else round(float(self._max_gap) / 1e9, 3)
+        r["gap_list"] = [{"start": _iso(a), "end": _iso(b), "seconds": round(float(dt) / 1e9, 3)}
+                         for dt, a, b in self._gaps]
+        r["sessions"] = [{"session": "night" if k & 1 else "day", "first": _iso(a), "last": _iso(b), "rows": n}
+                         for k, a, b, n in self._sessions]
+        return tail, r
+
+    def _deduped(self, df, final):
+        parts = [x for x in (self._hold, df) if x is not None and len(x)]
+        buf = pd.concat(parts, ignore_index=True) if len(parts) > 1 else (parts[0] if parts else None)
+        self._hold = None
+        if buf is not None and self.dedup:
+            _, t_ns, price, volume = self._columns(buf)
+            if not final:
+                # 最後一個時間點之後可能還有同時間的逐筆在下一批
+                cut = int(np.searchsorted(t_ns, t_ns[-1], side="left"))
+                self._hold = buf.iloc[cut:]
+                buf, t_ns, price, volume = buf.iloc[:cut], t_ns[:cut], price[:cut], volume[:cut]
+            dup = duplicate_mask(t_ns, price, volume)
+            self.report["duplicates"] += int(dup.sum())
+            if dup.any():
+                buf = buf[~dup]
+        return self._despiked(buf, final)
+
+    def _despiked(self, df, final):
+        parts = [x for x in (self._pend, df) if x is not None and len(x)]
+        pend = pd.concat(parts, ignore_index=True) if len(parts) > 1 else (parts[0] if parts else None)
+        self._seen += 0 if df is None else len(df)
+        if pend is None:
+            self._pend = None
+            return self._emit(None)
+        half = self.half
+        if not self.spike_pct:
+            self._pend = None
+            return self._emit(pend)
+        if self._seen < 3:
+            # 整批 spike_mask 在不足 3 筆時不判斷；筆數未確定前不輸出
+            if final:
+                self._pend = None
+                return self._emit(pend)
+            self._pend = pend
+            return self._emit(None)
+        p = pend["price"].to_numpy(dtype=float)
+        k = len(p) if final else len(p) - half
+        if k <= 0:
+            self._pend = pend
+            return self._emit(None)
+        left = self._ctx if self._ctx is not None else np.full(half, p[0])
+        full = np.concatenate([left, p, np.full(half, p[-1])]) if final else np.concatenate([left, p])
+        med = _window_median(full, k, half)
+        spikes = np.abs(p[:k] - med) > self.spike_pct * med
+        self.report["spikes"] += int(spikes.sum())
+        self._ctx = full[k:k + half]
+        self._pend = None if final else pend.iloc[k:]
+        out = pend.iloc[:k]
+        return self._emit(out[~spikes] if spikes.any() else out)
+
+    def _emit(self, out):
+        if out is None or not len(out):
+            return self._empty
+        out = out.reset_index(drop=True)
+        r = self.report
+        _, t, _, _ = self._columns(out)
+        r["rows_out"] += len(out)
+        r["first"] = r["first"] or _iso(t[0])
+        r["last"] = _iso(t[-1])
+        keys, in_session = session_keys(t)
+        r["off_session"] += int((~in_session).sum())
+        # 與上一批最後一筆接起來算 gaps / sessions
+        if self._out_t is not None:
+            t_all, k_all = np.r_[self._out_t, t], np.r_[self._out_key, keys]
+        else:
+            t_all, k_all = t, keys
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(t)] - 1
+        for i, j in zip(starts, ends):
+            if i == 0 and self._sessions and self._sessions[-1][0] == keys[0]:
+                k0, a, _, n = self._sessions[-1]
+                self._sessions[-1] = (k0, a, t[j], n + int(j + 1))
+            else:
+                self._sessions.append((keys[i], t[i], t[j], int(j - i + 1)))
+        dt = np.diff(t_all)
+        within = k_all[1:] == k_all[:-1]
+        if within.any():
+            m = dt[within].max()
+            self._max_gap = m if self._max_gap is None else max(self._max_gap, m)
+        big = np.flatnonzero(within & (dt > self.gap_seconds * 1e9))
+        r["gaps"] += len(big)
+        if len(big):
+            cand = self._gaps + [(dt[i], t_all[i], t_all[i + 1]) for i in big]
+            order = np.argsort(-np.array([c[0] for c in cand]), kind="stable")[:MAX_GAPS_LISTED]
+            self._gaps = [cand[i] for i in order]
+        self._out_t, self._out_key = t[-1], keys[-1]
+        return out
+
+def load_clean(path, quality=DEFAULTS):
+    """讀取一個逐筆分區檔並清理（與 Kbar 轉檔的 convert_partition 相同）；quality 為 None 時回傳原始逐筆。"""
+    from src.storage import read_frame
+    df = read_frame(path)
+    return df if quality is None else clean_ticks(df, **quality)[0]
+
+def read_clean(store, contract, start=None, end=None, quality=DEFAULTS) -> pd.DataFrame:
+    """PartitionedStore 的逐筆區間，逐交易日清理後合併（異常價窗口不跨日，與逐日轉檔一致）。"""
+    if quality is None:
+        return store.read(contract, start, end)
+    frames = [load_clean(path, quality) for _, _, path in store.query(contract, start, end)]
+    frames = [f for f in frames if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def issues(report: dict) -> dict:
+    """報告中非零的問題項目（供列印摘要）。"""
+    return {k: report[k] for k in ("invalid", "out_of_order", "duplicates", "spikes", "gaps", "off_session")
+            if report.get(k)}
+
+# ---------- 報告檔 ----------
+def report_path(root, contract, day) -> Path:
+    return Path(root) / str(contract) / f"{str(day)[:10]}.json"
+
+def write_report(report: dict, path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+def load_reports(root=DEFAULT_REPORT_ROOT, contract=None) -> pd.DataFrame:
+    """{root}/<合約>/<交易日>.json -> 每日一列的 DataFrame（不含 gap_list / sessions 明細）。"""
+    rows = []
+    root = Path(root)
+    dirs = [root / str(contract)] if contract else sorted(p for p in root.glob("*") if p.is_dir())
+    for d in dirs:
+        for f in sorted(d.glob("*.json")):
+            with f.open("r", encoding="utf-8") as fh:
+                r = json.load(fh)
+            r.pop("gap_list", None)
+            r["sessions"] = len(r.get("sessions", []))
+            rows.append({"contract": d.name, "day": f.stem, **r})
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="逐筆資料品質報告")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("scan", help="檢查 data/raw_ticks 的逐筆分區並寫出每日報告（不修改原始檔）")
+    s.add_argument("--raw", default="data/raw_ticks")
+    s.add_argument("--contract")
+    s.add_argument("--start")
+    s.add_argument("--end")
+    s.add_argument("--spike-pct", type=float, default=DEFAULTS["spike_pct"])
+    s.add_argument("--gap-seconds", type=float, default=DEFAULTS["gap_seconds"])
+    for p in (s, sub.add_parser("show", help="列出已寫出的每日報告")):
+        p.add_argument("--out", default=str(DEFAULT_REPORT_ROOT))
+        if p is not s:
+            p.add_argument("--contract")
+    args = ap.parse_args(argv)
+    if args.cmd == "scan":
+        from src.storage import PartitionedStore, read_frame
+        store = PartitionedStore(args.raw)
+        for c in ([args.contract] if args.contract else store.contracts()):
+            for _, day, path in store.query(c, args.start, args.end):
+                _, report = clean_ticks(read_frame(path), spike_pct=args.spike_pct, gap_seconds=args.gap_seconds)
+                write_report(report, report_path(args.out, c, day))
+                print(f"{c} {day}: {report['rows_in']:,} -> {report['rows_out']:,} 筆 {issues(report) or 'OK'}")
+        return 0
+    df = load_reports(args.out, args.contract)
+    if df.empty:
+        print("沒有品質報告。")
+        return 0
+    cols = ["contract", "day", "rows_in", "rows_out", "invalid", "out_of_order", "duplicates", "spikes",
+            "gaps", "max_gap_s", "off_session"]
+    print(df[cols].to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
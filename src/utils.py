@@ -1,16 +1,11 @@
 import pandas as pd
 import numpy as np
+from src import indicators
 
 def atr(series_high, series_low, series_close, period=14):
+    """回傳 pd.Series（沿用 high 的 index）；計算由 src.indicators.atr 的 numpy kernel 處理。"""
     high = pd.Series(series_high)
-    low = pd.Series(series_low)
-    close = pd.Series(series_close)
-    tr1 = high - low
-    tr2 = (high - close.shift(1)).abs()
-    tr3 = (low - close.shift(1)).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    atr = tr.rolling(period, min_periods=1).mean()
-    return atr
+    return pd.Series(indicators.atr(high, series_low, series_close, period=period), index=high.index)
 
 def calc_position_size(capital, risk_pct, stop_ticks, tick_value=10):
     risk_amount = capital * (risk_pct / 100.0)
@@ -19,3 +14,13 @@ def calc_position_size(capital, risk_pct, stop_ticks, tick_value=10):
         return 0
     size = int(risk_amount // per_contract_risk)
     return max(1, size) if size >= 1 else 0
+
+def calc_position_sizes(capital, risk_pct, stop_ticks, tick_value=10):
+    """calc_position_size 的陣列版本：stop_ticks 為 array，回傳 int64 array。"""
+    risk_amount = capital * (risk_pct / 100.0)
+    per_contract_risk = np.asarray(stop_ticks, dtype=float) * tick_value
+    valid = per_contract_risk > 0
+    size = np.zeros(per_contract_risk.shape, dtype=np.int64)
+    size[valid] = np.floor_divide(risk_amount, per_contract_risk[valid]).astype(np.int64)
+    size[size < 1] = 0
+    return size